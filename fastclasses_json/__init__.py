@@ -1,4 +1,25 @@
 from .api import dataclass_json
 from .api import JSONMixin
+from .api import JSONEncoder
+from .api import dumps
+from .api import CachedDecoder
+from .core import fast_path_stats
+from .core import tier_stats
+from .core import encoding_cache_stats
+from .core import compiled_variants
+from .core import clear_compiled_variants
+from .core import set_max_compiled_variants
+from .core import codec
+from .core import Codec
+from .core import StaleCodegenWarning
+from .jsonl import read_jsonl
+from .jsonl import write_jsonl
+from .jsonl import JSONLStats
 
-__all__ = ['dataclass_json', 'JSONMixin']
+__all__ = [
+    'dataclass_json', 'JSONMixin', 'JSONEncoder', 'dumps', 'CachedDecoder',
+    'fast_path_stats', 'tier_stats', 'encoding_cache_stats',
+    'compiled_variants', 'clear_compiled_variants',
+    'set_max_compiled_variants', 'codec', 'Codec', 'StaleCodegenWarning',
+    'read_jsonl', 'write_jsonl', 'JSONLStats',
+]
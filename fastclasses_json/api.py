@@ -1,6 +1,9 @@
-from typing import Callable, Optional, Union
+from typing import Callable, Iterator, Optional, Union
+import collections
+import copy
+import json
 
-from .core import _process_class
+from .core import _process_class, _json_encoder, _json_encoders, _origin_class
 
 _ERR_MISSING_DECORATOR = """\
 JSONMixin is only to support type checking. Combine with using the \
@@ -30,23 +33,89 @@ class JSONMixin:
     def from_dict(cls, o: dict, *, infer_missing=True):
         raise NotImplementedError(_ERR_MISSING_DECORATOR)
 
-    def to_json(self, *, separators=None, indent=None) -> str:
+    def to_json(self, *, separators=None, indent=None,
+                ensure_ascii=True) -> str:
+        raise NotImplementedError(_ERR_MISSING_DECORATOR)
+
+    def to_json_bytes(self, *, separators=None, indent=None,
+                      ensure_ascii=True) -> bytes:
+        raise NotImplementedError(_ERR_MISSING_DECORATOR)
+
+    def iter_json_chunks(self, *, chunk_size=65536,
+                         ensure_ascii=True) -> Iterator[str]:
+        raise NotImplementedError(_ERR_MISSING_DECORATOR)
+
+    def to_json_stream(self, fp, *, chunk_size=65536, ensure_ascii=True):
+        raise NotImplementedError(_ERR_MISSING_DECORATOR)
+
+    async def to_json_async(self, *, ensure_ascii=True, executor=None,
+                            threshold=262144, yield_every=None) -> str:
+        raise NotImplementedError(_ERR_MISSING_DECORATOR)
+
+    @classmethod
+    def from_json(
+        cls, json_data: Union[str, bytes, bytearray, memoryview], *,
+        infer_missing=True
+    ):
         raise NotImplementedError(_ERR_MISSING_DECORATOR)
 
     @classmethod
-    def from_json(cls, json_data: Union[str, bytes], *, infer_missing=True):
+    async def from_json_async(
+        cls, json_data: Union[str, bytes, bytearray, memoryview], *,
+        infer_missing=True, executor=None, threshold=262144, yield_every=None
+    ):
         raise NotImplementedError(_ERR_MISSING_DECORATOR)
 
 
 def dataclass_json(
-    cls=None, *, field_name_transform: Optional[Callable[[str], str]] = None
+    cls=None, *,
+    field_name_transform: Optional[Callable[[str], str]] = None,
+    compile_after: Optional[int] = None,
+    specialize_after: Optional[int] = None,
+    iterative: bool = False,
+    graph: bool = False,
+    cache_encoded: bool = False,
+    intern: Union[bool, int] = False,
 ):
     """
-    Returns the same class that was passed in with to_dict, from_dict, to_json
-    and from_json methods added.
+    Returns the same class that was passed in with to_dict, from_dict,
+    to_json, to_json_bytes and from_json methods added.
 
     Can only be applied to classes decorated with @dataclass
 
+    With compile_after, from_dict and to_dict are interpreted until they have
+    been called that many times, and only then compiled. This saves time for
+    classes that are rarely used.
+
+    With specialize_after, the first that many calls of from_dict and to_dict
+    are used to find out which fields are usually missing or None, and then
+    they are recompiled to be quicker for those cases.
+
+    With iterative, from_dict and to_dict walk into nested dataclasses, and
+    the lists, tuples and dicts of them, with a stack of work instead of
+    recursing, so that they can be nested as deeply as memory allows. This
+    is slower for shallow data, and takes the place of compile_after and
+    specialize_after. to_json and from_json use json, which still recurses,
+    so they are limited by the recursion limit as before.
+
+    With graph, to_dict encodes dataclass instances that it reaches more than
+    once, such as one customer shared by many orders, in full only the first
+    time, with an "$id" key, and as {"$ref": id} after that. from_dict
+    decodes that back into shared instances, and cycles too. It takes the
+    place of the other options.
+
+    With cache_encoded, which is for frozen dataclasses, the result of
+    to_dict, and of to_json with the default separators, is kept for each
+    instance for as long as the instance is alive. to_dict returns a copy of
+    it each time.
+
+    With intern, which is for frozen, hashable dataclasses, from_dict gives
+    back the same instance for equal values, wherever the class is
+    decoded, so that millions of equal values take the memory of one. Up to
+    intern of them are kept, or 4096 if it's True. Fields must have types
+    that can be hashed, so not lists or dicts. With graph, instances that
+    are part of a cycle aren't interned.
+
     Example:
 
         @dataclass_json
@@ -56,7 +125,119 @@ def dataclass_json(
 
         MyDataclass.from_json('{"my_field": "my value"}')
     """
+    options = dict(
+        field_name_transform=field_name_transform,
+        compile_after=compile_after,
+        specialize_after=specialize_after,
+        iterative=iterative or None,
+        graph=graph or None,
+        cache_encoded=cache_encoded or None,
+        intern=intern or None,
+    )
     if cls is not None:
-        return _process_class(cls, field_name_transform=field_name_transform)
+        return _process_class(cls, **options)
+
+    return lambda cls: _process_class(cls, **options)
+
+
+class JSONEncoder(json.JSONEncoder):
+    """
+    A json.JSONEncoder that also encodes dataclasses, using their compiled
+    to_dict, and enums, dates, decimals and UUIDs, wherever they are in the
+    structure being encoded. How to encode each type is looked up once.
+
+    Example:
+
+        json.dumps({'items': [MyDataclass('x')]}, cls=JSONEncoder)
+    """
+
+    def default(self, o):
+        try:
+            encoder = _json_encoders[type(o)]
+        except KeyError:
+            encoder = _json_encoder(type(o))
+        if encoder is None:
+            return super().default(o)
+        return encoder(o)
+
+
+def dumps(obj, *, separators=None, indent=None, **kwargs):
+    """
+    json.dumps using JSONEncoder, and with the compact separators of to_json
+    unless told otherwise.
+
+    Example:
+
+        dumps({'items': [MyDataclass('x')], 'cursor': 'abc'})
+    """
+    if indent is None and separators is None:
+        if not kwargs:
+            # like json.dumps, reuse an encoder when given no options
+            return _compact_encoder.encode(obj)
+        separators = (',', ':')
+    return json.dumps(
+        obj, cls=JSONEncoder, separators=separators, indent=indent, **kwargs
+    )
+
+
+_compact_encoder = JSONEncoder(separators=(',', ':'))
+
+
+def _utf8_size(json_data):
+    # isascii is just a flag for strs, encoding them is not
+    if isinstance(json_data, bytes) or json_data.isascii():
+        return len(json_data)
+    return len(json_data.encode('utf-8', 'surrogatepass'))
+
+
+class CachedDecoder:
+    """
+    Decodes JSON into instances of cls, keeping the most recently decoded
+    ones keyed on the JSON they came from, which is counted against
+    max_bytes in bytes of UTF-8, strs too. For frozen dataclasses the same
+    instance is returned for the same JSON, for others a deep copy of it.
+
+    Example:
+
+        flags = CachedDecoder(FeatureFlags, max_bytes=1024 * 1024)
+        flags.from_json(request_body)
+    """
 
-    return lambda cls: _process_class(cls, field_name_transform=field_name_transform)
+    def __init__(self, cls, max_bytes=16 * 1024 * 1024):
+        self.cls = cls
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # The total length of the JSON that is cached, in bytes of UTF-8
+        self.size = 0
+        self._frozen = _origin_class(cls).__dataclass_params__.frozen
+        self._cache = collections.OrderedDict()
+
+    def from_json(self, json_data):
+        key = json_data
+        if isinstance(key, (bytearray, memoryview)):
+            key = bytes(key)
+        try:
+            value = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            value = self.cls.from_json(json_data)
+            self._store(key, value)
+        else:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        return value if self._frozen else copy.deepcopy(value)
+
+    def _store(self, key, value):
+        size = _utf8_size(key)
+        if size > self.max_bytes:
+            return
+        self._cache[key] = value
+        self.size += size
+        while self.size > self.max_bytes:
+            old_key, _ = self._cache.popitem(last=False)
+            self.size -= _utf8_size(old_key)
+
+    def clear(self):
+        self._cache.clear()
+        self.size = 0
@@ -0,0 +1,150 @@
+"""
+Ahead-of-time generation of the from_dict and to_dict code, for when
+compiling code at runtime is not an option.
+
+    python -m fastclasses_json codegen mypkg.models
+
+writes mypkg/_fastclasses_generated.py which @dataclass_json then picks up
+instead of generating code when the classes in mypkg are first used.
+"""
+from dataclasses import is_dataclass
+import argparse
+import importlib
+import os
+import sys
+
+from . import core
+
+_HEADER = """\
+# Generated by fastclasses_json. DO NOT EDIT.
+# Regenerate with: python -m fastclasses_json codegen {modules}
+# flake8: noqa
+
+FROM_DICT = {{}}
+TO_DICT = {{}}
+"""
+
+
+def decorated_classes(module):
+    """
+    The classes in module that have been decorated with @dataclass_json,
+    along with their options
+    """
+    for value in vars(module).values():
+        if (isinstance(value, type)
+                and value.__module__ == module.__name__
+                and value in core._decorated):
+            yield value, core._decorated[value]
+
+
+def reachable_classes(modules):
+    """
+    All (class, options) pairs that code will be needed for, starting from the
+    decorated classes in modules, and following the dataclasses they refer
+    to.
+    """
+    seen = {}
+    pending = [pair for m in modules for pair in decorated_classes(m)]
+    while pending:
+        cls, options = pending.pop(0)
+        key = (cls, core._options_key(options))
+        if key in seen:
+            continue
+        seen[key] = (cls, options)
+        for t in core.referenced_types(cls).values():
+            if is_dataclass(t):
+                pending.append((t, options))
+    return list(seen.values())
+
+
+def generate_source(module_names):
+    """
+    Import the named modules and return the source of the generated module
+    for them.
+    """
+    modules = [importlib.import_module(name) for name in module_names]
+    target = core._generated_module_name(module_names[0])
+
+    lines = [_HEADER.format(modules=' '.join(module_names))]
+    for i, (cls, options) in enumerate(reachable_classes(modules)):
+        if core._generated_module_name(cls.__module__) != target:
+            print(
+                f'skipping {cls.__module__}.{cls.__qualname__}: '
+                f'it will not be looked for in {target}',
+                file=sys.stderr,
+            )
+            continue
+        if '<locals>' in cls.__qualname__:
+            continue
+        if options.get('iterative') or options.get('graph'):
+            # Walked into by the interpreter, there's no code to generate
+            continue
+        key = (cls.__module__, cls.__qualname__, core._options_key(options))
+        if '<' in key[2]:
+            print(
+                f'skipping {cls.__module__}.{cls.__qualname__}: '
+                f'options must be module level functions, not {key[2]}',
+                file=sys.stderr,
+            )
+            continue
+        fingerprint = core._fingerprint(cls, options)
+        for table, func_name, source in [
+            ('FROM_DICT', f'_from_dict_{i}',
+             core._from_dict_source(cls, options)),
+            ('TO_DICT', f'_to_dict_{i}',
+             core._to_dict_source(cls, options)),
+        ]:
+            _, _, body = source.partition('(')
+            lines.append('')
+            lines.append('')
+            lines.append(f'def {func_name}({body}')
+            lines.append(f'{table}[{key!r}] = ({fingerprint!r}, {func_name})')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def default_output_path(module_name):
+    module = importlib.import_module(module_name)
+    directory = os.path.dirname(module.__file__)
+    return os.path.join(directory, f'{core.GENERATED_MODULE}.py')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m fastclasses_json')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    codegen = subparsers.add_parser(
+        'codegen',
+        help='write the code for decorated dataclasses to a python module',
+    )
+    codegen.add_argument('modules', nargs='+', metavar='module')
+    codegen.add_argument(
+        '-o', '--output',
+        help='where to write the module. Defaults to '
+             f'{core.GENERATED_MODULE}.py next to the first module',
+    )
+    codegen.add_argument(
+        '--check', action='store_true',
+        help="don't write anything, exit with status 1 if the output is "
+             "missing or out of date",
+    )
+
+    args = parser.parse_args(argv)
+
+    output = args.output or default_output_path(args.modules[0])
+    source = generate_source(args.modules)
+
+    if args.check:
+        try:
+            with open(output, encoding='utf-8') as f:
+                existing = f.read()
+        except FileNotFoundError:
+            existing = None
+        if existing != source:
+            print(f'{output} is out of date', file=sys.stderr)
+            return 1
+        return 0
+
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(source)
+    return 0
@@ -4,11 +4,23 @@ from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
 from uuid import UUID
+import asyncio
+import builtins
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import importlib
+import io
+import itertools
 import json
+import operator
+import re
 import sys
 import types
 import typing
 import warnings
+import weakref
 
 from .utils import issubclass_safe
 
@@ -26,52 +38,539 @@ from typing import get_args as typing_get_args
 _FROM = 1
 _TO = 2
 
+# cls -> [exact, fallback], counting the calls of the generated from_dict
+# that took the exact-shape path and those that didn't.
+_shape_counts: typing.MutableMapping[type, typing.List[int]] = \
+    weakref.WeakKeyDictionary()
+
+# cls -> options, for each class that @dataclass_json has been applied to
+_decorated: typing.MutableMapping[type, typing.Any] = \
+    weakref.WeakKeyDictionary()
+
+# Bump this whenever a change to the code generation would make previously
+# generated modules (see codegen.py) produce different results.
+_CODEGEN_VERSION = 9
+
+GENERATED_MODULE = '_fastclasses_generated'
+
+
+class StaleCodegenWarning(UserWarning):
+    """
+    A generated module has code for a class, but the class has changed since
+    the module was generated.
+    """
+
 
 def _process_class(cls, **options):
 
     if not is_dataclass(cls):
         raise TypeError("must be called with a dataclass type")
 
+    # Not options of the generated code, but of cls whatever the options
+    cache_encoded = options.pop('cache_encoded', None)
+    if cache_encoded and not cls.__dataclass_params__.frozen:
+        raise TypeError("cache_encoded can only be used with frozen dataclasses")
+    intern = options.pop('intern', None)
+    if intern:
+        params = cls.__dataclass_params__
+        if not (params.frozen and params.eq) or cls.__hash__ is None:
+            raise TypeError(
+                "intern can only be used with frozen, hashable dataclasses"
+            )
+        name = _unhashable_field(cls)
+        if name is not None:
+            raise TypeError(
+                f"intern can only be used with frozen, hashable dataclasses, "
+                f"and {cls.__name__}.{name} can hold values that can't be "
+                f"hashed"
+            )
+        _intern_tables[cls] = _InternTable(
+            _DEFAULT_INTERN_SIZE if intern is True else intern
+        )
+
     _process_class_internal(cls, options=options)
+    _decorated[cls] = options
 
     def from_dict(cls, *args, **kwargs):
-        inst = getattr(cls, _from_dict_func(options))(*args, **kwargs)
-        cls.from_dict = getattr(cls, _from_dict_func(options))
+        func = _lookup(cls, options, _from_dict_func(options))
+        inst = func(*args, **kwargs)
+        cls.from_dict = _lookup(cls, options, _from_dict_func(options))
         return inst
 
     def to_dict(self, *args, **kwargs):
-        d = getattr(self, _to_dict_func(options))(*args, **kwargs)
-        cls.to_dict = getattr(cls, _to_dict_func(options))
+        func = _lookup(cls, options, _to_dict_func(options))
+        d = func(self, *args, **kwargs)
+        cls.to_dict = _lookup(cls, options, _to_dict_func(options))
         return d
 
     cls.from_dict = classmethod(from_dict)
     cls.to_dict = to_dict
 
-    def from_json(cls, json_data, infer_missing=True):
-        return cls.from_dict(
-            json.loads(json_data), infer_missing=infer_missing
+    decoder = None
+
+    def json_decoder(cls_):
+        nonlocal decoder
+        if cls_ is not cls:
+            # A subclass, whose fields may take floats
+            return _json_decoder
+        if decoder is None:
+            decoder = _decimal_decoder if _decimals_only(cls) \
+                else _json_decoder
+        return decoder
+
+    def from_json(cls_, json_data, infer_missing=True):
+        return cls_.from_dict(
+            json_decoder(cls_).decode(_json_text(json_data)),
+            infer_missing=infer_missing
         )
 
-    def to_json(self, *, separators=None, indent=None):
-        if indent is None and separators is None:
-            separators = (',', ':')
-        return json.dumps(self.to_dict(), separators=separators, indent=indent)
+    async def from_json_async(cls_, json_data, *, infer_missing=True,
+                              executor=None,
+                              threshold=_DEFAULT_ASYNC_THRESHOLD,
+                              yield_every=None):
+        if len(json_data) < threshold:
+            return cls_.from_json(json_data, infer_missing=infer_missing)
+        return await _from_json_async(
+            cls_, json_data, json_decoder(cls_), options, infer_missing,
+            executor, yield_every
+        )
+
+    def to_json(self, *, separators=None, indent=None, ensure_ascii=True):
+        return _dumps(self.to_dict(), separators, indent, ensure_ascii)
+
+    def to_json_bytes(self, *, separators=None, indent=None,
+                      ensure_ascii=True):
+        if (separators is None and indent is None and not cache_encoded
+                and _has_long_field(type(self), self)):
+            return _json_bytes(type(self), self, options, ensure_ascii)
+        return _encode_json(self.to_json(
+            separators=separators, indent=indent, ensure_ascii=ensure_ascii
+        ))
+
+    def iter_json_chunks(self, *, chunk_size=_DEFAULT_CHUNK_SIZE,
+                         ensure_ascii=True):
+        return _json_chunks(
+            type(self), self, options, chunk_size, ensure_ascii
+        )
+
+    def to_json_stream(self, fp, *, chunk_size=_DEFAULT_CHUNK_SIZE,
+                       ensure_ascii=True):
+        _write_json_chunks(fp, self.iter_json_chunks(
+            chunk_size=chunk_size, ensure_ascii=ensure_ascii
+        ))
+
+    async def to_json_async(self, *, ensure_ascii=True, executor=None,
+                            threshold=_DEFAULT_ASYNC_THRESHOLD,
+                            yield_every=None):
+        return await _to_json_async(
+            type(self), self, options, ensure_ascii, executor, threshold,
+            yield_every
+        )
 
     cls.from_json = classmethod(from_json)
+    cls.from_json_async = classmethod(from_json_async)
     cls.to_json = to_json
+    cls.to_json_bytes = to_json_bytes
+    cls.iter_json_chunks = iter_json_chunks
+    cls.to_json_stream = to_json_stream
+    cls.to_json_async = to_json_async
+
+    if getattr(cls, '__parameters__', None):
+        _add_class_getitem(cls, options)
+    if cache_encoded:
+        _add_encoding_cache(cls, options)
     return cls
 
 
+# ensure_ascii -> encoder with the compact separators of to_json, made once
+# rather than on each call as json.dumps(obj, separators=...) would
+_compact_encoders = {
+    ensure_ascii: json.JSONEncoder(
+        separators=(',', ':'), ensure_ascii=ensure_ascii
+    )
+    for ensure_ascii in (True, False)
+}
+
+
+def _dumps(obj, separators=None, indent=None, ensure_ascii=True):
+    if indent is None and separators is None:
+        return _compact_encoders[ensure_ascii].encode(obj)
+    return json.dumps(
+        obj, separators=separators, indent=indent, ensure_ascii=ensure_ascii
+    )
+
+
+def _encode_json(json_data):
+    """
+    The UTF-8 bytes of json_data, which is all ASCII unless it was dumped
+    with ensure_ascii=False. Lone surrogates, which aren't valid UTF-8,
+    raise UnicodeEncodeError, as json_data.encode() would.
+    """
+    return json_data.encode('utf-8')
+
+
+# cls -> _InternTable, for classes using intern
+_intern_tables: typing.MutableMapping[type, '_InternTable'] = \
+    weakref.WeakKeyDictionary()
+
+_DEFAULT_INTERN_SIZE = 4096
+
+
+class _InternTable(dict):
+    """
+    obj -> obj, for the first of the equal instances that from_dict made, so
+    that the others can be dropped for it. Generated code looks instances
+    up with table[obj], so that finding one is a single dict lookup.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __missing__(self, obj):
+        if len(self) >= self.maxsize:
+            # Simpler and quicker than keeping track of the least used
+            self.clear()
+        self[obj] = obj
+        return obj
+
+
+def _unhashable_field(cls):
+    """
+    The name of the first field of cls with a type whose values can't be
+    hashed, such as a list, or None. Fields whose types can't be resolved
+    yet, or that could hold anything, such as Any, are given the benefit of
+    the doubt.
+    """
+    try:
+        hints = _type_hints(cls)
+    except NameError:
+        return None
+    for name, field_type in hints.items():
+        if _is_unhashable(field_type, (cls,)):
+            return name
+    return None
+
+
+def _is_unhashable(t, seen):
+    origin = typing_get_origin(t)
+    if origin is not None:
+        if origin == typing.Union or origin == tuple:
+            return any(
+                _is_unhashable(arg, seen)
+                for arg in typing_get_args(t) if arg is not Ellipsis
+            )
+        if issubclass_safe(origin, (tuple, frozenset)):
+            return False
+        # decoded as lists, dicts and sets
+        return issubclass_safe(origin, (abc.Sequence, abc.Mapping, abc.Set))
+    if is_dataclass(t) and isinstance(t, type):
+        if t.__hash__ is None:
+            return True
+        if t in seen:
+            return False
+        try:
+            hints = _type_hints(t)
+        except NameError:
+            return False
+        return any(
+            _is_unhashable(field_type, seen + (t,))
+            for field_type in hints.values()
+        )
+    return getattr(t, '__hash__', None) is None
+
+
+# cls -> (to_dict cache, to_json cache), for classes using cache_encoded
+_encoding_caches: typing.MutableMapping[
+    type, typing.Tuple['_InstanceCache', '_InstanceCache']
+] = weakref.WeakKeyDictionary()
+
+
+def _add_encoding_cache(cls, options):
+    """
+    Memoize to_dict, and to_json with the default separators, for each
+    instance of frozen cls. to_dict returns copies.
+    """
+    if not cls.__weakrefoffset__:
+        raise TypeError(
+            "cache_encoded needs instances that can be weakly referenced"
+        )
+    dicts, jsons = _encoding_caches[cls] = \
+        _InstanceCache(), _InstanceCache()
+    to_json = cls.to_json
+    name = _to_dict_func(options)
+
+    def cached_to_dict(self):
+        entry = dicts.get(self)
+        if entry is None:
+            # Not the public to_dict, which replaces itself
+            d = _lookup(cls, options, name)(self)
+            entry = d, _copier(d)
+            dicts.set(self, entry)
+        d, copy = entry
+        return copy(d)
+
+    def cached_to_json(self, *, separators=None, indent=None,
+                       ensure_ascii=True):
+        if separators is not None or indent is not None or not ensure_ascii:
+            return to_json(
+                self, separators=separators, indent=indent,
+                ensure_ascii=ensure_ascii
+            )
+        json_data = jsons.get(self)
+        if json_data is None:
+            json_data = _dumps(_lookup(cls, options, name)(self))
+            jsons.set(self, json_data)
+        return json_data
+
+    cls.to_dict = cached_to_dict
+    cls.to_json = cached_to_json
+
+
+class _InstanceCache:
+    """
+    obj -> value, by the identity of obj, for as long as obj is alive
+    """
+
+    def __init__(self):
+        # id(obj) -> (weak reference to obj, value)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, obj):
+        entry = self.entries.get(id(obj))
+        if entry is not None and entry[0]() is obj:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, obj, value):
+        entries = self.entries
+        key = id(obj)
+
+        def forget(ref):
+            entry = entries.get(key)
+            if entry is not None and entry[0] is ref:
+                del entries[key]
+
+        entries[key] = (weakref.ref(obj, forget), value)
+
+
+def _copier(value):
+    """
+    A function that copies the dicts and lists in value, a result of to_dict,
+    and ones with the same containers in the same places
+    """
+    if type(value) is dict:
+        nested = [
+            (k, _copier(v)) for k, v in value.items()
+            if type(v) in _ENCODED_CONTAINERS
+        ]
+        if not nested:
+            return dict.copy
+
+        def copy_dict(d):
+            result = d.copy()
+            for k, copy in nested:
+                result[k] = copy(d[k])
+            return result
+        return copy_dict
+
+    copiers = [
+        _copier(v) if type(v) in _ENCODED_CONTAINERS else None
+        for v in value
+    ]
+    if not any(copiers):
+        # tuples of values that can't be changed needn't be copied
+        return list.copy if type(value) is list else _same
+
+    def copy_list(items):
+        return [
+            item if copy is None else copy(item)
+            for copy, item in zip(copiers, items)
+        ]
+    if type(value) is list:
+        return copy_list
+    return lambda items: tuple(copy_list(items))
+
+
+_ENCODED_CONTAINERS = frozenset([dict, list, tuple])
+
+
+def encoding_cache_stats(cls):
+    """
+    How many calls of to_dict and to_json of cls, decorated with
+    `cache_encoded`, were answered from the cache (`hits`) and how many
+    weren't (`misses`), and how many instances there are encodings cached
+    for (`size`).
+    """
+    dicts, jsons = _encoding_caches[cls]
+    return {
+        name: {
+            'hits': cache.hits,
+            'misses': cache.misses,
+            'size': len(cache.entries),
+        }
+        for name, cache in [('to_dict', dicts), ('to_json', jsons)]
+    }
+
+
+def _add_class_getitem(cls, options):
+    """
+    Give the aliases of generic cls that give all its type parameters,
+    e.g. Page[Order], their own from_dict, to_dict, from_json and to_json.
+    """
+
+    def __class_getitem__(cls_, params):
+        alias = super(cls, cls_).__class_getitem__(params)
+        if (_specialized_origin(alias) is not None
+                and 'from_dict' not in vars(alias)):
+            # Not setattr, which the alias passes on to cls_
+            vars(alias).update(_specialization_api(alias, options))
+        return alias
+
+    cls.__class_getitem__ = classmethod(__class_getitem__)
+
+
+def _specialization_api(alias, options):
+    from_dict_name = _from_dict_func(options)
+    to_dict_name = _to_dict_func(options)
+
+    def from_dict(o, *, infer_missing=True):
+        return _lookup(alias, options, from_dict_name)(
+            o, infer_missing=infer_missing
+        )
+
+    def to_dict(obj):
+        return _lookup(alias, options, to_dict_name)(obj)
+
+    def from_json(json_data, infer_missing=True):
+        return from_dict(
+            json.loads(_json_text(json_data)), infer_missing=infer_missing
+        )
+
+    def to_json(obj, *, separators=None, indent=None, ensure_ascii=True):
+        return _dumps(to_dict(obj), separators, indent, ensure_ascii)
+
+    def to_json_bytes(obj, *, separators=None, indent=None,
+                      ensure_ascii=True):
+        if (separators is None and indent is None
+                and _has_long_field(alias, obj)):
+            return _json_bytes(alias, obj, options, ensure_ascii)
+        return _encode_json(to_json(
+            obj, separators=separators, indent=indent,
+            ensure_ascii=ensure_ascii
+        ))
+
+    def iter_json_chunks(obj, *, chunk_size=_DEFAULT_CHUNK_SIZE,
+                         ensure_ascii=True):
+        return _json_chunks(alias, obj, options, chunk_size, ensure_ascii)
+
+    def to_json_stream(obj, fp, *, chunk_size=_DEFAULT_CHUNK_SIZE,
+                       ensure_ascii=True):
+        _write_json_chunks(fp, iter_json_chunks(
+            obj, chunk_size=chunk_size, ensure_ascii=ensure_ascii
+        ))
+
+    return {
+        'from_dict': from_dict,
+        'to_dict': to_dict,
+        'from_json': from_json,
+        'to_json': to_json,
+        'to_json_bytes': to_json_bytes,
+        'iter_json_chunks': iter_json_chunks,
+        'to_json_stream': to_json_stream,
+    }
+
+
+def _specialized_origin(t):
+    """
+    The generic dataclass that t gives all the type parameters of, as in
+    Page[Order], or None
+    """
+    origin = typing_get_origin(t)
+    if (origin is not None and is_dataclass(origin)
+            and not getattr(t, '__parameters__', ())):
+        return origin
+    return None
+
+
+def _origin_class(cls):
+    return _specialized_origin(cls) or cls
+
+
+def _fields(cls):
+    return dataclass_fields(_origin_class(cls))
+
+
+def _type_hints(cls):
+    """
+    typing.get_type_hints, with the type parameters of specializations of
+    generic dataclasses filled in
+    """
+    origin = _specialized_origin(cls)
+    if origin is None:
+        return typing.get_type_hints(cls)
+    mapping = _type_var_map(origin, typing_get_args(cls))
+    return {
+        name: _substitute(field_type, mapping)
+        for name, field_type in typing.get_type_hints(origin).items()
+    }
+
+
+def _type_var_map(origin, args):
+    mapping = dict(zip(origin.__parameters__, args))
+    # The type parameters of generic base classes, e.g. S in
+    # class Page(Base[List[T]]) where class Base(Generic[S])
+    for base in getattr(origin, '__orig_bases__', ()):
+        base_origin = typing_get_origin(base)
+        if base_origin is None or not is_dataclass(base_origin):
+            continue
+        base_args = tuple(_substitute(a, mapping) for a in typing_get_args(base))
+        for type_var, arg in _type_var_map(base_origin, base_args).items():
+            mapping.setdefault(type_var, arg)
+    return mapping
+
+
+def _substitute(t, mapping):
+    if isinstance(t, typing.TypeVar):
+        return mapping.get(t, t)
+    if typing_get_origin(t) is not None and getattr(t, '__parameters__', ()):
+        return t[tuple(mapping.get(p, p) for p in t.__parameters__)]
+    return t
+
+
+def _generic_name(t):
+    """
+    An identifier for a specialization of a generic dataclass to go by in
+    generated code
+    """
+    return '__generic_' + re.sub(r'\W', '_', repr(t))
+
+
+_FROM_DICT = '_fastclasses_json_from_dict'
+_TO_DICT = '_fastclasses_json_to_dict'
+
+
 def _from_dict_func(options):
-    if options:
-        return '_fastclasses_json_from_dict_%x' % _hash_options(options)
-    return '_fastclasses_json_from_dict'
+    return _FROM_DICT + _options_suffix(options)
 
 
 def _to_dict_func(options):
-    if options:
-        return '_fastclasses_json_to_dict_%x' % _hash_options(options)
-    return '_fastclasses_json_to_dict'
+    return _TO_DICT + _options_suffix(options)
+
+
+def _options_suffix(options):
+    key = _options_key(options)
+    if not key:
+        return ''
+    if '<' in key:
+        # lambdas and locally defined functions can't be told apart by name
+        return '_%x' % _hash_options(options)
+    # The same between processes, so that generated modules can refer to it
+    return '_' + hashlib.sha1(key.encode()).hexdigest()[:16]
 
 
 def _hash_options(options):
@@ -79,98 +578,1816 @@ def _hash_options(options):
 
 
 def _process_class_internal(cls, options):
+    _install_temp_from_dict(cls, options)
+    _install_temp_to_dict(cls, options)
+    return cls
+
+
+def _install_temp_from_dict(cls, options):
 
     # Delay the building of our from_dict method until it is first called.
     # This allows the compilation to reference classes defined later in
     # the module.
-    def _temp_from_dict(cls, *args, **kwarg):
-        _replace_from_dict(cls, options, _from_dict_func(options))
-        return getattr(cls, _from_dict_func(options))(*args, **kwarg)
+    def _temp_from_dict(cls_, *args, **kwarg):
+        # Inherited by subclasses, which get their own from_dict. Unless cls
+        # is a specialization of a generic dataclass: those are bound to the
+        # generic dataclass, which they construct.
+        target = cls if _specialized_origin(cls) is not None else cls_
+        if options.get('graph'):
+            _graph_from_dict(target, options, _from_dict_func(options))
+        elif options.get('iterative'):
+            _iterate_from_dict(target, options, _from_dict_func(options))
+        elif options.get('compile_after'):
+            _interpret_from_dict(target, options, _from_dict_func(options))
+        else:
+            _compile_from_dict(target, options, _from_dict_func(options))
+        return _lookup(target, options, _from_dict_func(options))(
+            *args, **kwarg
+        )
+
+    _install(
+        cls, options, _from_dict_func(options), classmethod(_temp_from_dict)
+    )
 
-    setattr(cls, _from_dict_func(options), classmethod(_temp_from_dict))
+
+def _install_temp_to_dict(cls, options):
 
     def _temp_to_dict(self, *args, **kwargs):
-        _replace_to_dict(cls, options, _to_dict_func(options))
-        return getattr(self, _to_dict_func(options))(*args, **kwargs)
+        if options.get('graph'):
+            _graph_to_dict(cls, options, _to_dict_func(options))
+        elif options.get('iterative'):
+            _iterate_to_dict(cls, options, _to_dict_func(options))
+        elif options.get('compile_after'):
+            _interpret_to_dict(cls, options, _to_dict_func(options))
+        else:
+            _compile_to_dict(cls, options, _to_dict_func(options))
+        return _lookup(cls, options, _to_dict_func(options))(
+            self, *args, **kwargs
+        )
 
-    setattr(cls, _to_dict_func(options), _temp_to_dict)
+    _install(cls, options, _to_dict_func(options), _temp_to_dict)
+
+
+def _ensure_processed(cls, options):
+    """
+    Give indirectly referenced dataclasses a from_dict and to_dict for
+    options, without trashing their public API
+    """
+    name = _from_dict_func(options)
+    # Variants and specializations are processed by _VariantMethods when they
+    # are first looked up
+    if (not _is_variant(name) and _specialized_origin(cls) is None
+            and not hasattr(cls, name)):
+        _process_class_internal(cls, options)
+
+
+# The methods for options other than the default are kept in tables, one
+# per method name, rather than as attributes of the classes, so that building
+# codecs with many different options doesn't grow classes without bound.
+# Generated code looks nested dataclasses up in the table it was compiled
+# with. _variants holds the most recently used tables, oldest first, and
+# _live_variants any that are still referenced after being evicted.
+# The methods for specializations of generic dataclasses, e.g. Page[Order],
+# are kept in the tables too, whatever the options. _specializations has
+# the most recently used of those, oldest first.
+_variants: typing.OrderedDict[str, '_VariantMethods'] = \
+    collections.OrderedDict()
+_live_variants: typing.MutableMapping[str, '_VariantMethods'] = \
+    weakref.WeakValueDictionary()
+_specializations: typing.OrderedDict[typing.Any, None] = \
+    collections.OrderedDict()
+
+_max_variants = 128
+
+
+class _VariantMethods(dict):
+    """
+    cls -> method as getattr(cls, name) would have returned it, for the
+    name of a from_dict or to_dict for options other than the default, or
+    for specializations of generic dataclasses
+    """
+
+    def __init__(self, name, options):
+        super().__init__()
+        self.name = name
+        self.options = options
+
+    def __missing__(self, cls):
+        # Never seen, or cleared. Start again from a lazy stub.
+        if self.name.startswith(_FROM_DICT):
+            _install_temp_from_dict(cls, self.options)
+        else:
+            _install_temp_to_dict(cls, self.options)
+        return self[cls]
+
+
+def _is_variant(name):
+    return name.startswith((_FROM_DICT + '_', _TO_DICT + '_'))
+
+
+def _variant_methods(name, options):
+    try:
+        _variants.move_to_end(name)
+        return _variants[name]
+    except KeyError:
+        pass
+    methods = _live_variants.get(name)
+    if methods is None:
+        methods = _live_variants[name] = _VariantMethods(name, options)
+    _variants[name] = methods
+    while len(_variants) > _max_variants:
+        _variants.popitem(last=False)
+    return methods
+
+
+def _touch_specialization(alias):
+    try:
+        _specializations.move_to_end(alias)
+        return
+    except KeyError:
+        pass
+    _specializations[alias] = None
+    while len(_specializations) > _max_variants:
+        _evict_specialization()
+
+
+def _evict_specialization():
+    alias, _ = _specializations.popitem(last=False)
+    for methods in list(_live_variants.values()):
+        methods.pop(alias, None)
+
+
+def _install(cls, options, name, method):
+    """
+    setattr(cls, name, method), or its equivalent for variants and
+    specializations
+    """
+    origin = _specialized_origin(cls)
+    if origin is not None:
+        _touch_specialization(cls)
+        _variant_methods(name, options)[cls] = method.__get__(None, origin)
+    elif _is_variant(name):
+        _variant_methods(name, options)[cls] = method.__get__(None, cls)
+    else:
+        setattr(cls, name, method)
+
+
+def _lookup(cls, options, name):
+    """
+    getattr(cls, name), or its equivalent for variants and specializations
+    """
+    if _specialized_origin(cls) is not None:
+        _touch_specialization(cls)
+        return _variant_methods(name, options)[cls]
+    if _is_variant(name):
+        return _variant_methods(name, options)[cls]
+    return getattr(cls, name)
+
+
+def compiled_variants():
+    """
+    The from_dict and to_dict methods for options other than the default,
+    or for specializations of generic dataclasses, that are being kept, as
+    (method, options, classes) triples, least recently used first.
+    """
+    return [
+        (
+            'from_dict' if name.startswith(_FROM_DICT) else 'to_dict',
+            methods.options,
+            list(methods),
+        )
+        for name, methods in _variants.items()
+    ]
 
-    return cls
+
+def clear_compiled_variants():
+    """
+    Drop the from_dict and to_dict methods for options other than the
+    default, for specializations of generic dataclasses, and the codecs
+    made by codec(). They are compiled again as they are needed.
+    """
+    for methods in list(_live_variants.values()):
+        methods.clear()
+    _variants.clear()
+    _specializations.clear()
+    _codecs.clear()
+
+
+def set_max_compiled_variants(n):
+    """
+    Keep the from_dict and to_dict methods for at most n different sets of
+    options other than the default, for at most n specializations of
+    generic dataclasses, and at most n codecs, evicting the least recently
+    used.
+    """
+    global _max_variants
+    if n < 0:
+        raise ValueError('n must not be negative')
+    _max_variants = n
+    while len(_variants) > _max_variants:
+        _variants.popitem(last=False)
+    while len(_specializations) > _max_variants:
+        _evict_specialization()
+    while len(_codecs) > _max_variants:
+        _codecs.popitem(last=False)
+
+
+# (type, options) -> Codec, for the most recently used, oldest first
+_codecs: typing.OrderedDict[typing.Tuple[typing.Any, tuple], 'Codec'] = \
+    collections.OrderedDict()
+
+
+class Codec:
+    """
+    Converts values of a type to and from JSON, see codec()
+    """
+
+    def __init__(self, tp, decode, encode):
+        self.type = tp
+        self.decode = decode
+        self.encode = encode
+
+    def loads(self, json_data):
+        return self.decode(json.loads(_json_text(json_data)))
+
+    def dumps(self, value, *, separators=None, indent=None,
+              ensure_ascii=True):
+        return _dumps(
+            self.encode(value), separators=separators, indent=indent,
+            ensure_ascii=ensure_ascii,
+        )
+
+    def __repr__(self):
+        return f'<Codec for {self.type!r}>'
+
+
+def codec(tp, **options):
+    """
+    A Codec for values of tp, which may be any type that a field of a
+    dataclass_json class could have, such as List[Order] or a dataclass that
+    can't be decorated. options are those of dataclass_json, and apply to
+    all the dataclasses in tp.
+
+    Its decode and encode are each a single function compiled for all of
+    tp. The dataclasses in tp are left as they are. Codecs are kept for
+    repeated calls with the same tp and options.
+
+    Example:
+
+        orders = codec(List[Order]).loads('[{"id": 1}]')
+    """
+    key = (tp, tuple(sorted(options.items())))
+    try:
+        _codecs.move_to_end(key)
+        return _codecs[key]
+    except KeyError:
+        pass
+    codec_options = _codec_options(options)
+    result = _codecs[key] = Codec(
+        tp,
+        _codec_function(tp, codec_options, _FROM),
+        _codec_function(tp, codec_options, _TO),
+    )
+    while len(_codecs) > _max_variants:
+        _codecs.popitem(last=False)
+    return result
 
 
-def _replace_from_dict(cls, options, from_dict='from_dict'):
+def _codec_options(options):
+    # The methods of dataclasses in the type are looked up in the tables for
+    # variants, so that none are set on them, even for the default options
+    if _options_suffix(options):
+        return options
+    return {**options, 'codec': True}
+
+
+def _codec_function(tp, options, direction):
+    if direction == _FROM:
+        name = 'decode'
+        expr = expr_builder_from(tp, options)('o')
+    else:
+        name = 'encode'
+        expr = expr_builder_to(tp, options)('o')
+    code = _compile_function(f'def {name}(o):\n    return {expr}\n')
+    method = _from_dict_func(options) if direction == _FROM \
+        else _to_dict_func(options)
+    the_globals = {
+        '__builtins__': builtins,
+        **_referenced_types([tp]),
+        '__methods': _variant_methods(method, options),
+        '__encode_any': _any_encoder(options),
+        **_type_tag_tables(tp, options),
+        '__parse_datetime': _parse_datetime,
+    }
+    return types.FunctionType(code, the_globals, name)
+
+
+# Counts of generated functions that have started out being interpreted,
+# and of those that have since been promoted to compiled code.
+_tier_counts = {'interpreted': 0, 'promoted': 0}
+
+
+def tier_stats():
+    """
+    How many from_dict and to_dict methods of classes using the
+    `compile_after` option have been interpreted, and how many of those have
+    been promoted to compiled code.
+    """
+    return dict(_tier_counts)
+
+
+def _interpret_from_dict(cls, options, from_dict):
+    """
+    Use the interpreter for from_dict until it has been called
+    options['compile_after'] times, then compile it.
+    """
+    descriptors = _from_dict_descriptors(cls, options)
+    intern = _intern_tables.get(_origin_class(cls))
+    calls = 0
+    promoted = False
+
+    def interpreted(cls_, o, *, infer_missing=True):
+        nonlocal calls, promoted
+        calls += 1
+        # calls += 1 isn't atomic, so with threads calls may never be
+        # exactly compile_after
+        if calls >= options['compile_after'] and not promoted:
+            promoted = True
+            _compile_from_dict(cls, options, from_dict)
+            _repoint_public(cls, options, interpreted, from_dict)
+            _tier_counts['promoted'] += 1
+        if intern is not None:
+            return intern[_interpreted_from_dict(cls_, descriptors, o)]
+        return _interpreted_from_dict(cls_, descriptors, o)
+
+    _install(cls, options, from_dict, classmethod(interpreted))
+    _tier_counts['interpreted'] += 1
+
+
+def _interpret_to_dict(cls, options, to_dict):
+    """
+    Use the interpreter for to_dict until it has been called
+    options['compile_after'] times, then compile it.
+    """
+    descriptors = _to_dict_descriptors(cls, options)
+    calls = 0
+    promoted = False
+
+    def interpreted(self):
+        nonlocal calls, promoted
+        calls += 1
+        if calls >= options['compile_after'] and not promoted:
+            promoted = True
+            _compile_to_dict(cls, options, to_dict)
+            _repoint_public(cls, options, interpreted, to_dict)
+            _tier_counts['promoted'] += 1
+        return _interpreted_to_dict(self, descriptors)
+
+    _install(cls, options, to_dict, interpreted)
+    _tier_counts['interpreted'] += 1
+
+
+def _repoint_public(cls, options, old_func, attr):
+    """
+    The public from_dict and to_dict hold on to the method they called first.
+    Point them at attr if that was old_func, which is being replaced.
+    """
+    public = cls.__dict__.get('from_dict')
+    if getattr(public, '__func__', None) is old_func:
+        cls.from_dict = _lookup(cls, options, attr)
+    if cls.__dict__.get('to_dict') is old_func:
+        cls.to_dict = _lookup(cls, options, attr)
+
+
+def _from_dict_descriptors(cls, options):
+    """
+    (name, key, has_default, convert) for each field, where convert is
+    None if the value is used as is. The interpreted counterpart of
+    _from_dict_source.
+    """
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    descriptors = []
+    for name, field_type in _type_hints(cls).items():
+        field = fields_by_name[name]
+        has_default = (
+            field.default is not MISSING
+            or field.default_factory is not MISSING
+        )
+        convert = converter(
+            _strip_optional(field_type), options, _FROM, _field_tag(field)
+        )
+        if has_meta(field, 'decoder'):
+            convert = field.metadata['fastclasses_json']['decoder']
+        key = deduce_serialised_name(name, options, field, cls)
+        descriptors.append((name, key, has_default, convert))
+    return descriptors
+
+
+def _to_dict_descriptors(cls, options):
+    """
+    (name, key, skip_none, convert) for each field. The interpreted
+    counterpart of _to_dict_source.
+    """
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    descriptors = []
+    for name, field_type in _type_hints(cls).items():
+        field = fields_by_name[name]
+        convert = converter(field_type, options, _TO)
+        skip_none = convert is not None and not _is_untyped(field_type)
+        if has_meta(field, 'encoder'):
+            convert = field.metadata['fastclasses_json']['encoder']
+            skip_none = True
+        elif typing_get_origin(field_type) == typing.Union:
+            # None is already skipped
+            convert = converter(_strip_optional(field_type), options, _TO)
+        key = deduce_serialised_name(name, options, field, cls)
+        descriptors.append((name, key, skip_none, convert))
+    return descriptors
+
+
+def _interpreted_from_dict(cls, descriptors, o):
+    args = {}
+    for name, key, has_default, convert in descriptors:
+        if has_default and key not in o:
+            continue
+        value = o.get(key)
+        if convert is not None and value is not None:
+            value = convert(value)
+        args[name] = value
+    return cls(**args)
+
+
+def _interpreted_to_dict(self, descriptors):
+    result = {}
+    for name, key, skip_none, convert in descriptors:
+        value = getattr(self, name)
+        if skip_none and value is None:
+            continue
+        if convert is not None:
+            value = convert(value)
+        result[key] = value
+    return result
+
+
+# The kinds of values that the iterative from_dict and to_dict walk into,
+# see _iteration_shape
+_LEAF, _DATACLASS, _LIST, _TUPLE, _FIXED_TUPLE, _DICT = range(6)
+
+# from_dict or to_dict method name -> {cls: plan}, see _iteration_plan
+_iteration_plans: typing.Dict[
+    str, typing.MutableMapping[type, typing.Any]
+] = {}
+
+
+def _iterate_from_dict(cls, options, from_dict):
+    """
+    Use a from_dict that walks into nested dataclasses with a stack of work
+    rather than by calling their from_dict, so that how deeply they can be
+    nested is only limited by memory.
+    """
+    plans = _iteration_plans.setdefault(from_dict, weakref.WeakKeyDictionary())
+    plan = _iteration_plan(cls, options, _FROM)
+
+    def iterative(cls_, o, *, infer_missing=True):
+        return _iterative_from_dict(cls_, plan, o, plans, options)
 
-    from_dict_src = _from_dict_source(cls, options)
-    from_dict_module = compile(
-        from_dict_src, '<fastclass_generated_code>', 'exec'
+    _install(cls, options, from_dict, classmethod(iterative))
+
+
+def _iterate_to_dict(cls, options, to_dict):
+    """
+    Use a to_dict that walks into nested dataclasses with a stack of work,
+    see _iterate_from_dict
+    """
+    plans = _iteration_plans.setdefault(to_dict, weakref.WeakKeyDictionary())
+    plan = _iteration_plan(cls, options, _TO)
+
+    def iterative(self):
+        return _iterative_to_dict(plan, self, plans, options)
+
+    _install(cls, options, to_dict, iterative)
+
+
+def _iteration_plan(cls, options, direction, leaves=True):
+    """
+    The descriptors of the interpreter for cls, with the shape of each field
+    in place of its converter
+    """
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    hints = _type_hints(cls)
+    if direction == _FROM:
+        descriptors = _from_dict_descriptors(cls, options)
+    else:
+        descriptors = _to_dict_descriptors(cls, options)
+    plan = []
+    for name, key, flag, convert in descriptors:
+        field = fields_by_name[name]
+        if has_meta(field, 'decoder' if direction == _FROM else 'encoder'):
+            shape = (_LEAF, convert)
+        else:
+            shape = _iteration_shape(
+                hints[name], options, direction, _field_tag(field), leaves
+            )
+        plan.append((name, key, flag, shape))
+    return plan
+
+
+def _iteration_shape(t, options, direction, tag=None, leaves=True):
+    """
+    How values of t are walked into: (kind, arg) where arg is the dataclass
+    for _DATACLASS, the shapes of the items for the containers, and the
+    converter, or None, for values of a _LEAF, which have no dataclasses to
+    walk into and are converted as they would be by the interpreter. With
+    leaves false, containers of leaves are walked into as well.
+
+    A Union of dataclasses is a _DATACLASS too, with the Union as arg when
+    encoding, as instances are walked into by their class, and when
+    decoding the (key, {tag: dataclass}) they are told apart by, see
+    _shape_dataclass.
+    """
+    t = _strip_optional(t)
+    origin = typing_get_origin(t)
+    type_args = typing_get_args(t)
+
+    if _specialized_origin(t) is None and is_dataclass(origin or t):
+        return (_DATACLASS, origin or t)
+    if origin == typing.Union and all(
+        _specialized_origin(member) is None and is_dataclass(member)
+        for member in type_args
+    ):
+        if direction == _TO:
+            return (_DATACLASS, t)
+        dispatch = _union_decode_dispatch(t, options, tag)
+        if dispatch is not None:
+            [(_, (key, tags))] = dispatch
+            for cls in tags.values():
+                _ensure_processed(cls, options)
+            return (_DATACLASS, (key, tags))
+
+    shape = None
+    if origin == tuple and type_args:
+        if type_args[1:] == (Ellipsis,):
+            shape = (_TUPLE, _iteration_shape(
+                type_args[0], options, direction, tag, leaves
+            ))
+        else:
+            shape = (_FIXED_TUPLE, [
+                _iteration_shape(type_arg, options, direction, tag, leaves)
+                for type_arg in type_args
+            ])
+    elif (issubclass_safe(origin, abc.Sequence)
+          and issubclass_safe(list, origin)
+          and type_args):
+        shape = (_LIST, _iteration_shape(
+            type_args[0], options, direction, tag, leaves
+        ))
+    elif (issubclass_safe(origin, abc.Mapping)
+          and issubclass_safe(dict, origin)
+          and type_args
+          and type_args[0] in (str, int, float, bool, UUID)):
+        key_type, value_type = type_args
+        shape = (_DICT, (
+            _key_converter(key_type, options, direction),
+            _iteration_shape(value_type, options, direction, tag, leaves),
+        ))
+
+    if shape is not None:
+        kind, arg = shape
+        inners = arg if kind == _FIXED_TUPLE \
+            else [arg[1]] if kind == _DICT else [arg]
+        if not leaves or any(inner[0] != _LEAF for inner in inners):
+            return shape
+    return (_LEAF, converter(t, options, direction, tag))
+
+
+def _shape_dataclass(arg, value):
+    """
+    The dataclass that value, a dict, is decoded as for a _DATACLASS shape
+    """
+    if type(arg) is tuple:
+        key, tags = arg
+        return tags[value[key]]
+    return arg
+
+
+def _iterative_from_dict(cls, plan, o, plans, options):
+    root = [None]
+    # (shape, value, target, index) for values to be converted and stored in
+    # target[index], and (func, args, target, index) for dataclasses and
+    # tuples to be made when their items have been, in reverse
+    stack = [((_DATACLASS, None), o, root, 0)]
+    finish = []
+    while stack:
+        (kind, arg), value, target, index = stack.pop()
+        if value is None:
+            target[index] = None
+        elif kind == _DATACLASS:
+            if arg is None:
+                # The dataclass from_dict was called on
+                arg, arg_plan = cls, plan
+            else:
+                arg = _shape_dataclass(arg, value)
+                try:
+                    arg_plan = plans[arg]
+                except KeyError:
+                    arg_plan = plans[arg] = \
+                        _iteration_plan(arg, options, _FROM)
+            args = {}
+            for name, key, has_default, shape in arg_plan:
+                if has_default and key not in value:
+                    continue
+                item = value.get(key)
+                if shape[0] != _LEAF:
+                    stack.append((shape, item, args, name))
+                elif shape[1] is not None and item is not None:
+                    args[name] = shape[1](item)
+                else:
+                    args[name] = item
+            finish.append((arg, args, target, index))
+        elif kind == _LEAF:
+            target[index] = value if arg is None else arg(value)
+        elif kind == _DICT:
+            key_func, shape = arg
+            result = target[index] = {}
+            for key, item in value.items():
+                key = key_func(key)
+                # to keep the order of the keys
+                result[key] = None
+                stack.append((shape, item, result, key))
+        else:
+            result = [None] * len(value)
+            if kind == _LIST:
+                target[index] = result
+            else:
+                finish.append((tuple, result, target, index))
+            shapes = arg if kind == _FIXED_TUPLE else itertools.repeat(arg)
+            stack.extend(
+                (shape, item, result, i)
+                for i, (shape, item) in enumerate(zip(shapes, value))
+            )
+    for func, args, target, index in reversed(finish):
+        if func is tuple:
+            target[index] = tuple(args)
+        else:
+            obj = func(**args)
+            intern = _intern_tables.get(_origin_class(func))
+            target[index] = obj if intern is None else intern[obj]
+    return root[0]
+
+
+def _iterative_to_dict(plan, obj, plans, options):
+    root = [None]
+    # (shape, value, target, index) for values to be converted and stored in
+    # target[index], and (target, index) for tuples to be made when their
+    # items have been, in reverse
+    stack = [((_DATACLASS, None), obj, root, 0)]
+    finish = []
+    while stack:
+        (kind, arg), value, target, index = stack.pop()
+        if value is None:
+            target[index] = None
+        elif kind == _DATACLASS:
+            if arg is None:
+                # The dataclass to_dict was called on
+                value_plan = plan
+            else:
+                # Like the compiled to_dict, by the class of the value
+                try:
+                    value_plan = plans[type(value)]
+                except KeyError:
+                    value_plan = plans[type(value)] = \
+                        _iteration_plan(type(value), options, _TO)
+            result = target[index] = {}
+            for name, key, skip_none, shape in value_plan:
+                item = getattr(value, name)
+                if skip_none and item is None:
+                    continue
+                if shape[0] != _LEAF:
+                    # to keep the order of the keys
+                    result[key] = None
+                    stack.append((shape, item, result, key))
+                elif shape[1] is not None:
+                    result[key] = shape[1](item)
+                else:
+                    result[key] = item
+        elif kind == _LEAF:
+            target[index] = value if arg is None else arg(value)
+        elif kind == _DICT:
+            key_func, shape = arg
+            result = target[index] = {}
+            for key, item in value.items():
+                key = key_func(key)
+                result[key] = None
+                stack.append((shape, item, result, key))
+        else:
+            result = target[index] = [None] * len(value)
+            if kind != _LIST:
+                finish.append((target, index))
+            shapes = arg if kind == _FIXED_TUPLE else itertools.repeat(arg)
+            stack.extend(
+                (shape, item, result, i)
+                for i, (shape, item) in enumerate(zip(shapes, value))
+            )
+    for target, index in reversed(finish):
+        target[index] = tuple(target[index])
+    return root[0]
+
+
+# from_dict or to_dict method name -> {cls: plan}, with containers of leaves
+# walked into, see _json_chunks and _cooperative_from_dict
+_stream_plans: typing.Dict[
+    str, typing.MutableMapping[type, typing.Any]
+] = {}
+
+_DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def _stream_plan(cls, options, direction):
+    name = _from_dict_func(options) if direction == _FROM \
+        else _to_dict_func(options)
+    plans = _stream_plans.setdefault(name, weakref.WeakKeyDictionary())
+    try:
+        return plans[cls]
+    except KeyError:
+        plan = plans[cls] = \
+            _iteration_plan(cls, options, direction, leaves=False)
+        return plan
+
+
+def _json_chunks(cls, obj, options, chunk_size, ensure_ascii,
+                 max_items=None):
+    """
+    The JSON that to_json gives for obj, an instance of cls, in strs of
+    about chunk_size characters. Dataclasses that are fields, and containers,
+    are walked into, and the items of containers are converted and encoded
+    in batches, so that only about chunk_size of the JSON is held at once,
+    however many items there are. An item bigger than that makes a bigger
+    chunk. With max_items, batches are no bigger than that, and each ends a
+    chunk.
+    """
+    if options.get('graph'):
+        # Shared references are only known once the whole object was seen
+        json_data = _dumps(
+            _lookup(cls, options, _to_dict_func(options))(obj),
+            ensure_ascii=ensure_ascii
+        )
+        for start in range(0, len(json_data), chunk_size):
+            yield json_data[start:start + chunk_size]
+        return
+
+    walk = _JSONWalk(options, chunk_size, ensure_ascii, max_items)
+    pieces = []
+    size = 0
+    for piece in walk.dataclass(obj, _stream_plan(cls, options, _TO)):
+        if piece is _BATCH_END:
+            if pieces:
+                yield ''.join(pieces)
+                pieces = []
+                size = 0
+            continue
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(pieces)
+            pieces = []
+            size = 0
+    if pieces:
+        yield ''.join(pieces)
+
+
+# to_dict method name -> {dataclass or Union of them: converter}, for the
+# items of containers in _JSONWalk
+_stream_converters: typing.Dict[
+    str, typing.MutableMapping[typing.Any, typing.Any]
+] = {}
+
+# Yielded by _JSONWalk after each batch, if it's given max_items
+_BATCH_END = object()
+
+
+class _JSONWalk:
+    """
+    The pieces of the JSON of a dataclass instance, for _json_chunks
+    """
+
+    def __init__(self, options, chunk_size, ensure_ascii, max_items=None):
+        self.options = options
+        self.chunk_size = chunk_size
+        self.encode = _compact_encoders[ensure_ascii].encode
+        self.max_items = max_items
+
+    def dataclass(self, obj, plan):
+        encode = self.encode
+        yield '{'
+        sep = ''
+        for name, key, skip_none, shape in plan:
+            value = getattr(obj, name)
+            if skip_none and value is None:
+                continue
+            yield f'{sep}{encode(key)}:'
+            sep = ','
+            yield from self.value(value, shape)
+        yield '}'
+
+    def value(self, value, shape):
+        kind, arg = shape
+        if value is None:
+            yield 'null'
+        elif kind == _LEAF:
+            yield self.encode(value if arg is None else arg(value))
+        elif kind == _DATACLASS:
+            if self.options.get('iterative'):
+                # No deeper than the stack of the iterative to_dict
+                yield self.encode(self.convert((kind, arg))(value))
+                return
+            # Like the compiled to_dict, by the class of the value
+            yield from self.dataclass(
+                value, _stream_plan(type(value), self.options, _TO)
+            )
+        elif kind == _DICT:
+            yield from self.mapping(value, *arg)
+        elif kind == _FIXED_TUPLE:
+            yield '['
+            for i, (item, item_shape) in enumerate(zip(value, arg)):
+                if i:
+                    yield ','
+                yield from self.value(item, item_shape)
+            yield ']'
+        else:
+            yield from self.sequence(value, arg)
+
+    def sequence(self, value, item_shape):
+        yield '['
+        if item_shape[0] in (_LEAF, _DATACLASS):
+            convert = self.convert(item_shape)
+
+            def batch(items):
+                return [
+                    None if item is None else convert(item) for item in items
+                ]
+
+            yield from self.batches(value, batch)
+        else:
+            for i, item in enumerate(value):
+                if i:
+                    yield ','
+                yield from self.value(item, item_shape)
+        yield ']'
+
+    def mapping(self, value, key_func, item_shape):
+        encode = self.encode
+        yield '{'
+        if item_shape[0] in (_LEAF, _DATACLASS):
+            convert = self.convert(item_shape)
+
+            def batch(items):
+                return {
+                    key_func(key): None if item is None else convert(item)
+                    for key, item in items
+                }
+
+            yield from self.batches(value.items(), batch)
+        else:
+            for i, (key, item) in enumerate(value.items()):
+                key = key_func(key)
+                # As json.dumps writes keys that aren't strs
+                key = encode(key) if isinstance(key, str) \
+                    else f'"{encode(key)}"'
+                yield f',{key}:' if i else f'{key}:'
+                yield from self.value(item, item_shape)
+        yield '}'
+
+    def batches(self, items, batch):
+        """
+        The JSON of items converted by batch, without the brackets around
+        it, in pieces that come to about chunk_size characters
+        """
+        items = iter(items)
+        size = 16
+        sep = ''
+        while True:
+            json_data = self.encode(batch(itertools.islice(items, size)))
+            if len(json_data) == 2:
+                return
+            yield sep
+            yield json_data[1:-1]
+            sep = ','
+            # As many as made about chunk_size the last time
+            size = max(1, size * self.chunk_size // len(json_data))
+            if self.max_items is not None:
+                size = min(size, self.max_items)
+                yield _BATCH_END
+
+    def convert(self, shape):
+        kind, arg = shape
+        if kind != _DATACLASS:
+            return _same if arg is None else arg
+        converters = _stream_converters.setdefault(
+            _to_dict_func(self.options), weakref.WeakKeyDictionary()
+        )
+        try:
+            return converters[arg]
+        except KeyError:
+            convert = converters[arg] = converter(arg, self.options, _TO)
+            return convert
+
+
+_DEFAULT_ASYNC_THRESHOLD = 256 * 1024
+
+
+async def _to_json_async(cls, obj, options, ensure_ascii, executor, threshold,
+                         yield_every):
+    """
+    The JSON that to_json gives for obj, an instance of cls. Up to threshold
+    characters of it are encoded on the event loop, and the rest in executor,
+    or if yield_every is given, on the loop, giving way to other tasks after
+    every yield_every items of a list.
+    """
+    chunks = _json_chunks(
+        cls, obj, options, max(1, min(threshold, _DEFAULT_CHUNK_SIZE)),
+        ensure_ascii, yield_every
     )
-    from_dict_code = [
-        const for const in from_dict_module.co_consts
-        if isinstance(const, types.CodeType)
-    ][0]
+    parts = []
+    size = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if size >= threshold:
+            break
+    else:
+        return ''.join(parts)
+
+    if yield_every is not None:
+        for chunk in chunks:
+            parts.append(chunk)
+            await asyncio.sleep(0)
+        return ''.join(parts)
+    loop = asyncio.get_running_loop()
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        # Only obj can be sent to another process, not the chunks to come
+        chunks.close()
+        to_json = operator.methodcaller('to_json', ensure_ascii=ensure_ascii)
+        return await loop.run_in_executor(executor, to_json, obj)
+    return await loop.run_in_executor(
+        executor, ''.join, itertools.chain(parts, chunks)
+    )
+
+
+async def _from_json_async(cls, json_data, decoder, options, infer_missing,
+                           executor, yield_every):
+    """
+    cls.from_json(json_data), in executor, or if yield_every is given, on
+    the event loop, giving way to other tasks after every yield_every items
+    of a list
+    """
+    if yield_every is not None:
+        pieces = _parse_in_pieces(_json_text(json_data), decoder, yield_every)
+        while True:
+            try:
+                next(pieces)
+            except StopIteration as stop:
+                o = stop.value
+                break
+            await asyncio.sleep(0)
+        return await _cooperative_from_dict(
+            cls, o, options, infer_missing, yield_every
+        )
+
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        from_json = functools.partial(
+            cls.from_json, json_data, infer_missing=infer_missing
+        )
+    else:
+        from_json = functools.partial(
+            _from_json_in_pieces, cls, json_data, decoder, infer_missing
+        )
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, from_json
+    )
+
+
+def _from_json_in_pieces(cls, json_data, decoder, infer_missing):
+    """
+    cls.from_json(json_data), parsing the items of top level lists one at a
+    time, so that the event loop can take the GIL in between
+    """
+    pieces = _parse_in_pieces(_json_text(json_data), decoder, 1000)
+    while True:
+        try:
+            next(pieces)
+        except StopIteration as stop:
+            return cls.from_dict(stop.value, infer_missing=infer_missing)
+
+
+def _parse_in_pieces(text, decoder, every):
+    """
+    A generator returning decoder.decode(text). For an object, each of its
+    values is parsed on its own, and each item of those that are arrays, with
+    a yield after every that many items. decoder.decode would hold the GIL
+    until it had parsed everything.
+    """
+    skip = json.decoder.WHITESPACE.match
+    whitespace = ' \t\n\r'
+    scan = decoder.scan_once
+
+    def value_at(idx):
+        try:
+            return scan(text, idx)
+        except StopIteration as err:
+            raise json.JSONDecodeError('Expecting value', text, err.value)
+
+    idx = skip(text, 0).end()
+    if text[idx:idx + 1] != '{':
+        return decoder.decode(text)
 
+    result = {}
+    idx = skip(text, idx + 1).end()
+    end = text[idx:idx + 1] == '}'
+    while not end:
+        if text[idx:idx + 1] != '"':
+            raise json.JSONDecodeError(
+                'Expecting property name enclosed in double quotes', text, idx
+            )
+        key, idx = value_at(idx)
+        idx = skip(text, idx).end()
+        if text[idx:idx + 1] != ':':
+            raise json.JSONDecodeError("Expecting ':' delimiter", text, idx)
+        idx = skip(text, idx + 1).end()
+
+        if text[idx:idx + 1] == '[':
+            value = result[key] = []
+            append = value.append
+            idx = skip(text, idx + 1).end()
+            closed = text[idx:idx + 1] == ']'
+            countdown = every
+            while not closed:
+                item, idx = value_at(idx)
+                append(item)
+                countdown -= 1
+                if not countdown:
+                    yield
+                    countdown = every
+                # Compact JSON has no whitespace to skip
+                c = text[idx:idx + 1]
+                if c and c in whitespace:
+                    idx = skip(text, idx).end()
+                    c = text[idx:idx + 1]
+                if c == ',':
+                    idx += 1
+                    if text[idx:idx + 1] in whitespace:
+                        idx = skip(text, idx).end()
+                elif c == ']':
+                    closed = True
+                else:
+                    raise json.JSONDecodeError(
+                        "Expecting ',' delimiter", text, idx
+                    )
+            idx += 1
+        else:
+            result[key], idx = value_at(idx)
+
+        idx = skip(text, idx).end()
+        end = text[idx:idx + 1] == '}'
+        if not end:
+            if text[idx:idx + 1] != ',':
+                raise json.JSONDecodeError(
+                    "Expecting ',' delimiter", text, idx
+                )
+            idx = skip(text, idx + 1).end()
+
+    idx = skip(text, idx + 1).end()
+    if idx != len(text):
+        raise json.JSONDecodeError('Extra data', text, idx)
+    return result
+
+
+async def _cooperative_from_dict(cls, o, options, infer_missing, yield_every):
+    """
+    cls.from_dict(o), with the items of long lists in the fields of cls
+    converted yield_every at a time, giving way to other tasks in between.
+    Those lists are filled in after the instance is made, so classes with a
+    __post_init__, which would see them empty, are left as they are.
+    """
+    deferred = []
+    if (isinstance(o, dict) and not options.get('graph')
+            and not hasattr(cls, '__post_init__')):
+        for name, key, _, (kind, arg) in _stream_plan(cls, options, _FROM):
+            items = o.get(key)
+            if (kind == _LIST and arg[0] in (_LEAF, _DATACLASS)
+                    and isinstance(items, list) and len(items) > yield_every):
+                deferred.append((name, key, items, arg))
+    if deferred:
+        o = dict(o)
+        for _, key, _, _ in deferred:
+            o[key] = []
+    obj = cls.from_dict(o, infer_missing=infer_missing)
+
+    for name, _, items, (kind, arg) in deferred:
+        target = getattr(obj, name)
+        if kind == _LEAF:
+            convert = arg
+        elif type(arg) is tuple:
+            # A Union of dataclasses
+            convert = functools.partial(_decode_tagged, arg, options)
+        else:
+            convert = converter(arg, options, _FROM)
+        for start in range(0, len(items), yield_every):
+            await asyncio.sleep(0)
+            batch = items[start:start + yield_every]
+            if convert is not None:
+                batch = [
+                    None if item is None else convert(item) for item in batch
+                ]
+            target.extend(batch)
+    return obj
+
+
+def _decode_tagged(arg, options, value):
+    cls = _shape_dataclass(arg, value)
+    return _lookup(cls, options, _from_dict_func(options))(value)
+
+
+# to_json_bytes encodes a chunk at a time for instances with a list, tuple
+# or dict field of more items than this. For fewer, walking the instance
+# costs more than making the dict and the str does.
+_CHUNKED_BYTES_ITEMS = 1000
+
+
+def _has_long_field(cls, obj):
+    for field in _fields(cls):
+        value = getattr(obj, field.name)
+        if (isinstance(value, (list, tuple, dict))
+                and len(value) > _CHUNKED_BYTES_ITEMS):
+            return True
+    return False
+
+
+def _json_bytes(cls, obj, options, ensure_ascii):
+    """
+    The UTF-8 bytes of to_json for obj, an instance of cls, encoded a chunk
+    at a time, so that neither the dict from to_dict nor the whole str are
+    held at once
+    """
+    return b''.join([
+        _encode_json(chunk) for chunk in
+        _json_chunks(cls, obj, options, _DEFAULT_CHUNK_SIZE, ensure_ascii)
+    ])
+
+
+def _write_json_chunks(fp, chunks):
+    """
+    Write chunks to fp, which is a text or binary file, or a socket. Files
+    are written bytes unless they are text files or have a text mode.
+    """
+    if not hasattr(fp, 'write'):
+        write = fp.sendall
+        binary = True
+    elif isinstance(fp, io.RawIOBase):
+
+        def write(data):
+            # Raw files may write only some of it
+            view = memoryview(data)
+            while view:
+                view = view[fp.write(view):]
+
+        binary = True
+    else:
+        write = fp.write
+        # Wrappers such as NamedTemporaryFile aren't io classes themselves
+        mode = getattr(fp, 'mode', None)
+        binary = not isinstance(fp, io.TextIOBase) and not (
+            isinstance(mode, str) and 'b' not in mode
+        )
+    for chunk in chunks:
+        write(_encode_json(chunk) if binary else chunk)
+
+
+def _graph_from_dict(cls, options, from_dict):
+    """
+    Use a from_dict that decodes the output of the graph to_dict, giving
+    objects that were shared when encoded the same identity again
+    """
+    plans = _iteration_plans.setdefault(from_dict, weakref.WeakKeyDictionary())
+    plan = _iteration_plan(cls, options, _FROM)
+
+    def graph(cls_, o, *, infer_missing=True):
+        return _GraphDecoder(plans, options).decode(cls_, plan, o)
+
+    _install(cls, options, from_dict, classmethod(graph))
+
+
+def _graph_to_dict(cls, options, to_dict):
+    """
+    Use a to_dict that encodes each dataclass instance that is reached more
+    than once only the first time, with an "$id", and as {"$ref": id} after
+    that
+    """
+    plans = _iteration_plans.setdefault(to_dict, weakref.WeakKeyDictionary())
+    plan = _iteration_plan(cls, options, _TO)
+
+    def graph(self):
+        return _GraphEncoder(plans, options).encode(plan, self)
+
+    _install(cls, options, to_dict, graph)
+
+
+class _GraphEncoder:
+
+    def __init__(self, plans, options):
+        self.plans = plans
+        self.options = options
+        # id(obj) -> $id, for the shared objects encoded so far
+        self.ids = {}
+        self.shared = set()
+
+    def plan(self, cls):
+        try:
+            return self.plans[cls]
+        except KeyError:
+            plan = self.plans[cls] = _iteration_plan(cls, self.options, _TO)
+            return plan
+
+    def encode(self, plan, obj):
+        self.shared = self.find_shared(plan, obj)
+        return self.dataclass(plan, obj)
+
+    def find_shared(self, plan, obj):
+        """
+        The ids of the dataclass instances reached more than once from obj
+        """
+        seen = {id(obj)}
+        shared = set()
+        stack = [(shape, getattr(obj, name)) for name, _, _, shape in plan]
+        while stack:
+            (kind, arg), value = stack.pop()
+            if value is None or kind == _LEAF:
+                continue
+            elif kind == _DATACLASS:
+                if id(value) in seen:
+                    shared.add(id(value))
+                    continue
+                seen.add(id(value))
+                stack.extend(
+                    (shape, getattr(value, name))
+                    for name, _, _, shape in self.plan(type(value))
+                )
+            elif kind == _DICT:
+                stack.extend((arg[1], item) for item in value.values())
+            elif kind == _FIXED_TUPLE:
+                stack.extend(zip(arg, value))
+            else:
+                stack.extend((arg, item) for item in value)
+        return shared
+
+    def dataclass(self, plan, obj):
+        try:
+            return {'$ref': self.ids[id(obj)]}
+        except KeyError:
+            pass
+        result = {}
+        if id(obj) in self.shared:
+            result['$id'] = self.ids[id(obj)] = len(self.ids) + 1
+        for name, key, skip_none, shape in plan:
+            item = getattr(obj, name)
+            if skip_none and item is None:
+                continue
+            result[key] = self.value(shape, item)
+        return result
+
+    def value(self, shape, value):
+        kind, arg = shape
+        if value is None:
+            return None
+        elif kind == _LEAF:
+            return value if arg is None else arg(value)
+        elif kind == _DATACLASS:
+            return self.dataclass(self.plan(type(value)), value)
+        elif kind == _DICT:
+            key_func, inner = arg
+            return {
+                key_func(key): self.value(inner, item)
+                for key, item in value.items()
+            }
+        elif kind == _FIXED_TUPLE:
+            return tuple(
+                self.value(inner, item) for inner, item in zip(arg, value)
+            )
+        elif kind == _TUPLE:
+            return tuple(self.value(arg, item) for item in value)
+        return [self.value(arg, item) for item in value]
+
+
+class _Ref:
+    """
+    A reference to an object that hasn't been made yet
+    """
+    __slots__ = ('id',)
+
+    def __init__(self, id):
+        self.id = id
+
+
+class _GraphDecoder:
+
+    def __init__(self, plans, options):
+        self.plans = plans
+        self.options = options
+        # $id -> object
+        self.objects = {}
+        # ($id, target, index) for each reference to an object that hasn't
+        # been made yet, which is a cycle. target is the object with the
+        # field named index or the list or dict with the item at index that
+        # is to be set to it afterwards.
+        self.cycles = []
+
+    def plan(self, cls):
+        try:
+            return self.plans[cls]
+        except KeyError:
+            plan = self.plans[cls] = _iteration_plan(cls, self.options, _FROM)
+            return plan
+
+    def decode(self, cls, plan, o):
+        result = self.dataclass(cls, plan, o)
+        for ref, target, index in self.cycles:
+            try:
+                obj = self.objects[ref]
+            except KeyError:
+                raise ValueError(f'no object with "$id": {ref!r}') from None
+            if isinstance(target, (list, dict)):
+                target[index] = obj
+            else:
+                # frozen dataclasses too
+                object.__setattr__(target, index, obj)
+        return result
+
+    def dataclass(self, cls, plan, o):
+        args = {}
+        refs = []
+        for name, key, has_default, shape in plan:
+            if has_default and key not in o:
+                continue
+            item = self.value(shape, o.get(key))
+            if type(item) is _Ref:
+                refs.append((item.id, name))
+                item = None
+            args[name] = item
+        obj = cls(**args)
+        intern = _intern_tables.get(_origin_class(cls))
+        if intern is not None and not refs:
+            # Those with refs aren't finished, until the cycles are filled in
+            obj = intern[obj]
+        if '$id' in o:
+            self.objects[o['$id']] = obj
+        self.cycles.extend((ref, obj, name) for ref, name in refs)
+        return obj
+
+    def value(self, shape, value):
+        """
+        value decoded as shape, or a _Ref
+        """
+        kind, arg = shape
+        if value is None:
+            return None
+        elif kind == _LEAF:
+            return value if arg is None else arg(value)
+        elif kind == _DATACLASS:
+            if '$ref' in value:
+                try:
+                    return self.objects[value['$ref']]
+                except KeyError:
+                    return _Ref(value['$ref'])
+            cls = _shape_dataclass(arg, value)
+            return self.dataclass(cls, self.plan(cls), value)
+        elif kind == _DICT:
+            key_func, inner = arg
+            result = {}
+            for key, item in value.items():
+                key = key_func(key)
+                result[key] = item = self.value(inner, item)
+                if type(item) is _Ref:
+                    self.cycles.append((item.id, result, key))
+            return result
+        elif kind == _FIXED_TUPLE:
+            result = [self.value(inner, item) for inner, item in zip(arg, value)]
+        else:
+            result = [self.value(arg, item) for item in value]
+        for i, item in enumerate(result):
+            if type(item) is _Ref:
+                if kind != _LIST:
+                    raise ValueError(
+                        f'a cycle through a tuple can\'t be decoded: '
+                        f'"$ref": {item.id!r}'
+                    )
+                self.cycles.append((item.id, result, i))
+        return result if kind == _LIST else tuple(result)
+
+
+def _compile_from_dict(cls, options, from_dict):
+    if options.get('specialize_after'):
+        _profile_from_dict(cls, options, from_dict)
+    else:
+        _replace_from_dict(cls, options, from_dict)
+
+
+def _compile_to_dict(cls, options, to_dict):
+    if options.get('specialize_after'):
+        _profile_to_dict(cls, options, to_dict)
+    else:
+        _replace_to_dict(cls, options, to_dict)
+
+
+def _profile_from_dict(cls, options, from_dict):
+    """
+    Use the general from_dict while recording the keys of the first
+    options['specialize_after'] inputs, then replace it with one specialized
+    for the most common set of keys.
+    """
+    _replace_from_dict(cls, options, from_dict)
+    general = _lookup(cls, options, from_dict).__func__
+    if _is_wide(cls):
+        # Wide classes don't use keyword arguments, which the specialized
+        # version would.
+        return
+
+    shapes = collections.Counter()
+    calls = 0
+    specialized = False
+
+    def profiling(cls_, o, *, infer_missing=True):
+        nonlocal calls, specialized
+        shapes[frozenset(o.keys())] += 1
+        calls += 1
+        # As for compile_after, see _interpret_from_dict
+        if calls >= options['specialize_after'] and not specialized:
+            specialized = True
+            _specialize_from_dict(cls, options, from_dict, general, shapes)
+            _repoint_public(cls, options, profiling, from_dict)
+        return general(cls_, o, infer_missing=infer_missing)
+
+    _install(cls, options, from_dict, classmethod(profiling))
+
+
+def _specialize_from_dict(cls, options, from_dict, general, shapes):
+    keys, _ = shapes.most_common(1)[0]
+    if keys == _input_names(cls, options):
+        # The general from_dict already has a path for this
+        _install(cls, options, from_dict, classmethod(general))
+        return
+
+    src = _specialized_from_dict_source(cls, options, keys)
     the_globals = {
-        # use the defining module's globals
-        **sys.modules[cls.__module__].__dict__,
-        # along with any decoders
-        **decoders(cls),
-        # along with types we use for the conversion
-        **referenced_types(cls),
+        **general.__globals__,
+        '__general': general,
+        '__profiled_keys': keys,
     }
-    if HAS_DATEUTIL:
-        the_globals['dateutil'] = dateutil
+    func = types.FunctionType(_compile_function(src), the_globals, from_dict)
+    func.__kwdefaults__ = {'infer_missing': True}
+    _install(cls, options, from_dict, classmethod(func))
+
+
+def _specialized_from_dict_source(cls, options, keys):
+    return '\n'.join([
+        'def from_dict(cls, o, *, infer_missing):',
+        f'    if len(o) == {len(keys)} and o.keys() == __profiled_keys:',
+        f'        return {_new(cls)[0]}',
+        *[f'            {arg},' for arg in _shape_args(cls, options, keys)],
+        f'        {_new(cls)[1]}',
+        '    return __general(cls, o, infer_missing=infer_missing)',
+        '',
+    ])
+
+
+def _profile_to_dict(cls, options, to_dict):
+    """
+    Use the general to_dict while recording which of the fields that may be
+    left out are None, for the first options['specialize_after'] calls.
+    Then replace it with one specialized for the most common combination.
+    """
+    _replace_to_dict(cls, options, to_dict)
+    general = _lookup(cls, options, to_dict)
+
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    names = [
+        name for name, field_type in _type_hints(cls).items()
+        if _to_dict_transform(fields_by_name[name], field_type, options)[0]
+    ]
+    if not names:
+        # Nothing to specialize on
+        return
+
+    patterns = collections.Counter()
+    calls = 0
+    specialized = False
+
+    def profiling(self):
+        nonlocal calls, specialized
+        patterns[tuple(getattr(self, name) is None for name in names)] += 1
+        calls += 1
+        if calls >= options['specialize_after'] and not specialized:
+            specialized = True
+            pattern, _ = patterns.most_common(1)[0]
+            _specialize_to_dict(
+                cls, options, to_dict, general, dict(zip(names, pattern))
+            )
+            _repoint_public(cls, options, profiling, to_dict)
+        return general(self)
+
+    _install(cls, options, to_dict, profiling)
+
+
+def _specialize_to_dict(cls, options, to_dict, general, is_none):
+    src = _specialized_to_dict_source(cls, options, is_none)
+    the_globals = {**general.__globals__, '__general': general}
+    func = types.FunctionType(_compile_function(src), the_globals, to_dict)
+    _install(cls, options, to_dict, func)
+
+
+def _specialized_to_dict_source(cls, options, is_none):
+    """
+    to_dict for when the fields in is_none are None, or not, as given
+    """
+    guards = []
+    items = []
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    for name, field_type in _type_hints(cls).items():
+        field = fields_by_name[name]
+        output_name = deduce_serialised_name(name, options, field, cls)
+        skip_none, transform = _to_dict_transform(field, field_type, options)
+        if not skip_none:
+            items.append(f'{output_name!r}: {transform(f"self.{name}")}')
+        elif is_none[name]:
+            guards.append(f'self.{name} is None')
+        else:
+            p = f'__p{len(guards)}'
+            guards.append(f'({p}:=self.{name}) is not None')
+            items.append(f'{output_name!r}: {transform(p)}')
+    return '\n'.join([
+        'def to_dict(self):',
+        f'    if {" and ".join(guards)}:',
+        '        return {' + ', '.join(items) + '}',
+        '    return __general(self)',
+        '',
+    ])
+
+
+def _replace_from_dict(cls, options, from_dict='from_dict'):
+
+    from_dict_code = _pregenerated_code(cls, options, _FROM)
+    if from_dict_code is not None:
+        _process_referenced_classes(cls, options)
+    else:
+        from_dict_src = _from_dict_source(cls, options)
+        from_dict_code = _compile_function(from_dict_src)
 
     from_dict_func = types.FunctionType(
         from_dict_code,
-        the_globals,
+        _from_dict_globals(cls, options),
         from_dict,
     )
     from_dict_func.__kwdefaults__ = {'infer_missing': True}
 
-    setattr(cls, from_dict, classmethod(from_dict_func))
+    _install(cls, options, from_dict, classmethod(from_dict_func))
 
 
 def _replace_to_dict(cls, options, to_dict='to_dict'):
 
-    to_dict_src = _to_dict_source(cls, options)
-    to_dict_module = compile(
-        to_dict_src, '<fastclass_generated_code>', 'exec'
+    to_dict_code = _pregenerated_code(cls, options, _TO)
+    if to_dict_code is not None:
+        _process_referenced_classes(cls, options)
+    else:
+        to_dict_src = _to_dict_source(cls, options)
+        to_dict_code = _compile_function(to_dict_src)
+
+    to_dict_func = types.FunctionType(
+        to_dict_code,
+        _to_dict_globals(cls, options),
+        to_dict,
     )
-    to_dict_code = [
-        const for const in to_dict_module.co_consts
+
+    _install(cls, options, to_dict, to_dict_func)
+
+
+# Generated source -> code object. Code objects don't hold on to any globals,
+# so structurally identical dataclasses can share one, each with their own
+# globals in the function that wraps it. Entries go when the last function
+# using them does.
+_code_cache: typing.MutableMapping[str, types.CodeType] = \
+    weakref.WeakValueDictionary()
+
+
+def _compile_function(src):
+    try:
+        return _code_cache[src]
+    except KeyError:
+        pass
+    module_code = compile(src, '<fastclass_generated_code>', 'exec')
+    code = [
+        const for const in module_code.co_consts
         if isinstance(const, types.CodeType)
     ][0]
+    _code_cache[src] = code
+    return code
+
+
+def _pregenerated_code(cls, options, direction):
+    """
+    Look for code for cls in the ahead-of-time generated module of its
+    package, returning None if there isn't any or if it's out of date.
+    """
+    if _specialized_origin(cls) is not None:
+        return None
+    module = _generated_module(cls.__module__)
+    if module is None:
+        return None
+    table = module.FROM_DICT if direction == _FROM else module.TO_DICT
+    entry = table.get(
+        (cls.__module__, cls.__qualname__, _options_key(options))
+    )
+    if entry is None:
+        return None
+    fingerprint, func = entry
+    if fingerprint != _fingerprint(cls, options):
+        warnings.warn(
+            f'{module.__name__} is out of date for {cls.__qualname__}, '
+            'falling back to runtime code generation. '
+            'Regenerate it with `python -m fastclasses_json codegen`',
+            StaleCodegenWarning,
+        )
+        return None
+    return func.__code__
+
+
+def _process_referenced_classes(cls, options):
+    # Done by expr_builder as a side effect, when generating code at runtime
+    for t in referenced_types(cls).values():
+        if is_dataclass(t):
+            _ensure_processed(t, options)
+
+
+_generated_modules: typing.Dict[str, typing.Optional[types.ModuleType]] = {}
+
+
+def _generated_module_name(module_name):
+    package, _, _ = module_name.rpartition('.')
+    if package:
+        return f'{package}.{GENERATED_MODULE}'
+    return GENERATED_MODULE
+
+
+def _generated_module(module_name):
+    name = _generated_module_name(module_name)
+    try:
+        return _generated_modules[name]
+    except KeyError:
+        pass
+    try:
+        module = importlib.import_module(name)
+    except ModuleNotFoundError as e:
+        if e.name not in (name, name.rpartition('.')[0]):
+            raise
+        module = None
+    _generated_modules[name] = module
+    return module
+
+
+def _options_key(options):
+    """
+    A representation of options that is stable between processes
+    """
+    def stable_repr(value):
+        if callable(value):
+            qualname = getattr(value, '__qualname__', None)
+            if qualname is None:
+                return f'<{type(value).__qualname__} at {id(value):#x}>'
+            module = (
+                getattr(value, '__module__', None)
+                or getattr(getattr(value, '__objclass__', None), '__module__', None)
+            )
+            return f'{module}.{qualname}'
+        return repr(value)
+
+    return ','.join(
+        f'{k}={stable_repr(v)}'
+        for k, v in sorted((options or {}).items())
+        if v is not None
+    )
 
+
+def _fingerprint(cls, options):
+    """
+    A digest of everything about cls that goes into generating its code
+    """
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    parts = [
+        str(_CODEGEN_VERSION),
+        str(HAS_DATEUTIL),
+        str(_WIDE_THRESHOLD),
+        str(_origin_class(cls) in _intern_tables),
+        _options_key(options),
+    ]
+    for name, field_type in _type_hints(cls).items():
+        field = fields_by_name[name]
+        parts.append(repr((
+            name,
+            repr(field_type),
+            deduce_serialised_name(name, options, field, cls),
+            field.default is not MISSING
+            or field.default_factory is not MISSING,
+            has_meta(field, 'decoder'),
+            has_meta(field, 'encoder'),
+            _field_tag(field),
+            # which depends on the members of unions, such as their tags
+            _union_parts(field_type, options, _field_tag(field)),
+        )))
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def _union_parts(field_type, options, tag):
+    """
+    How the unions in field_type are told apart, for _fingerprint
+    """
+    parts = []
+    for t in _walk_types(field_type):
+        if (typing_get_origin(t) == typing.Union
+                and len(_union_members(t)) > 1):
+            parts.append(repr((
+                _union_dispatch(t, options, _FROM, tag),
+                _union_dispatch(t, options, _TO, tag),
+            )))
+    return parts
+
+
+def _from_dict_globals(cls, options):
+    the_globals = {
+        # use the defining module's globals
+        **sys.modules[_origin_class(cls).__module__].__dict__,
+        # along with any decoders
+        **decoders(cls),
+        # along with types we use for the conversion
+        **referenced_types(cls),
+    }
+    the_globals['__parse_datetime'] = _parse_datetime
+    if _uses_variant_methods(cls, _from_dict_func(options)):
+        the_globals['__methods'] = \
+            _variant_methods(_from_dict_func(options), options)
+    the_globals['__keys'] = _input_names(cls, options)
+    if _origin_class(cls) in _intern_tables:
+        the_globals['__intern'] = _intern_tables[_origin_class(cls)]
+    the_globals['__shape_counts'] = _shape_counts.setdefault(cls, [0, 0])
+    if _is_wide(cls):
+        the_globals['__key_list'], the_globals['__defaults'] = \
+            _wide_tables(cls, options)
+    the_globals.update(_tag_tables(cls, options))
+    return the_globals
+
+
+def _to_dict_globals(cls, options):
     the_globals = {
         # use the defining module's globals
-        **sys.modules[cls.__module__].__dict__,
+        **sys.modules[_origin_class(cls).__module__].__dict__,
         # along with any encoders
         **encoders(cls),
+        # and the types that unions and variants are told apart by
+        **referenced_types(cls),
+        '__encode_any': _any_encoder(options),
     }
-
-    to_dict_func = types.FunctionType(
-        to_dict_code,
-        the_globals,
-        to_dict,
+    if _uses_variant_methods(cls, _to_dict_func(options)):
+        the_globals['__methods'] = \
+            _variant_methods(_to_dict_func(options), options)
+    return the_globals
+
+
+def _uses_variant_methods(cls, name):
+    """
+    Whether the code generated for cls looks up methods in __methods
+    """
+    return _is_variant(name) or any(
+        _specialized_origin(t) is not None
+        for t in referenced_types(cls).values()
     )
 
-    setattr(cls, to_dict, to_dict_func)
-
 
 def _from_dict_source(cls, options=None):
 
+    if _is_wide(cls):
+        return _wide_from_dict_source(cls, options)
+
     lines = [
         'def from_dict(cls, o, *, infer_missing):',
+        f'    if len(o) == {len(_input_names(cls, options))} '
+        'and o.keys() == __keys:',
+        '        __shape_counts[0] += 1',
+        f'        return {_new(cls)[0]}',
+        *[f'            {arg},' for arg in _shape_args(cls, options)],
+        f'        {_new(cls)[1]}',
+        '    __shape_counts[1] += 1',
         '    args = {}',
     ]
 
-    fields_by_name = {f.name: f for f in dataclass_fields(cls)}
+    fields_by_name = {f.name: f for f in _fields(cls)}
 
-    for name, field_type in typing.get_type_hints(cls).items():
-
-        # pop off the top layer of optional, since we are using o.get
-        if typing_get_origin(field_type) == typing.Union:
-            field_type = typing_get_args(field_type)[0]
+    for name, field_type in _type_hints(cls).items():
 
         field = fields_by_name[name]
 
@@ -185,9 +2402,7 @@ def _from_dict_source(cls, options=None):
 
         access = f'o.get({input_name!r})'
 
-        transform = expr_builder_from(field_type, options)
-        if has_meta(field, 'decoder'):
-            transform = decoder_expr(name)
+        transform = _from_dict_transform(field, field_type, options)
 
         if transform('x') != 'x':
             lines.append(f'    value = {access}')
@@ -206,11 +2421,154 @@ def _from_dict_source(cls, options=None):
                 lines.append(f'        args[{name!r}] = {access}')
             else:
                 lines.append(f'    args[{name!r}] = {access}')
-    lines.append('    return cls(**args)')
+    lines.append('    return {}**args{}'.format(*_new(cls)))
     lines.append('')
     return '\n'.join(lines)
 
 
+def _new(cls):
+    """
+    The start and end of the expression making an instance of cls in
+    generated code, around the arguments
+    """
+    if _origin_class(cls) in _intern_tables:
+        return '__intern[cls(', ')]'
+    return 'cls(', ')'
+
+
+def _from_dict_transform(field, field_type, options):
+    # pop off the top layer of optional, since we check for None anyway
+    field_type = _strip_optional(field_type)
+
+    if has_meta(field, 'decoder'):
+        return decoder_expr(field.name)
+    return expr_builder_from(field_type, options, tag=_field_tag(field))
+
+
+def _shape_args(cls, options, keys=None):
+    """
+    Keyword arguments for cls, for when the input has exactly the given keys
+    (all of the expected ones if None), in which case there's no need to
+    check for the presence of each one.
+    """
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    args = []
+    for name, field_type in _type_hints(cls).items():
+        field = fields_by_name[name]
+        input_name = deduce_serialised_name(name, options, field, cls)
+
+        if keys is not None and input_name not in keys:
+            if (field.default is MISSING
+                    and field.default_factory is MISSING):
+                args.append(f'{name}=None')
+            continue
+
+        transform = _from_dict_transform(field, field_type, options)
+        if transform('x') != 'x':
+            # transform may be a conditional expression itself
+            args.append(
+                f'{name}=({transform("__f")}) if (__f:=o[{input_name!r}]) '
+                'is not None else None'
+            )
+        else:
+            args.append(f'{name}=o[{input_name!r}]')
+    return args
+
+
+# Past this many fields, from_dict is generated to use lookup tables rather
+# than straight-line code for each field. Calling cls(**args) with many
+# keyword arguments is quadratic in the number of fields, and the function
+# itself becomes slow to compile.
+_WIDE_THRESHOLD = 64
+
+
+def _is_wide(cls):
+    fields = _fields(cls)
+    return (
+        len(fields) > _WIDE_THRESHOLD
+        # so that we can pass all the arguments positionally
+        and all(f.init and not getattr(f, 'kw_only', False) for f in fields)
+    )
+
+
+def _wide_from_dict_source(cls, options):
+    """
+    from_dict for classes with many fields. Values are fetched in field order
+    by mapping over a tuple of keys, only fields needing conversion get a line
+    of their own, and cls is called with positional arguments.
+    """
+    lines = [
+        'def from_dict(cls, o, *, infer_missing):',
+        f'    if len(o) == {len(_input_names(cls, options))} '
+        'and o.keys() == __keys:',
+        '        __shape_counts[0] += 1',
+        '        args = list(map(o.__getitem__, __key_list))',
+        '        defaults = ()',
+        '    else:',
+        '        __shape_counts[1] += 1',
+        '        args = list(map(o.get, __key_list))',
+        '        defaults = __defaults',
+    ]
+
+    type_hints = _type_hints(cls)
+
+    for i, field in enumerate(_fields(cls)):
+        transform = _from_dict_transform(
+            field, type_hints[field.name], options
+        )
+        if transform('x') != 'x':
+            lines.append(f'    value = args[{i}]')
+            lines.append(f'    if value is not None:')  # noqa: F541
+            lines.append(f'        args[{i}] = ' + transform('value'))  # noqa: E501,F541
+
+    # Missing fields with defaults get them after the conversions, so that
+    # the defaults themselves are not converted
+    lines.append('    for i, key, default in defaults:')
+    lines.append('        if key not in o:')
+    lines.append('            args[i] = default()')
+    lines.append('    return {}*args{}'.format(*_new(cls)))
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def _wide_tables(cls, options):
+    """
+    The keys in field order, and (index, key, default) for each field
+    with a default, as used by _wide_from_dict_source
+    """
+    key_list = []
+    defaults = []
+    for i, field in enumerate(_fields(cls)):
+        key = deduce_serialised_name(field.name, options, field, cls)
+        key_list.append(key)
+        if field.default is not MISSING:
+            # a callable that always returns the default
+            defaults.append((i, key, itertools.repeat(field.default).__next__))
+        elif field.default_factory is not MISSING:
+            defaults.append((i, key, field.default_factory))
+    return tuple(key_list), tuple(defaults)
+
+
+def _input_names(cls, options):
+    """
+    The set of keys that from_dict expects to find in its input
+    """
+    return frozenset(
+        deduce_serialised_name(field.name, options, field, cls)
+        for field in _fields(cls)
+    )
+
+
+def fast_path_stats(cls):
+    """
+    How many times from_dict has been called on cls with exactly the expected
+    keys (`exact`), and how many times it has had to check for each field
+    (`fallback`).
+    """
+    exact, fallback = _shape_counts.get(cls, (0, 0))
+    return {'exact': exact, 'fallback': fallback}
+
+
 def _to_dict_source(cls, options=None):
 
     lines = [
@@ -221,29 +2579,20 @@ def _to_dict_source(cls, options=None):
     # TODO: option for including Nones or not
     INCLUDE_NONES = False
 
-    fields_by_name = {f.name: f for f in dataclass_fields(cls)}
+    fields_by_name = {f.name: f for f in _fields(cls)}
 
-    for name, field_type in typing.get_type_hints(cls).items():
+    for name, field_type in _type_hints(cls).items():
 
         access = f'self.{name}'
 
-        transform = expr_builder_to(field_type, options)
-
-        # custom encoder and decoder routines
         field = fields_by_name[name]
-        if has_meta(field, 'encoder'):
-            transform = encoder_expr(name)
 
         # custom mapping of dataclass fieldnames to json field names
         output_name = deduce_serialised_name(name, options, field, cls)
 
-        if transform('x') != 'x':
-            # since we have an is not none check, elide the first level
-            # of optional
-            if (typing_get_origin(field_type) == typing.Union
-                    # This is a bit yuk. Premature optimization 🙄
-                    and transform('x') == expr_builder_to(field_type, options)('x')):
-                transform = expr_builder_to(typing_get_args(field_type)[0], options)
+        skip_none, transform = _to_dict_transform(field, field_type, options)
+
+        if skip_none:
             lines.append(f'    value = {access}')
             lines.append(f'    if value is not None:')  # noqa: F541
             lines.append(f'        value = ' + transform('value'))  # noqa: E501,F541
@@ -252,13 +2601,34 @@ def _to_dict_source(cls, options=None):
             else:
                 lines.append(f'        result[{output_name!r}] = value')
         else:
-            lines.append(f'    result[{output_name!r}] = {access}')
+            lines.append(f'    result[{output_name!r}] = {transform(access)}')
 
     lines.append('    return result')
     lines.append('')
     return '\n'.join(lines)
 
 
+def _to_dict_transform(field, field_type, options):
+    """
+    Whether None values are left out, and the transform for the rest
+    """
+    transform = expr_builder_to(field_type, options)
+
+    # custom encoder and decoder routines
+    if has_meta(field, 'encoder'):
+        return True, encoder_expr(field.name)
+
+    if transform('x') == 'x' or _is_untyped(field_type):
+        # _any_encoder keeps None as it is
+        return False, transform
+
+    # since we have an is not none check, elide the first level
+    # of optional
+    if typing_get_origin(field_type) == typing.Union:
+        transform = expr_builder_to(_strip_optional(field_type), options)
+    return True, transform
+
+
 def deduce_serialised_name(name, options, field, cls):
     serialised_name = name
     if options and options.get('field_name_transform'):
@@ -280,7 +2650,7 @@ def deduce_serialised_name(name, options, field, cls):
 
 def encoders(cls):
     result = {}
-    for field in dataclass_fields(cls):
+    for field in _fields(cls):
         if has_meta(field, 'encoder'):
             sym = f'{field.name}#encoder'
             result[sym] = field.metadata['fastclasses_json']['encoder']
@@ -289,7 +2659,7 @@ def encoders(cls):
 
 def decoders(cls):
     result = {}
-    for field in dataclass_fields(cls):
+    for field in _fields(cls):
         if has_meta(field, 'decoder'):
             sym = f'{field.name}#decoder'
             result[sym] = field.metadata['fastclasses_json']['decoder']
@@ -312,15 +2682,20 @@ def decoder_expr(name):
     return lambda expr: f'globals()["{name}#decoder"]({expr})'
 
 
-def expr_builder_from(t: type, options, depth=0):
-    return expr_builder(t, options, depth, direction=_FROM)
+def expr_builder_from(t: type, options, depth=0, tag=None):
+    return expr_builder(t, options, depth, direction=_FROM, tag=tag)
 
 
 def expr_builder_to(t: type, options, depth=0):
     return expr_builder(t, options, depth, direction=_TO)
 
 
-def expr_builder(t: type, options=None, depth=0, direction=_FROM):
+def expr_builder(t: type, options=None, depth=0, direction=_FROM, tag=None):
+    """
+    A function from a python expression for a value of type t to one for
+    the value converted. tag is the name of the field that tells apart
+    the dataclasses of a union, if given in the field's metadata.
+    """
     def identity(expr):
         return expr
 
@@ -329,19 +2704,27 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
     origin = typing_get_origin(t)
 
     if origin == typing.Union:
-        type_arg = typing_get_args(t)[0]
-        inner = expr_builder(type_arg, options, depth + 1, direction)
+        members = _union_members(t)
+        if len(members) > 1:
+            f = _union_expr_builder(t, options, depth, direction, tag)
+            if f is not None:
+                return f
+        type_arg = members[0]
+        inner = expr_builder(type_arg, options, depth + 1, direction, tag)
 
         def f(expr):
             t0 = f'__{depth}'
-            return f'{inner(t0)} if ({t0}:=({expr})) is not None else None'
+            # Parenthesized, as it may be part of a bigger expression
+            return f'({inner(t0)} if ({t0}:=({expr})) is not None else None)'
 
         return f
     elif origin == tuple and typing_get_args(t):
         type_args = typing_get_args(t)
         # Tuple[A, ...] means an any-length tuple of all As
         if type_args[1:] == (Ellipsis,):
-            inner = expr_builder(type_args[0], options, depth + 1, direction)
+            inner = expr_builder(
+                type_args[0], options, depth + 1, direction, tag
+            )
 
             def f(expr):
                 t0 = f'__{depth}'
@@ -349,20 +2732,24 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
             return f
         else:
             inners = [
-                expr_builder(type_arg, options, depth + 1, direction)
+                expr_builder(type_arg, options, depth + 1, direction, tag)
                 for type_arg in type_args
             ]
 
             def f(expr):
-                t0 = f'__{depth}'
+                # A variable can be indexed as it is, anything else is
+                # bound to one so that it is evaluated no more than once
+                t0 = expr if expr.isidentifier() else f'__{depth}'
 
-                e1 = f'{t0}:=({expr})'
                 parts = ['(']
                 for i, inner in enumerate(inners):
                     xx = f'{t0}[{i}]'
                     parts.append(f'{inner(xx)},')
                 parts.append(')')
                 e2 = ''.join(parts)
+                if t0 == expr:
+                    return e2
+                e1 = f'{t0}:=({expr})'
                 # e1 is just for evaluating expr no more than once
                 # e2 is the actual result
                 return f'({e1},{e2})[1]'
@@ -371,7 +2758,7 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
           and issubclass_safe(list, origin)
           and typing_get_args(t)):
         type_arg = typing_get_args(t)[0]
-        inner = expr_builder(type_arg, options, depth + 1, direction)
+        inner = expr_builder(type_arg, options, depth + 1, direction, tag)
 
         def f(expr):
             t0 = f'__{depth}'
@@ -387,7 +2774,7 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
             warnings.warn(f'to_json will not work for dict with key: {t}')
             return identity
 
-        inner = expr_builder(value_type, options, depth + 1, direction)
+        inner = expr_builder(value_type, options, depth + 1, direction, tag)
 
         key_func = expr_builder(key_type, options, depth + 1, direction)
         if direction == _FROM:
@@ -425,18 +2812,23 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
             if hasattr(t, 'to_dict') and inspect.isfunction(t.to_dict):
                 return lambda expr: f'({expr}).to_dict()'
 
+    if _specialized_origin(t) is not None:
+        return lambda expr: f'__methods[{_generic_name(t)}]({expr})'
+    elif is_dataclass(origin):
+        # A generic dataclass with its type parameters left open
+        t = typing.cast(type, origin)
+
     if is_dataclass(t):
-        # Give indirectly referenced dataclasses a to_dict method without
-        # trashing their public API
-        if not hasattr(t, _from_dict_func(options)):
-            _process_class_internal(t, options)
+        _ensure_processed(t, options)
 
+        name = _from_dict_func(options) if direction == _FROM \
+            else _to_dict_func(options)
+        if _is_variant(name):
+            return lambda expr: f'__methods[{t.__name__}]({expr})'
         if direction == _FROM:
-            def f(expr):
-                return f'{t.__name__}.{_from_dict_func(options)}({expr})'
-            return f
+            return lambda expr: f'{t.__name__}.{name}({expr})'
         else:
-            return lambda expr: f'({expr}).{_to_dict_func(options)}()'
+            return lambda expr: f'({expr}).{name}()'
     elif issubclass_safe(t, Enum):
         if direction == _FROM:
             return lambda expr: f'{t.__name__}({expr})'
@@ -445,16 +2837,7 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
 
     if issubclass_safe(t, datetime):
         if direction == _FROM:
-            def f(expr):
-                t0 = f'__{depth}'
-                if HAS_DATEUTIL and issubclass_safe(datetime, t):
-                    return f'dateutil.parser.isoparse({expr})'
-                else:
-                    return (f'{t.__name__}.fromisoformat('
-                            f'{t0}[:-1]+"+00:00" if ({t0}:={expr})[-1]=="Z" '
-                            f'else {t0}'
-                            ')')
-            return f
+            return lambda expr: f'__parse_datetime({t.__name__}, {expr})'
         else:
             return lambda expr: f'({expr}).isoformat()'
     if issubclass_safe(t, date):
@@ -466,7 +2849,12 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
 
     if issubclass_safe(t, Decimal):
         if direction == _FROM:
-            return lambda expr: f'{t.__name__}(str({expr}))'
+            # Already a Decimal if from_json parsed it as one
+            t0 = f'__{depth}'
+            return lambda expr: (
+                f'({t0} if type({t0}:=({expr})) is {t.__name__}'
+                f' else {t.__name__}(str({t0})))'
+            )
         else:
             return lambda expr: f'str({expr})'
 
@@ -476,20 +2864,682 @@ def expr_builder(t: type, options=None, depth=0, direction=_FROM):
         else:
             return lambda expr: f'str({expr})'
 
+    if direction == _TO and _is_untyped(t):
+        return lambda expr: f'__encode_any({expr})'
+
     return identity
 
 
+def converter(t: type, options=None, direction=_FROM, tag=None):
+    """
+    The interpreted counterpart of expr_builder: returns a function that does
+    the conversion that the expression built by expr_builder does, or None
+    where expr_builder would give the identity.
+    """
+    origin = typing_get_origin(t)
+
+    if origin == typing.Union:
+        members = _union_members(t)
+        dispatch = None
+        if len(members) > 1:
+            dispatch = _union_dispatch(t, options, direction, tag)
+        if dispatch is not None:
+            return _union_converter(t, dispatch, options, direction, tag)
+        inner = converter(members[0], options, direction, tag) or _same
+
+        return lambda x: inner(x) if x is not None else None
+    elif origin == tuple and typing_get_args(t):
+        type_args = typing_get_args(t)
+        if type_args[1:] == (Ellipsis,):
+            inner = converter(type_args[0], options, direction, tag) or _same
+
+            return lambda x: tuple(inner(v) for v in x)
+        else:
+            inners = [
+                converter(type_arg, options, direction, tag) or _same
+                for type_arg in type_args
+            ]
+
+            return lambda x: tuple(
+                inner(x[i]) for i, inner in enumerate(inners)
+            )
+    elif (issubclass_safe(origin, abc.Sequence)
+          and issubclass_safe(list, origin)
+          and typing_get_args(t)):
+        inner = converter(typing_get_args(t)[0], options, direction, tag)
+        if inner is None:
+            return list
+        return lambda x: [inner(v) for v in x]
+    elif (issubclass_safe(origin, abc.Mapping)
+          and issubclass_safe(dict, origin)
+          and typing_get_args(t)):
+        key_type, value_type = typing_get_args(t)
+
+        if key_type not in (str, int, float, bool, UUID):
+            warnings.warn(f'to_json will not work for dict with key: {t}')
+            return None
+
+        inner = converter(value_type, options, direction, tag) or _same
+        key_func = _key_converter(key_type, options, direction)
+
+        return lambda x: {key_func(k): inner(v) for k, v in x.items()}
+
+    if _specialized_origin(t) is not None:
+        name = _from_dict_func(options) if direction == _FROM \
+            else _to_dict_func(options)
+        methods = _variant_methods(name, options)
+        return lambda x: methods[t](x)
+    elif is_dataclass(origin):
+        t = typing.cast(type, origin)
+
+    if is_dataclass(t):
+        _ensure_processed(t, options)
+
+        if direction == _FROM:
+            from_dict = _from_dict_func(options)
+            if _is_variant(from_dict):
+                methods = _variant_methods(from_dict, options)
+                return lambda x: methods[t](x)
+            return lambda x: getattr(t, from_dict)(x)
+        else:
+            to_dict = _to_dict_func(options)
+            if _is_variant(to_dict):
+                methods = _variant_methods(to_dict, options)
+                return lambda x: methods[t](x)
+            return lambda x: getattr(x, to_dict)()
+    elif issubclass_safe(t, Enum):
+        if direction == _FROM:
+            return t
+        else:
+            return lambda x: x.value
+
+    if issubclass_safe(t, datetime):
+        if direction == _FROM:
+            return lambda x: _parse_datetime(t, x)
+        else:
+            return lambda x: x.isoformat()
+    if issubclass_safe(t, date):
+        if direction == _FROM:
+            return typing.cast(typing.Type[date], t).fromisoformat
+        else:
+            return lambda x: x.isoformat()
+
+    if issubclass_safe(t, Decimal):
+        if direction == _FROM:
+            return lambda x: x if type(x) is t else t(str(x))
+        else:
+            return str
+
+    if issubclass_safe(t, UUID):
+        if direction == _FROM:
+            return t
+        else:
+            return str
+
+    if direction == _TO and _is_untyped(t):
+        return _any_encoder(options)
+
+    return None
+
+
+# Whether datetime.fromisoformat accepts a Z for UTC, and most other ISO 8601
+# formats besides those of isoformat
+_FULL_FROMISOFORMAT = sys.version_info >= (3, 11)
+
+
+def _parse_datetime(cls, s):
+    """
+    cls.fromisoformat, which is quick, for the fixed width formats that most
+    timestamps are in, e.g. 2021-06-17T10:00:00.123456+00:00 or with a Z,
+    and dateutil's isoparse for any others, if it's installed
+    """
+    try:
+        if s[-1:] == 'Z' and not _FULL_FROMISOFORMAT:
+            return cls.fromisoformat(s[:-1] + '+00:00')
+        return cls.fromisoformat(s)
+    except ValueError:
+        if HAS_DATEUTIL and issubclass(datetime, cls):
+            return dateutil.parser.isoparse(s)
+        raise
+
+
+_json_decoder = json.JSONDecoder()
+
+# Parses numbers with a fraction or exponent into Decimals, see _decimals_only.
+# Unlike json.loads(s, parse_float=Decimal) it isn't made anew on each call.
+_decimal_decoder = json.JSONDecoder(parse_float=Decimal)
+
+
+def _json_text(data):
+    """
+    The JSON in data as a str. bytes, bytearrays and memoryviews, including
+    those over part of a bigger buffer, are decoded straight from their
+    buffer, as json.loads would decode them, without copying them first.
+    """
+    if isinstance(data, str):
+        return data
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise TypeError(
+            'the JSON object must be str, bytes, bytearray or memoryview, '
+            f'not {type(data).__name__}'
+        )
+    with memoryview(data) as view:
+        if not view.c_contiguous:
+            view = memoryview(view.tobytes())
+        # detect_encoding only looks at the first 4 bytes
+        encoding = json.detect_encoding(bytes(view[:4]))
+        return str(view, encoding, 'surrogatepass')
+
+
+def _decimals_only(cls):
+    """
+    Whether cls has Decimal fields, or the dataclasses it refers to do, and
+    numbers with a fraction or exponent can't end up anywhere else. Then
+    from_json can parse them straight into Decimals, which is quicker than
+    rounding them to floats and converting those back, and lossless.
+    """
+    has_decimal = False
+    seen = set()
+    pending = [cls]
+    while pending:
+        c = pending.pop()
+        if c in seen:
+            continue
+        seen.add(c)
+        hints = _type_hints(c)
+        for field in _fields(c):
+            if has_meta(field, 'decoder'):
+                return False
+            for t in _value_types(hints[field.name]):
+                origin = typing_get_origin(t)
+                if _specialized_origin(t) is not None or (
+                        is_dataclass(t) and isinstance(t, type)):
+                    pending.append(t)
+                elif issubclass_safe(t, Decimal):
+                    has_decimal = True
+                elif origin == typing.Literal:
+                    if any(isinstance(v, float) for v in typing_get_args(t)):
+                        return False
+                elif issubclass_safe(t, Enum):
+                    if any(isinstance(m.value, float) for m in t):
+                        return False
+                elif not (t in (str, int, bool, _NoneType)
+                          or issubclass_safe(t, (date, UUID))):
+                    # float, Any, TypeVars and types used as is
+                    return False
+    return has_decimal
+
+
+def _value_types(t):
+    """
+    The types that the JSON values in a field of type t decode to, leaving
+    out dict keys, which are always strings
+    """
+    origin = typing_get_origin(t)
+    args = typing_get_args(t)
+    if origin == typing.Union or (origin == tuple and args):
+        for arg in args:
+            if arg is not Ellipsis:
+                yield from _value_types(arg)
+    elif issubclass_safe(origin, abc.Mapping) and args:
+        yield from _value_types(args[1])
+    elif issubclass_safe(origin, abc.Sequence) and args:
+        yield from _value_types(args[0])
+    else:
+        yield t
+
+
+def _key_converter(key_type, options, direction):
+    """
+    converter for the keys of a dict, which are always strings in JSON
+    """
+    if direction == _FROM:
+        if key_type in (int, float):
+            return key_type
+        elif key_type is bool:
+            return lambda k: k is True or k == "true"
+    return converter(key_type, options, direction) or _same
+
+
+_NoneType = type(None)
+
+
+def _field_tag(field):
+    if has_meta(field, 'tag'):
+        return field.metadata['fastclasses_json']['tag']
+    return None
+
+
+def _strip_optional(t):
+    """
+    t without None, if it's a Union with None in it
+    """
+    if typing_get_origin(t) != typing.Union:
+        return t
+    members = _union_members(t)
+    if len(members) == 1:
+        return members[0]
+    return typing.Union[tuple(members)]
+
+
+def _union_members(t):
+    return [arg for arg in typing_get_args(t) if arg is not _NoneType]
+
+
+def _union_dispatch(t, options, direction, tag):
+    """
+    How to convert a value of a Union of more than one type besides None:
+    a list of (type, member) for the types of value that need converting,
+    which are converted as member. When decoding, the types are JSON types
+    and member may be a (key, {tag: dataclass}) pair for dataclasses told
+    apart by the value at key. When encoding, they are python types.
+
+    None if the members can't be told apart that way, in which case the
+    union is converted as its first member.
+    """
+    if direction == _FROM:
+        return _union_decode_dispatch(t, options, tag)
+    return _union_encode_dispatch(t)
+
+
+def _union_decode_dispatch(t, options, tag):
+    by_json_type = collections.defaultdict(list)
+    for member in _union_members(t):
+        json_type = _json_type(member)
+        if json_type is None:
+            return None
+        by_json_type[json_type].append(member)
+
+    dispatch = []
+    for json_type, members in by_json_type.items():
+        if all(member is json_type for member in members):
+            dispatch.append((json_type, json_type))
+        elif len(members) == 1:
+            dispatch.append((json_type, members[0]))
+        elif all(is_dataclass(member) for member in members):
+            tags = _union_tags(members, options, tag)
+            if tags is None:
+                return None
+            dispatch.append((json_type, tags))
+        else:
+            return None
+    return dispatch
+
+
+def _union_encode_dispatch(t):
+    dispatch = {}
+    for member in _union_members(t):
+        origin = typing_get_origin(member)
+        if _specialized_origin(member) is not None:
+            # Can't be told apart from other specializations by type
+            return None
+        elif is_dataclass(member) or issubclass_safe(
+            member, (Enum, date, Decimal, UUID)
+        ):
+            python_type = member
+        elif origin == tuple:
+            python_type = tuple
+        elif issubclass_safe(origin, abc.Sequence):
+            python_type = list
+        elif issubclass_safe(origin, abc.Mapping):
+            python_type = dict
+        else:
+            # Used as is
+            continue
+        if python_type in dispatch:
+            return None
+        dispatch[python_type] = member
+    return list(dispatch.items())
+
+
+def _json_type(t):
+    """
+    The type json.loads gives for values that decode to t, or None
+    """
+    if t in (str, int, float, bool, list, dict):
+        return t
+    if _specialized_origin(t) is not None:
+        return None
+    if is_dataclass(t):
+        return dict
+    origin = typing_get_origin(t)
+    if origin == tuple or (
+        issubclass_safe(origin, abc.Sequence) and issubclass_safe(list, origin)
+    ):
+        return list
+    if issubclass_safe(origin, abc.Mapping) and issubclass_safe(dict, origin):
+        return dict
+    if issubclass_safe(t, Enum):
+        value_types = {type(member.value) for member in t}
+        if len(value_types) == 1:
+            return value_types.pop()
+        return None
+    if issubclass_safe(t, (date, Decimal, UUID)):
+        return str
+    return None
+
+
+def _union_tags(classes, options, tag=None):
+    """
+    (key, {tag: cls}) where key is the input name of the field that tells
+    apart classes: tag if given, otherwise the first field that all of them
+    have Literal values for. None if there is no such field.
+    """
+    if tag is not None:
+        candidates = [tag]
+    else:
+        candidates = [
+            name for name, field_type in _type_hints(classes[0]).items()
+            if typing_get_origin(field_type) == typing.Literal
+        ]
+    for name in candidates:
+        tags = _tags_of(classes, options, name)
+        if tags is not None:
+            return tags
+    return None
+
+
+def _tags_of(classes, options, name):
+    key = None
+    tags = {}
+    for cls in classes:
+        fields_by_name = {f.name: f for f in _fields(cls)}
+        if name not in fields_by_name:
+            return None
+        field = fields_by_name[name]
+        field_type = _type_hints(cls)[name]
+        if typing_get_origin(field_type) == typing.Literal:
+            values = typing_get_args(field_type)
+        elif field.default is not MISSING:
+            values = (field.default,)
+        else:
+            return None
+        field_key = deduce_serialised_name(name, options, field, cls)
+        if key not in (None, field_key):
+            return None
+        key = field_key
+        for value in values:
+            if value in tags:
+                return None
+            tags[value] = cls
+    return key, tags
+
+
+def _tag_table_name(key, tags):
+    digest = hashlib.sha1(repr((key, [
+        (value, cls.__module__, cls.__qualname__)
+        for value, cls in tags.items()
+    ])).encode()).hexdigest()[:16]
+    return f'__tags_{digest}'
+
+
+def _tag_tables(cls, options):
+    """
+    The tag -> dataclass tables that from_dict for cls uses to decode
+    unions of dataclasses
+    """
+    fields_by_name = {f.name: f for f in _fields(cls)}
+    tables = {}
+    for name, field_type in _type_hints(cls).items():
+        tag = _field_tag(fields_by_name[name])
+        tables.update(_type_tag_tables(field_type, options, tag))
+    return tables
+
+
+def _type_tag_tables(field_type, options, tag=None):
+    tables = {}
+    for t in _walk_types(field_type):
+        if (typing_get_origin(t) != typing.Union
+                or len(_union_members(t)) < 2):
+            continue
+        for _, member in _union_decode_dispatch(t, options, tag) or ():
+            if isinstance(member, tuple):
+                key, tags = member
+                tables[_tag_table_name(key, tags)] = tags
+    return tables
+
+
+def _walk_types(t):
+    yield t
+    for arg in typing_get_args(t):
+        yield from _walk_types(arg)
+
+
+def _union_expr_builder(t, options, depth, direction, tag):
+    """
+    expr_builder for a Union of more than one type besides None, or None
+    if the members can't be told apart
+    """
+    dispatch = _union_dispatch(t, options, direction, tag)
+    if dispatch is None:
+        return None
+
+    t0 = f'__{depth}'
+    if direction == _FROM:
+        # JSON values of other types are converted as the first member
+        first = _union_members(t)[0]
+        fallback = expr_builder(first, options, depth + 1, direction, tag)(t0)
+    else:
+        fallback = t0
+    conversions = []
+    for value_type, member in dispatch:
+        if isinstance(member, tuple):
+            key, tags = member
+            for cls in tags.values():
+                _ensure_processed(cls, options)
+            cls_expr = f'{_tag_table_name(key, tags)}[{t0}[{key!r}]]'
+            name = _from_dict_func(options)
+            if _is_variant(name):
+                convert = f'__methods[{cls_expr}]({t0})'
+            else:
+                convert = f'{cls_expr}.{name}({t0})'
+        else:
+            inner = expr_builder(member, options, depth + 1, direction, tag)
+            convert = inner(t0)
+        if convert != fallback:
+            conversions.append((value_type, convert))
+    if not conversions and fallback == t0:
+        return lambda expr: expr
+
+    branches = [
+        f'{convert} if type({t0}) is {value_type.__name__} else '
+        for value_type, convert in conversions
+    ]
+    if direction == _TO:
+        # Then instances of subclasses, of the most derived class first
+        conversions.sort(key=lambda c: len(c[0].__mro__), reverse=True)
+        branches += [
+            f'{convert} if isinstance({t0}, {value_type.__name__}) else '
+            for value_type, convert in conversions
+        ]
+
+    def f(expr):
+        chain = ''.join(branches) + fallback
+        return f'(({chain}) if ({t0}:=({expr})) is not None else None)'
+    return f
+
+
+def _union_converter(t, dispatch, options, direction, tag):
+    """
+    converter for a Union of more than one type besides None
+    """
+    table = {}
+    for value_type, member in dispatch:
+        if isinstance(member, tuple):
+            key, tags = member
+            for cls in tags.values():
+                _ensure_processed(cls, options)
+            from_dict = _from_dict_func(options)
+            table[value_type] = (
+                lambda x, key=key, tags=tags:
+                    _lookup(tags[x[key]], options, from_dict)(x)
+            )
+        else:
+            table[value_type] = \
+                converter(member, options, direction, tag) or _same
+
+    if direction == _FROM:
+        # JSON values of other types are converted as the first member
+        first = converter(_union_members(t)[0], options, direction, tag) \
+            or _same
+
+        def other(tp):
+            return first
+    else:
+        def other(tp):
+            # An instance of a subclass of a member
+            return next(
+                (table[base] for base in tp.__mro__ if base in table), _same
+            )
+
+    if all(f is _same for f in table.values()) and other(object) is _same:
+        return None
+
+    def convert(x):
+        if x is None:
+            return None
+        f = table.get(type(x))
+        if f is None:
+            f = other(type(x))
+        return f(x)
+    return convert
+
+
+def _same(x):
+    return x
+
+
+def _is_untyped(t):
+    """
+    Whether t says nothing about what type the values in it have
+    """
+    if t in (typing.Any, object, dict, list, tuple):
+        return True
+    return typing_get_origin(t) in (dict, list, tuple) \
+        and not typing_get_args(t)
+
+
+# to_dict method name -> function converting values of any type for to_dict,
+# see _any_encoder
+_any_encoders: typing.MutableMapping[
+    str, typing.Callable[[typing.Any], typing.Any]
+] = weakref.WeakValueDictionary()
+
+
+def _any_encoder(options):
+    """
+    A function that converts values of any type for to_dict, for fields
+    such as Any, object, dict and list. How to convert each type is worked
+    out the first time it's seen. JSON values, and lists, tuples and dicts
+    of them, come back as they are.
+    """
+    name = _to_dict_func(options)
+    try:
+        return _any_encoders[name]
+    except KeyError:
+        pass
+
+    encoders = dict.fromkeys((str, int, float, bool, _NoneType), _same)
+
+    def encode_any(value):
+        encoder = encoders.get(type(value))
+        if encoder is None:
+            encoder = encoders[type(value)] = \
+                _encoder_for(type(value), options, encode_any)
+        return encoder(value)
+
+    _any_encoders[name] = encode_any
+    return encode_any
+
+
+def _encoder_for(tp, options, encode_any):
+    if is_dataclass(tp):
+        to_dict = _to_dict_func(options)
+        if _is_variant(to_dict):
+            methods = _variant_methods(to_dict, options)
+            # Not tp, which would then be kept alive by the encoder
+            return lambda value: methods[type(value)](value)
+        _ensure_processed(tp, options)
+        # Not the method itself, which may yet be replaced by compiled code
+        return operator.methodcaller(to_dict)
+    if issubclass(tp, Enum):
+        return lambda value: encode_any(value.value)
+    if issubclass(tp, date):
+        return tp.isoformat
+    if issubclass(tp, (Decimal, UUID)):
+        return str
+    if issubclass(tp, dict):
+        return lambda value: _encode_dict(value, encode_any)
+    if issubclass(tp, (list, tuple)):
+        return lambda value: _encode_sequence(value, encode_any)
+    return _same
+
+
+# type -> function converting its values for JSONEncoder.default, or None
+# for types that it can't convert
+_json_encoders: typing.MutableMapping[
+    type, typing.Optional[typing.Callable[[typing.Any], typing.Any]]
+] = weakref.WeakKeyDictionary()
+
+
+def _json_encoder(tp):
+    try:
+        return _json_encoders[tp]
+    except KeyError:
+        pass
+    if any(base in _decorated for base in tp.__mro__):
+        # The public to_dict, for the options it was decorated with
+        encoder = operator.methodcaller('to_dict')
+    else:
+        # Other dataclasses are converted as codec would, with no methods
+        # set on them
+        options = _codec_options({})
+        encoder = _encoder_for(tp, options, _any_encoder(options))
+        if encoder is _same:
+            encoder = None
+    _json_encoders[tp] = encoder
+    return encoder
+
+
+def _encode_dict(value, encode_any):
+    # Only copied from the first item that needs converting
+    for i, (key, item) in enumerate(value.items()):
+        encoded = encode_any(item)
+        if encoded is not item:
+            result = dict(itertools.islice(value.items(), i))
+            result[key] = encoded
+            for key, item in itertools.islice(value.items(), i + 1, None):
+                result[key] = encode_any(item)
+            return result
+    return value
+
+
+def _encode_sequence(value, encode_any):
+    for i, item in enumerate(value):
+        encoded = encode_any(item)
+        if encoded is not item:
+            result = list(value[:i])
+            result.append(encoded)
+            result.extend(map(encode_any, value[i + 1:]))
+            return result
+    return value
+
+
 def referenced_types(cls):
+    return _referenced_types(_type_hints(cls).values())
+
+
+def _referenced_types(field_types):
 
-    # If we support tuples or unions properly, this needsto return
-    # multiple types
     def extract_types(t):
         origin = typing_get_origin(t)
         if origin == tuple and typing_get_args(t):
             for type_arg in typing_get_args(t):
                 yield from extract_types(type_arg)
-        elif (origin == typing.Union
-                or issubclass_safe(origin, abc.Sequence)) and typing_get_args(t):
+        elif origin == typing.Union:
+            for type_arg in typing_get_args(t):
+                yield from extract_types(type_arg)
+        elif issubclass_safe(origin, abc.Sequence) and typing_get_args(t):
             type_arg = typing_get_args(t)[0]
             yield from extract_types(type_arg)
         elif issubclass_safe(origin, abc.Mapping) and typing_get_args(t):
@@ -497,6 +3547,10 @@ def referenced_types(cls):
             if key_type_arg is UUID:
                 yield UUID
             yield from extract_types(value_type_arg)
+        elif _specialized_origin(t) is not None:
+            yield t
+        elif is_dataclass(origin):
+            yield origin
         elif is_dataclass(t) or issubclass_safe(
             t, (Enum, date, datetime, Decimal, UUID)
         ):
@@ -505,7 +3559,10 @@ def referenced_types(cls):
             yield from tuple()
 
     types = {}
-    for _, field_type in typing.get_type_hints(cls).items():
+    for field_type in field_types:
         for t in extract_types(field_type):
-            types[t.__name__] = t
+            if _specialized_origin(t) is not None:
+                types[_generic_name(t)] = t
+            else:
+                types[t.__name__] = t
     return types
@@ -0,0 +1,369 @@
+"""
+Reading and writing JSON Lines, one dataclass per line, optionally
+compressed with gzip, bz2 or xz.
+
+    for order in read_jsonl(Order, 'orders.jsonl.gz'):
+        ...
+
+    write_jsonl('orders.jsonl.xz', orders)
+"""
+import bz2
+import gzip
+import json
+import lzma
+import os
+import queue
+import threading
+import time
+
+from . import core
+
+_DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+]
+_MAGIC_SIZE = max(len(magic) for magic, _ in _MAGIC)
+
+_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+_READERS = {
+    'gzip': lambda fp: gzip.GzipFile(fileobj=fp, mode='rb'),
+    'bz2': lambda fp: bz2.BZ2File(fp, 'rb'),
+    'xz': lambda fp: lzma.LZMAFile(fp, 'rb'),
+}
+
+# gzip.open compresses at level 9, which for JSON is about four times
+# slower than zlib's own default of 6, for output hardly any smaller
+_WRITERS = {
+    'gzip': lambda fp, level: gzip.GzipFile(
+        fileobj=fp, mode='wb', compresslevel=6 if level is None else level
+    ),
+    'bz2': lambda fp, level: bz2.BZ2File(
+        fp, 'wb', compresslevel=9 if level is None else level
+    ),
+    'xz': lambda fp, level: lzma.LZMAFile(fp, 'wb', preset=level),
+}
+
+
+class JSONLStats:
+    """
+    Counts for a read_jsonl or write_jsonl, kept up to date as it goes.
+    compressed_bytes are those read from or written to the file, and
+    uncompressed_bytes those of the JSON Lines, which are the same for a
+    file that isn't compressed.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+        self.seconds = 0.0
+
+    @property
+    def records_per_second(self):
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (
+            f'JSONLStats(records={self.records}, '
+            f'compressed_bytes={self.compressed_bytes}, '
+            f'uncompressed_bytes={self.uncompressed_bytes}, '
+            f'seconds={self.seconds:.3f})'
+        )
+
+
+def read_jsonl(cls, source, *, infer_missing=True, compression='infer',
+               buffer_size=_DEFAULT_BUFFER_SIZE, background=False,
+               stats=None):
+    """
+    The instances of cls, a dataclass_json class, decoded from the JSON
+    Lines in source, a path or a binary file. Blank lines are skipped.
+
+    With compression='infer', gzip, bz2 and xz are recognised by their
+    magic bytes, otherwise it is one of 'gzip', 'bz2', 'xz' or None. The
+    file is read buffer_size bytes at a time. With background=True, those
+    are read and decompressed in a thread of its own while the records
+    are being decoded. stats, a JSONLStats, is updated as records are
+    read.
+
+    Example:
+
+        stats = JSONLStats()
+        for order in read_jsonl(Order, 'orders.jsonl.gz', stats=stats):
+            ...
+        stats.records_per_second
+    """
+    _check_compression(compression)
+    return _read_records(
+        cls, source, infer_missing, compression, buffer_size, background,
+        JSONLStats() if stats is None else stats,
+    )
+
+
+def write_jsonl(dest, objs, *, compression='infer', compresslevel=None,
+                ensure_ascii=True, buffer_size=_DEFAULT_BUFFER_SIZE,
+                stats=None):
+    """
+    Writes objs, instances of dataclass_json classes, to dest, a path or
+    a binary file, one to_json() per line, and returns a JSONLStats for
+    the write, or stats if given.
+
+    With compression='infer', a name ending in .gz, .bz2 or .xz is
+    compressed with gzip, bz2 or xz, otherwise it is one of those or None.
+    compresslevel defaults to 6 for gzip, 9 for bz2 and 6 for xz. Lines
+    are written around buffer_size bytes at a time.
+
+    Example:
+
+        write_jsonl('orders.jsonl.gz', orders).records_per_second
+    """
+    _check_compression(compression)
+    if stats is None:
+        stats = JSONLStats()
+    if compression == 'infer':
+        compression = _compression_of(dest)
+
+    start = time.perf_counter()
+    fp = open(dest, 'wb', buffering=buffer_size) if _is_path(dest) else dest
+    try:
+        raw = _Counted(fp)
+        writer = _WRITERS[compression](raw, compresslevel) \
+            if compression else raw
+        try:
+            objs = iter(objs)
+            while True:
+                lines = []
+                size = 0
+                for obj in objs:
+                    line = obj.to_json(ensure_ascii=ensure_ascii)
+                    lines.append(line)
+                    size += len(line)
+                    if size >= buffer_size:
+                        break
+                if not lines:
+                    break
+                lines.append('')
+                data = core._encode_json('\n'.join(lines))
+                writer.write(data)
+                stats.records += len(lines) - 1
+                stats.uncompressed_bytes += len(data)
+                stats.compressed_bytes = raw.count
+                stats.seconds = time.perf_counter() - start
+        finally:
+            if compression:
+                writer.close()
+        fp.flush()
+    finally:
+        if fp is not dest:
+            fp.close()
+    stats.compressed_bytes = raw.count
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _check_compression(compression):
+    if compression not in ('infer', None) and compression not in _READERS:
+        raise ValueError(
+            f'compression must be one of infer, {", ".join(_READERS)} or '
+            f'None, not {compression!r}'
+        )
+
+
+def _is_path(f):
+    return isinstance(f, (str, bytes, os.PathLike))
+
+
+def _compression_of(dest):
+    # A file opened by name has that name, a BytesIO none at all
+    name = dest if _is_path(dest) else getattr(dest, 'name', None)
+    if not _is_path(name):
+        return None
+    extension = os.path.splitext(os.fsdecode(name))[1]
+    return _EXTENSIONS.get(extension.lower())
+
+
+class _Counted:
+    """
+    A binary file that counts the bytes read from or written to fp, and
+    can have its first bytes looked at before they are read.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.count = 0
+        self._head = b''
+
+    def peek(self, size):
+        while len(self._head) < size:
+            data = self.fp.read(size - len(self._head))
+            if not data:
+                break
+            self.count += len(data)
+            self._head += data
+        return self._head
+
+    def read(self, size=-1):
+        head = self._head
+        if head:
+            if 0 <= size <= len(head):
+                self._head = head[size:]
+                return head[:size]
+            self._head = b''
+            size = size - len(head) if size >= 0 else size
+        data = self.fp.read(size) or b''
+        self.count += len(data)
+        return head + data if head else data
+
+    def write(self, data):
+        self.count += memoryview(data).nbytes
+        return self.fp.write(data)
+
+    def flush(self):
+        self.fp.flush()
+
+
+def _read_records(cls, source, infer_missing, compression, buffer_size,
+                  background, stats):
+    start = time.perf_counter()
+    decoder = core._decimal_decoder if core._decimals_only(cls) \
+        else core._json_decoder
+    scan_once = decoder.scan_once
+
+    fp = open(source, 'rb', buffering=buffer_size) if _is_path(source) \
+        else source
+    try:
+        raw = _Counted(fp)
+        if compression == 'infer':
+            head = raw.peek(_MAGIC_SIZE)
+            compression = next(
+                (name for magic, name in _MAGIC if head.startswith(magic)),
+                None
+            )
+        reader = _READERS[compression](raw) if compression else raw
+        blocks = _blocks(reader, buffer_size)
+        if background:
+            blocks = _prefetched(blocks)
+        try:
+            line_number = 1
+            for lines in _split_lines(blocks, stats):
+                for offset, line in enumerate(lines):
+                    # scan_once skips the whitespace checks of decode
+                    try:
+                        o, end = scan_once(line, 0)
+                    except (StopIteration, ValueError):
+                        end = -1
+                    if end != len(line):
+                        if not line or line.isspace():
+                            continue
+                        o = _decode_line(decoder, line, line_number + offset)
+                    stats.records += 1
+                    yield cls.from_dict(o, infer_missing=infer_missing)
+                line_number += len(lines)
+                stats.compressed_bytes = raw.count
+                stats.seconds = time.perf_counter() - start
+        finally:
+            if background:
+                blocks.close()
+            if compression:
+                reader.close()
+    finally:
+        if fp is not source:
+            fp.close()
+    stats.compressed_bytes = raw.count
+    stats.seconds = time.perf_counter() - start
+
+
+def _blocks(reader, size):
+    while True:
+        block = reader.read(size)
+        if not block:
+            return
+        yield block
+
+
+def _split_lines(blocks, stats):
+    """
+    The lines in blocks of UTF-8, a list of them for each block
+    """
+    rest = b''
+    first = True
+    for block in blocks:
+        stats.uncompressed_bytes += len(block)
+        end = block.rfind(b'\n') + 1
+        if not end:
+            rest += block
+            continue
+        if rest:
+            block = rest + block
+            end += len(rest)
+        rest = block[end:]
+        lines = block[:end - 1].decode('utf-8', 'surrogatepass').split('\n')
+        if first:
+            first = False
+            lines[0] = _without_bom(lines[0])
+        yield lines
+    if rest:
+        line = rest.decode('utf-8', 'surrogatepass')
+        yield [_without_bom(line) if first else line]
+
+
+def _without_bom(line):
+    return line[1:] if line.startswith('\ufeff') else line
+
+
+def _decode_line(decoder, line, line_number):
+    try:
+        return decoder.decode(line)
+    except json.JSONDecodeError as e:
+        raise json.JSONDecodeError(
+            f'{e.msg} on line {line_number}', e.doc, e.pos
+        ) from None
+
+
+_END = object()
+
+
+def _prefetched(blocks, depth=2):
+    """
+    Iterates blocks in a thread of its own, keeping up to depth of them
+    ready, so that reading and decompressing them overlaps with decoding
+    them. zlib, bz2 and lzma let go of the GIL while they decompress.
+    """
+    ready = queue.Queue(depth)
+    stop = threading.Event()
+
+    def produce():
+        last = _END
+        try:
+            for block in blocks:
+                if stop.is_set():
+                    break
+                ready.put(block)
+        except BaseException as e:
+            last = e
+        finally:
+            ready.put(last)
+
+    thread = threading.Thread(
+        target=produce, name='fastclasses_json.read_jsonl', daemon=True
+    )
+    thread.start()
+    item = None
+    try:
+        while True:
+            item = ready.get()
+            if type(item) is not bytes:
+                break
+            yield item
+    finally:
+        if item is None or type(item) is bytes:
+            # Closed before the end, wait for the thread to notice
+            stop.set()
+            while type(ready.get()) is bytes:
+                pass
+        thread.join()
+    if item is not _END:
+        raise item
@@ -50,6 +50,7 @@ def update_dataclass_json_type(ctx: ClassDefContext) -> None:
         NoneType()
     ])
     indent_type = UnionType.make_union([int_type, NoneType()])
+    bool_type = builtin_type(ctx.api, 'bool')
 
     args = [
         Argument(
@@ -58,11 +59,63 @@ def update_dataclass_json_type(ctx: ClassDefContext) -> None:
         Argument(
             Var('indent', indent_type), indent_type, None, ARG_NAMED_OPT
         ),
+        Argument(
+            Var('ensure_ascii', bool_type), bool_type, None, ARG_NAMED_OPT
+        ),
     ]
 
     add_method_to_class(
         ctx.api, ctx.cls, 'to_json', args=args, return_type=str_type
     )
+    add_method_to_class(
+        ctx.api, ctx.cls, 'to_json_bytes', args=args,
+        return_type=builtin_type(ctx.api, 'bytes')
+    )
+
+    chunk_args = [
+        Argument(
+            Var('chunk_size', int_type), int_type, None, ARG_NAMED_OPT
+        ),
+        Argument(
+            Var('ensure_ascii', bool_type), bool_type, None, ARG_NAMED_OPT
+        ),
+    ]
+    add_method_to_class(
+        ctx.api, ctx.cls, 'iter_json_chunks', args=chunk_args,
+        return_type=ctx.api.named_type('typing.Iterator', [str_type])
+    )
+    any_type = AnyType(TypeOfAny.explicit)
+    add_method_to_class(
+        ctx.api, ctx.cls, 'to_json_stream',
+        args=[Argument(Var('fp', any_type), any_type, None, ARG_POS)]
+        + chunk_args,
+        return_type=NoneType()
+    )
+
+    optional_int_type = UnionType.make_union([int_type, NoneType()])
+    async_args = [
+        Argument(
+            Var('executor', any_type), any_type, None, ARG_NAMED_OPT
+        ),
+        Argument(
+            Var('threshold', int_type), int_type, None, ARG_NAMED_OPT
+        ),
+        Argument(
+            Var('yield_every', optional_int_type), optional_int_type, None,
+            ARG_NAMED_OPT
+        ),
+    ]
+    add_method_to_class(
+        ctx.api, ctx.cls, 'to_json_async',
+        args=[
+            Argument(
+                Var('ensure_ascii', bool_type), bool_type, None, ARG_NAMED_OPT
+            ),
+        ] + async_args,
+        return_type=ctx.api.named_type(
+            'typing.Coroutine', [any_type, any_type, str_type]
+        )
+    )
 
     # It would be lovely to actually have this return a typed dict ;)
 
@@ -74,7 +127,6 @@ def update_dataclass_json_type(ctx: ClassDefContext) -> None:
     )
 
     instance_type = fill_typevars(ctx.cls.info)
-    bool_type = builtin_type(ctx.api, 'bool')
     args = [
         Argument(Var('o', json_dict_type), json_dict_type, None, ARG_POS),
         Argument(
@@ -87,8 +139,10 @@ def update_dataclass_json_type(ctx: ClassDefContext) -> None:
         return_type=instance_type,
     )
 
-    bytes_type = builtin_type(ctx.api, 'bytes')
-    json_data_type = UnionType.make_union([str_type, bytes_type])
+    json_data_type = UnionType.make_union([
+        builtin_type(ctx.api, name)
+        for name in ('str', 'bytes', 'bytearray', 'memoryview')
+    ])
 
     args = [
         Argument(
@@ -103,6 +157,13 @@ def update_dataclass_json_type(ctx: ClassDefContext) -> None:
         args=args,
         return_type=instance_type,
     )
+    add_classmethod_to_class(
+        ctx.api, ctx.cls, 'from_json_async',
+        args=args + async_args,
+        return_type=ctx.api.named_type(
+            'typing.Coroutine', [any_type, any_type, instance_type]
+        ),
+    )
 
 
 def add_classmethod_to_class(
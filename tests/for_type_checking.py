@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from fastclasses_json import dataclass_json
+import sys
 import typing
 
 
@@ -29,10 +30,17 @@ if typing.TYPE_CHECKING and False:
 print(a.to_json())
 print(a.to_json(indent=2))
 print(a.to_json(separators=(':', ',')))
+print(a.to_json(ensure_ascii=False))
+print(a.to_json_bytes())
+print(a.to_json_bytes(indent=2, ensure_ascii=False))
+print(list(a.iter_json_chunks(chunk_size=10)))
+a.to_json_stream(sys.stdout, ensure_ascii=False)
+
 print(A.from_dict({'x': 'hi'}))
 print(A.from_dict({'x': 'hi'}, infer_missing=True))
 print(A.from_json('{"x":"hi"}'))
 print(A.from_json(b'{"x":"hi"}'))
+print(A.from_json(memoryview(b'{"x":"hi"}')))
 print(A.from_json('{"x":"hi"}', infer_missing=True))
 
 
@@ -40,3 +48,8 @@ print(A.from_json('{"x":"hi"}', infer_missing=True))
 @dataclass
 class Snakes:
     snake_one: int
+
+
+async def use_async() -> None:
+    print(await a.to_json_async(yield_every=100))
+    print(await A.from_json_async(b'{"x":"hi"}', threshold=0))
@@ -83,6 +83,247 @@ def test_to_json():
     )
 
 
+def test_to_json_bytes():
+
+    @dataclass_json
+    @dataclass
+    class A:
+        x: int
+        y: str
+
+    a = A(5, 'T\u014dky\u014d')
+    assert a.to_json_bytes() == a.to_json().encode() \
+        == b'{"x":5,"y":"T\\u014dky\\u014d"}'
+    assert a.to_json(ensure_ascii=False) == '{"x":5,"y":"T\u014dky\u014d"}'
+    assert a.to_json_bytes(ensure_ascii=False) \
+        == '{"x":5,"y":"T\u014dky\u014d"}'.encode()
+    assert a.to_json_bytes(indent=2) == a.to_json(indent=2).encode()
+    assert A.from_json(a.to_json_bytes(ensure_ascii=False)) == a
+
+    # A lone surrogate is escaped, or else isn't valid UTF-8
+    lone = A(1, '\ud800')
+    assert lone.to_json_bytes() == b'{"x":1,"y":"\\ud800"}'
+    with pytest.raises(UnicodeEncodeError):
+        lone.to_json_bytes(ensure_ascii=False)
+
+
+def test_iter_json_chunks():
+    from decimal import Decimal
+
+    @dataclass_json
+    @dataclass
+    class Item:
+        id: int
+        note: Optional[str] = None
+
+    @dataclass_json(field_name_transform=str.upper)
+    @dataclass
+    class Export:
+        items: List[Item]
+        ids: List[int]
+        groups: List[List[Item]]
+        by_name: Dict[str, Item]
+        by_id: Dict[int, List[Item]]
+        pair: Tuple[Item, int]
+        total: Decimal
+        first: Optional[Item] = None
+        last: Optional[Item] = None
+        flag: int = field(default=1, metadata={
+            'fastclasses_json': {'encoder': lambda flag: flag * 2}
+        })
+
+    export = Export(
+        [Item(i, 'n\u00f6te' if i % 2 else None) for i in range(100)],
+        list(range(100)),
+        [[Item(1)], [], [Item(2), Item(3)]],
+        {'a': Item(1)},
+        {1: [Item(1)], 2: []},
+        (Item(4), 5),
+        Decimal('9.99'),
+        first=Item(0),
+    )
+    # Joined up, the same as to_json, however small the chunks
+    for chunk_size in [1, 10, 100, 100_000]:
+        chunks = list(export.iter_json_chunks(chunk_size=chunk_size))
+        assert ''.join(chunks) == export.to_json()
+    assert len(list(export.iter_json_chunks(chunk_size=100))) > 10
+    assert ''.join(export.iter_json_chunks(ensure_ascii=False)) \
+        == export.to_json(ensure_ascii=False)
+
+
+def test_to_json_stream():
+    import gzip
+    import io
+    import socket
+    import tempfile
+
+    @dataclass_json
+    @dataclass
+    class Item:
+        id: int
+
+    @dataclass_json
+    @dataclass
+    class Export:
+        items: List[Item]
+
+    export = Export([Item(i) for i in range(1000)])
+    expected = export.to_json()
+
+    text = io.StringIO()
+    export.to_json_stream(text, chunk_size=100)
+    assert text.getvalue() == expected
+
+    binary = io.BytesIO()
+    with gzip.open(binary, 'wb') as f:
+        export.to_json_stream(f, chunk_size=100)
+    assert gzip.decompress(binary.getvalue()) == expected.encode()
+
+    binary = io.BytesIO()
+    with gzip.open(binary, 'wt') as f:
+        export.to_json_stream(f, chunk_size=100)
+    assert gzip.decompress(binary.getvalue()) == expected.encode()
+
+    # Wrappers that aren't io classes, binary or text by their mode
+    for make_file, written in [
+        (tempfile.NamedTemporaryFile, expected.encode()),
+        (tempfile.SpooledTemporaryFile, expected.encode()),
+        (lambda: tempfile.NamedTemporaryFile('w+'), expected),
+        (lambda: tempfile.SpooledTemporaryFile(mode='w+'), expected),
+    ]:
+        with make_file() as f:
+            export.to_json_stream(f, chunk_size=100)
+            f.seek(0)
+            assert f.read() == written
+
+    sender, receiver = socket.socketpair()
+    with sender, receiver:
+        with sender.makefile('wb', buffering=0) as f:
+            export.to_json_stream(f, chunk_size=100)
+        export.to_json_stream(sender, chunk_size=100)
+        sender.shutdown(socket.SHUT_WR)
+        received = b''.join(iter(lambda: receiver.recv(65536), b''))
+    assert received == 2 * expected.encode()
+
+
+@dataclass_json
+@dataclass
+class Stock:
+    sku: str
+    counts: List[int]
+
+
+@dataclass_json
+@dataclass
+class Inventory:
+    stock: List[Stock]
+    missing: List[Optional[Stock]]
+    notes: Dict[str, str] = field(default_factory=dict)
+
+
+def test_to_json_async():
+    import asyncio
+    import concurrent.futures
+
+    inventory = Inventory(
+        [Stock(f'sku-{i}', [i, i + 1]) for i in range(1000)],
+        [None, Stock('x', [])] * 10,
+        {'n\u00f6te': 'y'},
+    )
+    expected = inventory.to_json()
+
+    async def encode():
+        # Inline, then in the default executor, then on the loop
+        assert await inventory.to_json_async() == expected
+        assert await inventory.to_json_async(threshold=100) == expected
+        assert await inventory.to_json_async(
+            threshold=100, yield_every=7
+        ) == expected
+        assert await inventory.to_json_async(
+            threshold=0, ensure_ascii=False
+        ) == inventory.to_json(ensure_ascii=False)
+        with concurrent.futures.ThreadPoolExecutor(1) as executor:
+            assert await inventory.to_json_async(
+                executor=executor, threshold=100
+            ) == expected
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            assert await inventory.to_json_async(
+                executor=executor, threshold=100
+            ) == expected
+
+    asyncio.run(encode())
+
+
+def test_from_json_async():
+    import asyncio
+    import concurrent.futures
+    import json
+
+    inventory = Inventory(
+        [Stock(f'sku-{i}', [i, i + 1]) for i in range(1000)],
+        [None, Stock('x', [])] * 10,
+        {'a': 'b'},
+    )
+    json_data = inventory.to_json()
+
+    async def decode():
+        assert await Inventory.from_json_async(json_data) == inventory
+        assert await Inventory.from_json_async(
+            json_data.encode(), threshold=100
+        ) == inventory
+        assert await Inventory.from_json_async(
+            json_data, threshold=100, yield_every=7
+        ) == inventory
+        # Not compact
+        assert await Inventory.from_json_async(
+            json.dumps(json.loads(json_data), indent=2),
+            threshold=100, yield_every=7,
+        ) == inventory
+        with concurrent.futures.ProcessPoolExecutor(1) as executor:
+            assert await Inventory.from_json_async(
+                json_data, executor=executor, threshold=100
+            ) == inventory
+
+        for invalid in ['{"stock": [1,]}', '{"stock": [] ,}', '{"stock": []} x']:
+            for yield_every in [None, 1]:
+                with pytest.raises(json.JSONDecodeError):
+                    await Inventory.from_json_async(
+                        invalid, threshold=0, yield_every=yield_every
+                    )
+
+    asyncio.run(decode())
+
+
+def test_json_async__union():
+    import asyncio
+
+    @dataclass
+    class Cat:
+        kind: typing.Literal['cat']
+        lives: int
+
+    @dataclass
+    class Dog:
+        kind: typing.Literal['dog']
+        good: bool
+
+    @dataclass_json
+    @dataclass
+    class Pets:
+        pets: List[Union[Cat, Dog]]
+
+    pets = Pets([Cat('cat', i) if i % 2 else Dog('dog', True) for i in range(20)])
+    json_data = pets.to_json()
+
+    async def round_trip():
+        assert await pets.to_json_async(threshold=0, yield_every=7) == json_data
+        assert await Pets.from_json_async(
+            json_data, threshold=0, yield_every=7
+        ) == pets
+
+    asyncio.run(round_trip())
+
+
 def test_to_json__json_mixin():
 
     @dataclass_json
@@ -126,6 +367,30 @@ def test_from_json__json_mixin():
         JSONMixin.from_json('{"x":5,"y":"hi"}')
 
 
+def test_from_json__buffers():
+
+    @dataclass_json
+    @dataclass
+    class A:
+        x: int
+        y: str
+
+    assert A.from_json(b'{"x":5,"y":"hi"}') == A(5, 'hi')
+    assert A.from_json(bytearray(b'{"x":5,"y":"hi"}')) == A(5, 'hi')
+    assert A.from_json('{"x":5,"y":"h\u00ed"}'.encode('utf-16')) \
+        == A(5, 'h\u00ed')
+
+    # A view over part of a bigger buffer
+    buffer = bytearray(b'[{"x":5,"y":"hi"},{"x":6,"y":"ho"}]')
+    assert A.from_json(memoryview(buffer)[18:-1]) == A(6, 'ho')
+    # Not contiguous
+    assert A.from_json(memoryview(b'{{""xx""::55,,""yy""::""hhii""}}')[::2]) \
+        == A(5, 'hi')
+
+    with pytest.raises(TypeError):
+        A.from_json(5)
+
+
 def test_to_dict__optional():
 
     @dataclass_json
@@ -903,6 +1168,34 @@ def test_datetimes_not_supported_by_standard_library():
         == A(datetime(2021, 9, 22, 7, 54, 13, 370000, tzinfo=timezone.utc))
 
 
+def test_from_dict__datetime__fixed_width_formats():
+    from datetime import datetime, timedelta, timezone
+
+    @dataclass_json
+    @dataclass
+    class A:
+        x: datetime
+
+    plus_two = timezone(timedelta(hours=2))
+    for json_value, expected in [
+        ('2021-06-17T10:00:00', datetime(2021, 6, 17, 10)),
+        ('2021-06-17T10:00:00.123456',
+         datetime(2021, 6, 17, 10, 0, 0, 123456)),
+        ('2021-06-17T10:00:00.123Z',
+         datetime(2021, 6, 17, 10, 0, 0, 123000, tzinfo=timezone.utc)),
+        ('2021-06-17T10:00:00+02:00',
+         datetime(2021, 6, 17, 10, tzinfo=plus_two)),
+        ('2021-06-17T10:00:00.123456-02:30',
+         datetime(2021, 6, 17, 10, 0, 0, 123456,
+                  tzinfo=timezone(-timedelta(hours=2, minutes=30)))),
+    ]:
+        assert A.from_dict({'x': json_value}).x == expected
+
+    for invalid in ['not a datetime', '', 'Z']:
+        with pytest.raises(ValueError):
+            A.from_dict({'x': invalid})
+
+
 def test_to_dict__decimal():
     from decimal import Decimal
 
@@ -930,6 +1223,44 @@ def test_from_dict__decimal():
     assert A.from_dict({'x': 1.23}) == A(Decimal('1.23'))
 
 
+def test_from_json__decimal():
+    from decimal import Decimal
+
+    @dataclass_json
+    @dataclass
+    class Line:
+        price: Decimal
+        quantity: int
+
+    @dataclass_json
+    @dataclass
+    class Order:
+        lines: List[Line]
+        total: Optional[Decimal] = None
+
+    # Parsed straight into Decimals, not rounded to floats on the way
+    order = Order.from_json(
+        '{"lines": [{"price": 12345678901234567.89, "quantity": 2}],'
+        ' "total": 1e-30}'
+    )
+    assert order == Order(
+        [Line(Decimal('12345678901234567.89'), 2)], Decimal('1e-30')
+    )
+    assert Order.from_json(b'{"lines": [{"price": 0.1, "quantity": 1}]}') \
+        == Order([Line(Decimal('0.1'), 1)])
+
+    @dataclass_json
+    @dataclass
+    class Mixed:
+        price: Decimal
+        weight: float
+
+    # Floats elsewhere in the tree still come out as floats
+    mixed = Mixed.from_json('{"price": 0.1, "weight": 0.5}')
+    assert mixed == Mixed(Decimal('0.1'), 0.5)
+    assert type(mixed.weight) is float
+
+
 def test_to_dict__uuid():
     from uuid import UUID
 
@@ -1271,6 +1602,668 @@ def test_field_name_transform():
     }) == SnakesOfCamels(snake_one=1, snake_two=2, snake_three=3)
 
 
+def test_union__tagged():
+
+    @dataclass
+    class Cat:
+        kind: typing.Literal['cat']
+        lives: int
+
+    @dataclass
+    class Dog:
+        kind: typing.Literal['dog']
+        good: bool
+
+    @dataclass
+    class Bird:
+        wings: int
+        species: str = 'bird'
+
+    @dataclass
+    class Fish:
+        fins: int
+        species: str = 'fish'
+
+    for options in [{}, {'compile_after': 2}]:
+
+        @dataclass_json(**options)
+        @dataclass
+        class Home:
+            pets: List[Union[Cat, Dog]]
+            other: Optional[Union[Bird, Fish]] = field(
+                default=None,
+                metadata={'fastclasses_json': {'tag': 'species'}},
+            )
+
+        data = {
+            'pets': [{'kind': 'cat', 'lives': 9},
+                     {'kind': 'dog', 'good': True}],
+            'other': {'fins': 2, 'species': 'fish'},
+        }
+        for _ in range(3):
+            home = Home.from_dict(data)
+            assert home == Home([Cat('cat', 9), Dog('dog', True)], Fish(2))
+            assert home.to_dict() == data
+
+        with pytest.raises(KeyError):
+            Home.from_dict({'pets': [{'kind': 'cow'}]})
+
+        # Instances of subclasses are converted as the member they are of
+        class Kitten(Cat):
+            pass
+
+        for _ in range(3):
+            assert Home([Kitten('cat', 9)]).to_dict() == \
+                {'pets': [{'kind': 'cat', 'lives': 9}]}
+
+
+def test_union__by_type():
+    from datetime import date
+    from decimal import Decimal
+
+    @dataclass
+    class Cat:
+        lives: int
+
+    for options in [{}, {'compile_after': 2}]:
+
+        @dataclass_json(**options)
+        @dataclass
+        class A:
+            x: Union[int, date, Cat]
+            y: Union[str, List[Cat], None] = None
+
+        for _ in range(3):
+            assert A.from_dict({'x': 1, 'y': 'y'}) == A(1, 'y')
+            assert A.from_dict({'x': '2021-06-17'}) == A(date(2021, 6, 17))
+            assert A.from_dict({'x': {'lives': 9}, 'y': [{'lives': 1}]}) == \
+                A(Cat(9), [Cat(1)])
+
+            assert A(1, 'y').to_dict() == {'x': 1, 'y': 'y'}
+            assert A(date(2021, 6, 17)).to_dict() == {'x': '2021-06-17'}
+            assert A(Cat(9), [Cat(1)]).to_dict() == \
+                {'x': {'lives': 9}, 'y': [{'lives': 1}]}
+
+    for options in [{}, {'compile_after': 2}]:
+
+        @dataclass_json(**options)
+        @dataclass
+        class B:
+            v: Union[Decimal, int]
+
+        for _ in range(3):
+            assert B.from_dict({'v': 1}) == B(1)
+            assert B.from_dict({'v': '1.5'}) == B(Decimal('1.5'))
+            # Numbers other than ints are converted as the first member
+            assert B.from_dict({'v': 1.5}) == B(Decimal('1.5'))
+
+
+def test_union__not_told_apart():
+    from datetime import date
+    from enum import Enum
+
+    class E(Enum):
+        X = 'ex'
+
+    @dataclass
+    class Cat:
+        lives: int
+
+    @dataclass
+    class Dog:
+        good: bool
+
+    for options in [{}, {'compile_after': 2}]:
+
+        # Converted as the first member, after fields that are converted too
+        @dataclass_json(**options)
+        @dataclass
+        class A:
+            name: str
+            when: date
+            pet: Union[Cat, Dog]
+            e: Union[str, E]
+            other: Optional[Union[Cat, Dog]] = None
+
+        data = {'name': 'n', 'when': '2021-06-17', 'pet': {'lives': 9},
+                'e': 'ex'}
+        for _ in range(3):
+            assert A.from_dict(data) == A('n', date(2021, 6, 17), Cat(9), 'ex')
+            assert A.from_dict({**data, 'other': {'lives': 1}}) == \
+                A('n', date(2021, 6, 17), Cat(9), 'ex', Cat(1))
+
+
+def test_to_dict__untyped():
+    from datetime import datetime
+    from enum import Enum
+    from uuid import UUID
+
+    class E(Enum):
+        X = 'ex'
+
+    @dataclass
+    class Inner:
+        x: int
+
+    for options in [{}, {'compile_after': 2}]:
+
+        @dataclass_json(**options)
+        @dataclass
+        class A:
+            a: typing.Any
+            b: dict
+            c: list
+            d: object = None
+            e: Dict[str, typing.Any] = None
+
+        uuid = UUID('e10be89e-938f-4b49-b4cf-9765f2f15298')
+        for _ in range(3):
+            a = A(
+                Inner(1),
+                {'inner': Inner(2), 'e': E.X},
+                [datetime(2021, 6, 17), uuid, (Inner(3),)],
+                None,
+                {'k': [Inner(4)]},
+            )
+            assert a.to_dict() == {
+                'a': {'x': 1},
+                'b': {'inner': {'x': 2}, 'e': 'ex'},
+                'c': ['2021-06-17T00:00:00', str(uuid), [{'x': 3}]],
+                'd': None,
+                'e': {'k': [{'x': 4}]},
+            }
+
+            # Nothing to convert, so nothing is copied
+            plain = {'k': [1, 'x', None, 1.5, True]}
+            d = A(plain, plain, [plain]).to_dict()
+            assert d['a'] is plain
+            assert d['b'] is plain
+            assert d['c'][0] is plain
+
+
+def test_json_encoder():
+    from datetime import date
+    import json
+    from fastclasses_json import JSONEncoder, dumps
+
+    @dataclass_json
+    @dataclass
+    class A:
+        x: int
+        when: date
+
+    @dataclass_json(field_name_transform=str.upper)
+    @dataclass
+    class B:
+        a: A
+
+    @dataclass
+    class Plain:
+        y: int
+
+    before = dict(vars(Plain))
+    data = {
+        'items': [A(1, date(2021, 6, 17)), B(A(2, date(2021, 6, 18)))],
+        'plain': Plain(3),
+        'when': date(2021, 6, 19),
+    }
+    expected = {
+        'items': [
+            {'x': 1, 'when': '2021-06-17'},
+            {'A': {'X': 2, 'WHEN': '2021-06-18'}},
+        ],
+        'plain': {'y': 3},
+        'when': '2021-06-19',
+    }
+    for _ in range(2):
+        assert json.loads(json.dumps(data, cls=JSONEncoder)) == expected
+        assert json.loads(dumps(data)) == expected
+    assert dumps([A(1, date(2021, 6, 17))]) == \
+        '[{"x":1,"when":"2021-06-17"}]'
+    assert dumps([1], indent=2) == '[\n  1\n]'
+    # Plain wasn't given any methods
+    assert dict(vars(Plain)) == before
+
+    with pytest.raises(TypeError):
+        dumps({'x': object()})
+
+    # Classes aren't kept alive by how they're encoded
+    import gc
+    import weakref
+
+    @dataclass_json
+    @dataclass
+    class Gone:
+        x: int
+
+    assert dumps([Gone(1)]) == '[{"x":1}]'
+    gone = weakref.ref(Gone)
+    del Gone
+    gc.collect()
+    assert gone() is None
+
+
+def test_codec():
+    from datetime import date
+    from fastclasses_json import codec, Codec
+
+    # Not decorated, as if from a library we can't change
+    @dataclass
+    class Point:
+        x: int
+        y: int
+
+    @dataclass
+    class Line:
+        kind: typing.Literal['line']
+        points: List[Point]
+
+    @dataclass
+    class Dot:
+        kind: typing.Literal['dot']
+        at: Point
+
+    before = {cls: dict(vars(cls)) for cls in (Point, Line, Dot)}
+
+    for options, data in [
+        ({}, {'a': [{'x': 1, 'y': 2}]}),
+        ({'compile_after': 2}, {'a': [{'x': 1, 'y': 2}]}),
+        ({'field_name_transform': str.upper}, {'a': [{'X': 1, 'Y': 2}]}),
+    ]:
+        c = codec(Dict[str, List[Point]], **options)
+        assert isinstance(c, Codec)
+        assert codec(Dict[str, List[Point]], **options) is c
+        for _ in range(3):
+            assert c.decode(data) == {'a': [Point(1, 2)]}
+            assert c.encode({'a': [Point(1, 2)]}) == data
+
+    shapes = codec(List[typing.Union[Line, Dot]])
+    json_data = (
+        '[{"kind":"dot","at":{"x":1,"y":2}},'
+        '{"kind":"line","points":[{"x":1,"y":2},{"x":3,"y":4}]}]'
+    )
+    value = [Dot('dot', Point(1, 2)), Line('line', [Point(1, 2), Point(3, 4)])]
+    assert shapes.loads(json_data) == value
+    assert shapes.dumps(value) == json_data
+
+    names = codec(List[str])
+    assert names.dumps(['caf\u00e9']) == '["caf\\u00e9"]'
+    assert names.dumps(['caf\u00e9'], ensure_ascii=False) == '["caf\u00e9"]'
+    assert names.dumps(['caf\u00e9'], indent=1, ensure_ascii=False) == \
+        '[\n "caf\u00e9"\n]'
+
+    assert codec(Optional[date]).decode('2021-06-17') == date(2021, 6, 17)
+    assert codec(Optional[date]).decode(None) is None
+    assert codec(Point).decode({'x': 1, 'y': 2}) == Point(1, 2)
+    assert codec(int).decode(1) == 1
+
+    # The classes weren't given any methods
+    assert {cls: dict(vars(cls)) for cls in (Point, Line, Dot)} == before
+
+
+# Module level, for the string type hints
+
+@dataclass_json(iterative=True)
+@dataclass(frozen=True)
+class Tree:
+    name: str
+    children: List['Tree'] = field(default_factory=list)
+    by_name: Dict[str, 'Tree'] = field(default_factory=dict)
+    pair: Optional[Tuple['Tree', int]] = None
+    leaves: Tuple['Tree', ...] = ()
+    size: Optional['Decimal'] = None
+
+
+Decimal = __import__('decimal').Decimal
+
+
+def test_iterative():
+
+    tree = Tree(
+        'a',
+        children=[Tree('b', size=Decimal('1.5'))],
+        by_name={'c': Tree('c', pair=(Tree('d'), 1))},
+        leaves=(Tree('e'), Tree('f')),
+    )
+
+    def leaf(name, **kwargs):
+        return {'name': name, 'children': [], 'by_name': {}, 'leaves': (),
+                **kwargs}
+
+    data = {
+        'name': 'a',
+        'children': [leaf('b', size='1.5')],
+        'by_name': {'c': leaf('c', pair=(leaf('d'), 1))},
+        'leaves': (leaf('e'), leaf('f')),
+    }
+    assert tree.to_dict() == data
+    # In the same order as to_dict would otherwise have them
+    assert list(tree.to_dict()['children'][0]) == \
+        ['name', 'children', 'by_name', 'leaves', 'size']
+    assert Tree.from_dict(data) == tree
+    assert Tree.from_json(tree.to_json()) == tree
+
+
+@dataclass_json(iterative=True)
+@dataclass
+class Neg:
+    kind: typing.Literal['neg']
+    arg: Union['Neg', 'Num']
+
+
+@dataclass_json(iterative=True)
+@dataclass
+class Num:
+    kind: typing.Literal['num']
+    value: int
+
+
+def test_iterative__union():
+    expr: Union[Neg, Num] = Num('num', 1)
+    for _ in range(5000):
+        expr = Neg('neg', expr)
+
+    data = expr.to_dict()
+    for _ in range(5000):
+        assert data['kind'] == 'neg'
+        data = data['arg']
+    assert data == {'kind': 'num', 'value': 1}
+
+    decoded = Neg.from_dict(expr.to_dict())
+    for _ in range(5000):
+        assert type(decoded) is Neg
+        decoded = decoded.arg
+    assert decoded == Num('num', 1)
+
+    # json itself recurses
+    with pytest.raises(RecursionError):
+        expr.to_json()
+
+
+@dataclass_json(graph=True)
+@dataclass
+class Person:
+    name: str
+    friends: List['Person'] = field(default_factory=list)
+    best_friend: Optional['Person'] = None
+    by_nickname: Dict[str, 'Person'] = field(default_factory=dict)
+
+
+def test_graph():
+
+    @dataclass
+    class Customer:
+        name: str
+
+    @dataclass_json(graph=True)
+    @dataclass(frozen=True)
+    class Order:
+        id: int
+        customer: Customer
+
+    @dataclass_json(graph=True)
+    @dataclass
+    class Orders:
+        orders: List[Order]
+        pair: Tuple[Customer, Customer]
+
+    customer = Customer('c')
+    orders = Orders([Order(1, customer), Order(2, customer)], (customer, customer))
+    data = orders.to_dict()
+    assert data == {
+        'orders': [
+            {'id': 1, 'customer': {'$id': 1, 'name': 'c'}},
+            {'id': 2, 'customer': {'$ref': 1}},
+        ],
+        'pair': ({'$ref': 1}, {'$ref': 1}),
+    }
+    # Nothing shared, nothing added
+    assert Order(1, customer).to_dict() == {'id': 1, 'customer': {'name': 'c'}}
+
+    decoded = Orders.from_json(orders.to_json())
+    assert decoded == orders
+    assert ''.join(orders.iter_json_chunks(chunk_size=10)) == orders.to_json()
+    assert decoded.orders[0].customer is decoded.orders[1].customer
+    assert decoded.pair[0] is decoded.pair[1] is decoded.orders[0].customer
+
+    # Cycles
+    alice, bob = Person('alice'), Person('bob')
+    alice.friends.append(bob)
+    alice.best_friend = alice
+    bob.friends.append(alice)
+    bob.by_nickname['al'] = alice
+    data = alice.to_dict()
+    assert data == {
+        '$id': 1,
+        'name': 'alice',
+        'friends': [{
+            'name': 'bob',
+            'friends': [{'$ref': 1}],
+            'by_nickname': {'al': {'$ref': 1}},
+        }],
+        'best_friend': {'$ref': 1},
+        'by_nickname': {},
+    }
+    decoded = Person.from_dict(data)
+    assert decoded.best_friend is decoded
+    decoded_bob = decoded.friends[0]
+    assert decoded_bob.name == 'bob'
+    assert decoded_bob.friends[0] is decoded
+    assert decoded_bob.by_nickname['al'] is decoded
+
+    with pytest.raises(ValueError):
+        Person.from_dict({'name': 'x', 'best_friend': {'$ref': 2}})
+
+    # Shared through a Union of dataclasses
+    @dataclass
+    class Cat:
+        kind: typing.Literal['cat']
+        name: str
+
+    @dataclass
+    class Dog:
+        kind: typing.Literal['dog']
+        name: str
+
+    @dataclass_json(graph=True)
+    @dataclass
+    class Household:
+        pets: List[Union[Cat, Dog]]
+        favourite: Union[Cat, Dog]
+
+    cat = Cat('cat', 'Tom')
+    household = Household([cat, Dog('dog', 'Rex')], cat)
+    data = household.to_dict()
+    assert data == {
+        'pets': [
+            {'$id': 1, 'kind': 'cat', 'name': 'Tom'},
+            {'kind': 'dog', 'name': 'Rex'},
+        ],
+        'favourite': {'$ref': 1},
+    }
+    decoded = Household.from_dict(data)
+    assert decoded == household
+    assert decoded.favourite is decoded.pets[0]
+
+
+def test_cache_encoded():
+    from datetime import date
+    import gc
+    import json
+    from fastclasses_json import encoding_cache_stats
+
+    @dataclass(frozen=True)
+    class Price:
+        currency: str
+        amount: int
+
+    @dataclass_json(cache_encoded=True)
+    @dataclass(frozen=True)
+    class Item:
+        sku: str
+        prices: Tuple[Price, ...]
+        tags: List[str]
+        released: date
+
+    item = Item('x', (Price('EUR', 1),), ['new'], date(2021, 6, 17))
+    expected = {
+        'sku': 'x',
+        'prices': ({'currency': 'EUR', 'amount': 1},),
+        'tags': ['new'],
+        'released': '2021-06-17',
+    }
+    for _ in range(3):
+        d = item.to_dict()
+        assert d == expected
+        # Changing what we're given doesn't change what's cached
+        d['sku'] = 'y'
+        d['prices'][0]['amount'] = 2
+        d['tags'].append('sale')
+        assert item.to_json() == \
+            '{"sku":"x","prices":[{"currency":"EUR","amount":1}],' \
+            '"tags":["new"],"released":"2021-06-17"}'
+    assert item.to_json(indent=2) == json.dumps(expected, indent=2)
+
+    other = Item('z', (), [], date(2021, 6, 18))
+    assert other.to_dict()['sku'] == 'z'
+    assert encoding_cache_stats(Item) == {
+        # to_json with other separators goes through to_dict
+        'to_dict': {'hits': 3, 'misses': 2, 'size': 2},
+        'to_json': {'hits': 2, 'misses': 1, 'size': 1},
+    }
+
+    del item, other
+    gc.collect()
+    stats = encoding_cache_stats(Item)
+    assert stats['to_dict']['size'] == stats['to_json']['size'] == 0
+
+    with pytest.raises(TypeError):
+        @dataclass_json(cache_encoded=True)
+        @dataclass
+        class NotFrozen:
+            x: int
+
+
+@pytest.mark.parametrize('options', [{}, {'compile_after': 2}])
+def test_intern(options):
+
+    @dataclass_json(intern=3, **options)
+    @dataclass(frozen=True)
+    class Currency:
+        code: str
+        digits: int = 2
+
+    @dataclass_json
+    @dataclass
+    class Prices:
+        prices: Dict[str, Currency]
+
+    data = {'prices': {
+        'a': {'code': 'EUR'}, 'b': {'code': 'EUR', 'digits': 2},
+        'c': {'code': 'GBP'}, 'd': {'code': 'JPY', 'digits': 0},
+    }}
+    for _ in range(3):
+        prices = Prices.from_dict(data).prices
+        assert prices['a'] == Currency('EUR')
+        assert prices['a'] is prices['b']
+        assert prices['a'] is Currency.from_dict({'code': 'EUR'})
+        assert prices['a'] is not prices['c']
+        assert prices['d'] == Currency('JPY', 0)
+
+    # A fourth makes room by forgetting the others
+    Currency.from_dict({'code': 'USD'})
+    assert Currency.from_dict({'code': 'EUR'}) is not prices['a']
+
+    with pytest.raises(TypeError):
+        @dataclass_json(intern=True)
+        @dataclass
+        class NotFrozen:
+            x: int
+
+    with pytest.raises(TypeError):
+        @dataclass_json(intern=True)
+        @dataclass(frozen=True, eq=False)
+        class NotHashable:
+            x: int
+
+    with pytest.raises(TypeError, match='Unhashable.xs'):
+        @dataclass_json(intern=True)
+        @dataclass(frozen=True)
+        class Unhashable:
+            x: int
+            xs: Optional[List[int]] = None
+
+
+@pytest.mark.parametrize('options', [{'iterative': True}, {'graph': True}])
+def test_intern__under(options):
+
+    @dataclass_json(intern=True)
+    @dataclass(frozen=True)
+    class Currency:
+        code: str
+
+    @dataclass_json(**options)
+    @dataclass
+    class Prices:
+        prices: List[Currency]
+
+    prices = Prices.from_dict(
+        {'prices': [{'code': 'EUR'}, {'code': 'EUR'}]}
+    ).prices
+    assert prices[0] is prices[1]
+    assert prices[0] is Currency.from_dict({'code': 'EUR'})
+
+
+def test_cached_decoder():
+    from fastclasses_json import CachedDecoder
+
+    @dataclass_json
+    @dataclass(frozen=True)
+    class Flags:
+        names: Tuple[str, ...]
+
+    @dataclass_json
+    @dataclass
+    class MutableFlags:
+        names: List[str]
+
+    flags = CachedDecoder(Flags, max_bytes=40)
+    json_data = '{"names":["a","b"]}'
+    first = flags.from_json(json_data)
+    assert first == Flags(('a', 'b'))
+    assert flags.from_json(json_data) is first
+    from_bytes = flags.from_json(json_data.encode())
+    assert from_bytes == first
+    assert flags.from_json(bytearray(json_data.encode())) is from_bytes
+    assert (flags.hits, flags.misses, flags.size) == (2, 2, 38)
+
+    # Too big to keep
+    flags.from_json('{"names":["' + 'x' * 40 + '"]}')
+    assert flags.size == 38
+    # Makes room by dropping the least recently used, the str
+    assert flags.from_json('{"names":[]}') == Flags(())
+    assert flags.size == 19 + 12
+    assert flags.from_json(json_data.encode()) is from_bytes
+    assert flags.from_json(json_data) is not first
+    assert (flags.hits, flags.misses) == (3, 5)
+
+    flags.clear()
+    assert flags.size == 0
+    assert flags.from_json(json_data) is not first
+
+    # Counted in bytes, like the same JSON would be as bytes
+    flags.clear()
+    flags.from_json('{"names":["\u00fc"]}')
+    assert flags.size == len('{"names":["\u00fc"]}'.encode()) == 16
+
+    mutable_flags = CachedDecoder(MutableFlags)
+    first = mutable_flags.from_json(json_data)
+    first.names.append('c')
+    second = mutable_flags.from_json(json_data)
+    assert second == MutableFlags(['a', 'b'])
+    assert mutable_flags.hits == 1
+
+
 def test_field_name_transform__conflicting_transforms():
 
     def to_camel_case(field_name):
@@ -1345,6 +2338,125 @@ def test_field_name_transform__conflicting_transforms():
     }) == Snakes(1, 2, Adders(3))
 
 
+def test_compiled_variants():
+    from fastclasses_json import (
+        compiled_variants, clear_compiled_variants, set_max_compiled_variants
+    )
+
+    @dataclass
+    class Inner:
+        some_value: int
+
+    @dataclass
+    class A:
+        the_inner: Inner
+
+    def transform(prefix):
+        return lambda name: prefix + name
+
+    def codec(prefix):
+        return dataclass_json(field_name_transform=transform(prefix))(A)
+
+    clear_compiled_variants()
+    attrs = set(vars(Inner))
+    try:
+        set_max_compiled_variants(4)
+        for prefix in 'abc':
+            data = {prefix + 'the_inner': {prefix + 'some_value': 1}}
+            assert codec(prefix).from_dict(data) == A(Inner(1))
+            assert A(Inner(1)).to_dict() == data
+
+        # Nothing is left behind on the nested class
+        assert set(vars(Inner)) == attrs
+        # Only the most recent options are kept
+        assert [(method, classes) for method, _, classes
+                in compiled_variants()] == [
+            ('from_dict', [A, Inner]),
+            ('to_dict', [A, Inner]),
+            ('from_dict', [A, Inner]),
+            ('to_dict', [A, Inner]),
+        ]
+        assert compiled_variants()[-1][1]['field_name_transform']('x') == 'cx'
+
+        clear_compiled_variants()
+        assert compiled_variants() == []
+        # They are compiled again as needed
+        data = {'cthe_inner': {'csome_value': 2}}
+        assert A.from_dict(data) == A(Inner(2))
+        assert A(Inner(2)).to_dict() == data
+    finally:
+        set_max_compiled_variants(128)
+
+
+def test_generic():
+    from fastclasses_json import (
+        compiled_variants, clear_compiled_variants, set_max_compiled_variants
+    )
+    T = typing.TypeVar('T')
+
+    @dataclass
+    class Order:
+        id: int
+
+    @dataclass_json
+    @dataclass
+    class Page(typing.Generic[T]):
+        items: List[T]
+        next: Optional[T] = None
+
+    @dataclass_json
+    @dataclass
+    class Envelope(typing.Generic[T]):
+        page: Page[T]
+        by_id: Dict[str, T]
+
+    @dataclass_json
+    @dataclass
+    class Orders:
+        page: Page[Order]
+
+    data = {'items': [{'id': 1}], 'next': {'id': 2}}
+    page = Page[Order].from_dict(data)
+    assert page == Page([Order(1)], Order(2))
+    assert Page[Order].to_dict(page) == data
+    assert Page[Order].to_json(page) == '{"items":[{"id":1}],"next":{"id":2}}'
+    assert Page[Order].to_json_bytes(page) \
+        == b'{"items":[{"id":1}],"next":{"id":2}}'
+    assert ''.join(Page[Order].iter_json_chunks(page, chunk_size=1)) \
+        == '{"items":[{"id":1}],"next":{"id":2}}'
+    assert Page[Order].from_json('{"items":[{"id":3}]}') == Page([Order(3)])
+    # Without the type parameter, there's nothing to convert to
+    assert Page.from_dict(data) == Page([{'id': 1}], {'id': 2})
+
+    data = {'page': {'items': [{'id': 1}]}, 'by_id': {'a': {'id': 3}}}
+    envelope = Envelope[Order].from_dict(data)
+    assert envelope == Envelope(Page([Order(1)]), {'a': Order(3)})
+    assert Envelope[Order].to_dict(envelope) == data
+
+    orders = Orders.from_dict({'page': {'items': [{'id': 4}]}})
+    assert orders == Orders(Page([Order(4)]))
+    assert orders.to_dict() == {'page': {'items': [{'id': 4}]}}
+
+    @dataclass
+    class Refund:
+        id: int
+
+    clear_compiled_variants()
+    try:
+        set_max_compiled_variants(1)
+        assert Page[Order].from_dict({'items': [{'id': 5}]}) == \
+            Page([Order(5)])
+        assert Page[Refund].from_dict({'items': [{'id': 6}]}) == \
+            Page([Refund(6)])
+        assert [classes for _, _, classes in compiled_variants()] == \
+            [[Page[Refund]]]
+        # and again, after being evicted
+        assert Page[Order].from_dict({'items': [{'id': 7}]}) == \
+            Page([Order(7)])
+    finally:
+        set_max_compiled_variants(128)
+
+
 def test_field_name_transform__errors():
 
     def forget_to_return(field_name):
@@ -1404,3 +2516,322 @@ def test_field_name_transform__with_field_name():
 
     assert Snakes(1, 2).to_dict() == {'worm': 1, 'SNAKE_TWO': 2}
     assert Snakes.from_dict({'worm': 1, 'SNAKE_TWO': 2}) == Snakes(1, 2)
+
+
+def test_from_dict__exact_shape():
+    from fastclasses_json import fast_path_stats
+
+    @dataclass
+    class Inner:
+        y: int = 2
+
+    @dataclass_json
+    @dataclass
+    class A:
+        x: int
+        inner: Optional[Inner]
+        z: int = 1
+
+    assert A.from_dict({'x': 1, 'inner': {'y': 3}, 'z': 4}) == A(1, Inner(3), 4)
+    assert A.from_dict({'x': 1, 'inner': None, 'z': 4}) == A(1, None, 4)
+    assert fast_path_stats(A) == {'exact': 2, 'fallback': 0}
+    assert fast_path_stats(Inner) == {'exact': 1, 'fallback': 0}
+
+    # missing and extra keys take the general path
+    assert A.from_dict({'x': 1, 'inner': {}}) == A(1, Inner(2), 1)
+    assert A.from_dict({'x': 1, 'inner': None, 'z': 4, 'w': 0}) == \
+        A(1, None, 4)
+    assert fast_path_stats(A) == {'exact': 2, 'fallback': 2}
+    assert fast_path_stats(Inner) == {'exact': 1, 'fallback': 1}
+
+    @dataclass
+    class Cat:
+        lives: int
+
+    @dataclass
+    class Dog:
+        good: bool
+
+    # Converted as Cat, after a field that is converted too
+    @dataclass_json
+    @dataclass
+    class B:
+        inner: Inner
+        pet: Union[Cat, Dog]
+
+    assert B.from_dict({'inner': {'y': 1}, 'pet': {'lives': 9}}) == \
+        B(Inner(1), Cat(9))
+    assert B.from_dict({'inner': {'y': 1}, 'pet': None}) == B(Inner(1), None)
+    assert fast_path_stats(B) == {'exact': 2, 'fallback': 0}
+
+
+def test_from_dict__exact_shape__field_name():
+
+    @dataclass_json(field_name_transform=str.upper)
+    @dataclass
+    class A:
+        x: int
+        y: int = field(metadata={"fastclasses_json": {"field_name": "why"}})
+
+    assert A.from_dict({'X': 1, 'why': 2}) == A(1, 2)
+    assert A.from_dict({'x': 1, 'y': 2}) == A(None, None)
+
+
+def test_from_dict__wide(monkeypatch):
+    from enum import Enum
+    from fastclasses_json import core, fast_path_stats
+
+    # so that we don't need to write out dozens of fields
+    monkeypatch.setattr(core, '_WIDE_THRESHOLD', 3)
+
+    class E(Enum):
+        X = 'ex'
+
+    @dataclass
+    class Inner:
+        y: int
+
+    @dataclass_json
+    @dataclass
+    class A:
+        a: int
+        b: Optional[Inner]
+        c: E
+        d: str = field(metadata={"fastclasses_json": {
+            "field_name": "dee",
+            "decoder": str.upper,
+        }})
+        e: E = E.X
+        f: List[Inner] = field(default_factory=list)
+
+    assert core._is_wide(A)
+
+    data = {'a': 1, 'b': {'y': 2}, 'c': 'ex', 'dee': 'd', 'e': 'ex',
+            'f': [{'y': 3}]}
+    assert A.from_dict(data) == A(1, Inner(2), E.X, 'D', E.X, [Inner(3)])
+    assert fast_path_stats(A) == {'exact': 1, 'fallback': 0}
+
+    assert A.from_dict({'a': 1, 'b': None}) == A(1, None, None, None)
+    assert A.from_dict({'f': None}) == A(None, None, None, None, E.X, None)
+    assert A.from_dict({'a': 1}).f == []
+    assert A.from_dict({'a': 1}).f is not A.from_dict({'a': 1}).f
+    assert fast_path_stats(A) == {'exact': 1, 'fallback': 5}
+
+
+def test_compile_after():
+    from datetime import date, datetime, timezone
+    from decimal import Decimal
+    from enum import Enum
+    from uuid import UUID
+    from fastclasses_json import core, tier_stats
+
+    class E(Enum):
+        X = 'ex'
+
+    @dataclass
+    class Inner:
+        y: int
+        e: Optional[E] = None
+
+    def make_classes(**options):
+
+        @dataclass_json(**options)
+        @dataclass
+        class A:
+            a: int
+            b: Optional[Inner]
+            c: List[Inner]
+            d: Dict[int, List[E]]
+            e: Tuple[Inner, int]
+            f: Tuple[date, ...]
+            g: datetime
+            h: Decimal
+            i: Dict[UUID, Optional[str]]
+            j: Sequence[int]
+            k: str = field(default='k', metadata={"fastclasses_json": {
+                "field_name": "kay",
+                "decoder": str.upper,
+                "encoder": str.lower,
+            }})
+            m: List[int] = field(default_factory=list)
+
+        return A
+
+    data = {
+        'a': 1,
+        'b': {'y': 2, 'e': 'ex'},
+        'c': [{'y': 3}, {'y': 4, 'e': None}],
+        'd': {'5': ['ex']},
+        'e': [{'y': 6}, 7],
+        'f': ['2021-06-17', '2021-06-18'],
+        'g': '2021-06-17T12:34:56Z',
+        'h': '1.23',
+        'i': {'e10be89e-938f-4b49-b4cf-9765f2f15298': None},
+        'j': [8, 9],
+        'kay': 'k',
+    }
+
+    Compiled = make_classes()
+    Tiered = make_classes(compile_after=3)
+    before = tier_stats()
+
+    expected = Compiled.from_dict(data)
+    expected_dict = expected.to_dict()
+    assert expected.g == datetime(2021, 6, 17, 12, 34, 56, tzinfo=timezone.utc)
+
+    for _ in range(5):
+        a = Tiered.from_dict(data)
+        assert vars(a) == vars(expected)
+        a_dict = a.to_dict()
+        assert a_dict == expected_dict
+        assert list(a_dict) == list(expected_dict)
+
+        assert vars(Tiered.from_dict({})) == vars(Compiled.from_dict({}))
+
+    # A and Inner, in both directions
+    after = tier_stats()
+    assert after['interpreted'] - before['interpreted'] == 4
+    assert after['promoted'] - before['promoted'] == 4
+
+    assert Tiered.from_dict.__code__.co_filename == '<fastclass_generated_code>'
+    assert Tiered.to_dict.__code__.co_filename == '<fastclass_generated_code>'
+    assert core._options_key({'compile_after': 3}) == 'compile_after=3'
+
+
+def _set_closure_var(func, name, value):
+    func.__closure__[func.__code__.co_freevars.index(name)].cell_contents = \
+        value
+
+
+def test_compile_after__count_skipped():
+    from fastclasses_json import core, tier_stats
+
+    @dataclass_json(compile_after=3)
+    @dataclass
+    class A:
+        x: int
+
+    options = {'compile_after': 3}
+    assert A.from_dict({'x': 1}).to_dict() == {'x': 1}
+    before = tier_stats()
+    # As if calls from other threads had raced past compile_after
+    from_dict = core._lookup(A, options, core._from_dict_func(options))
+    to_dict = core._lookup(A, options, core._to_dict_func(options))
+    _set_closure_var(from_dict.__func__, 'calls', 3)
+    _set_closure_var(to_dict, 'calls', 3)
+
+    for _ in range(3):
+        assert A.from_dict({'x': 1}).to_dict() == {'x': 1}
+    assert tier_stats()['promoted'] - before['promoted'] == 2
+    assert A.from_dict.__code__.co_filename == '<fastclass_generated_code>'
+
+
+def test_specialize_after():
+    from enum import Enum
+
+    class E(Enum):
+        X = 'ex'
+
+    @dataclass
+    class Inner:
+        y: int
+
+    def make_class(**options):
+
+        @dataclass_json(**options)
+        @dataclass
+        class A:
+            a: int
+            b: Optional[Inner]
+            c: Optional[E]
+            d: Optional[str]
+            e: List[Inner] = field(default_factory=list)
+            f: Optional[int] = field(default=None, metadata={
+                "fastclasses_json": {"encoder": str, "decoder": int}
+            })
+
+        return A
+
+    General = make_class()
+    Specialized = make_class(specialize_after=3)
+
+    usual = {'a': 1, 'b': {'y': 2}, 'd': 'dee', 'f': '3'}
+    unusual = [
+        {},
+        {'a': 1, 'b': None, 'c': 'ex', 'd': 'dee', 'e': [{'y': 4}], 'f': 5},
+        {'a': 1, 'b': {'y': 2}, 'd': 'dee', 'f': None},
+        {'a': 1, 'b': {'y': 2}, 'c': None, 'd': 'dee', 'f': '3'},
+    ]
+
+    for _ in range(5):
+        for data in [usual, *unusual]:
+            assert vars(Specialized.from_dict(data)) == \
+                vars(General.from_dict(data))
+        a = Specialized.from_dict(usual)
+        expected = General.from_dict(usual).to_dict()
+        assert a.to_dict() == expected
+        assert list(a.to_dict()) == list(expected)
+        for data in unusual:
+            assert Specialized.from_dict(data).to_dict() == \
+                General.from_dict(data).to_dict()
+
+    code = Specialized.from_dict.__code__
+    assert code.co_filename == '<fastclass_generated_code>'
+    assert '__profiled_keys' in code.co_names
+    assert '__general' in Specialized.to_dict.__code__.co_names
+
+
+def test_specialize_after__union():
+    from datetime import date
+
+    @dataclass
+    class Cat:
+        lives: int
+
+    @dataclass
+    class Dog:
+        good: bool
+
+    def make_class(**options):
+
+        @dataclass_json(**options)
+        @dataclass
+        class A:
+            when: date
+            pet: Union[Cat, Dog]
+            note: Optional[str] = None
+
+        return A
+
+    General = make_class()
+    Specialized = make_class(specialize_after=3)
+
+    data = {'when': '2021-06-17', 'pet': {'lives': 9}}
+    for _ in range(5):
+        assert vars(Specialized.from_dict(data)) == \
+            vars(General.from_dict(data)) == \
+            {'when': date(2021, 6, 17), 'pet': Cat(9), 'note': None}
+    assert '__profiled_keys' in Specialized.from_dict.__code__.co_names
+
+
+def test_specialize_after__count_skipped():
+    from fastclasses_json import core
+
+    @dataclass_json(specialize_after=3)
+    @dataclass
+    class A:
+        x: int
+        y: Optional[int] = None
+
+    options = {'specialize_after': 3}
+    assert A.from_dict({'x': 1}).to_dict() == {'x': 1}
+    # As if calls from other threads had raced past specialize_after
+    from_dict = core._lookup(A, options, core._from_dict_func(options))
+    to_dict = core._lookup(A, options, core._to_dict_func(options))
+    _set_closure_var(from_dict.__func__, 'calls', 3)
+    _set_closure_var(to_dict, 'calls', 3)
+
+    for _ in range(3):
+        assert A.from_dict({'x': 1}).to_dict() == {'x': 1}
+    assert '__profiled_keys' in A.from_dict.__code__.co_names
+    assert '__general' in A.to_dict.__code__.co_names
@@ -0,0 +1,177 @@
+import importlib
+import sys
+import textwrap
+
+import pytest
+
+from fastclasses_json import codegen, core, StaleCodegenWarning
+
+
+MODELS = '''\
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Optional
+
+from fastclasses_json import dataclass_json
+
+
+class Colour(Enum):
+    RED = 'red'
+    BLUE = 'blue'
+
+
+@dataclass
+class Point:
+    x: int
+    y: int = 0
+
+
+@dataclass_json
+@dataclass
+class Shape:
+    points: List[Point]
+    colour: Optional[Colour] = None
+    name: str = field(default='', metadata={
+        "fastclasses_json": {"field_name": "label"}
+    })
+'''
+
+
+@pytest.fixture
+def aotpkg(tmp_path, monkeypatch):
+    package = tmp_path / 'aotpkg'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    (package / 'models.py').write_text(MODELS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    def reimport():
+        for name in list(sys.modules):
+            if name.split('.')[0] == 'aotpkg':
+                del sys.modules[name]
+        core._generated_modules.clear()
+        importlib.invalidate_caches()
+        return importlib.import_module('aotpkg.models')
+
+    yield package, reimport
+
+    for name in list(sys.modules):
+        if name.split('.')[0] == 'aotpkg':
+            del sys.modules[name]
+    core._generated_modules.clear()
+
+
+def test_codegen(aotpkg, monkeypatch):
+    package, reimport = aotpkg
+    reimport()
+
+    assert codegen.main(['codegen', 'aotpkg.models']) == 0
+    assert (package / '_fastclasses_generated.py').exists()
+
+    models = reimport()
+
+    def no_compiling(src):
+        raise AssertionError('should not compile')
+    monkeypatch.setattr(core, '_compile_function', no_compiling)
+
+    data = {'points': [{'x': 1, 'y': 2}, {'x': 3}], 'colour': 'red',
+            'label': 'zig'}
+    shape = models.Shape.from_dict(data)
+    assert shape == models.Shape(
+        [models.Point(1, 2), models.Point(3, 0)], models.Colour.RED, 'zig'
+    )
+    assert shape.to_dict() == {
+        'points': [{'x': 1, 'y': 2}, {'x': 3, 'y': 0}],
+        'colour': 'red',
+        'label': 'zig',
+    }
+
+
+def test_codegen__check(aotpkg):
+    package, reimport = aotpkg
+    reimport()
+
+    assert codegen.main(['codegen', 'aotpkg.models', '--check']) == 1
+    assert codegen.main(['codegen', 'aotpkg.models']) == 0
+    assert codegen.main(['codegen', 'aotpkg.models', '--check']) == 0
+
+    (package / 'models.py').write_text(MODELS.replace(
+        '    y: int = 0\n', '    y: int = 0\n    z: int = 0\n'
+    ))
+    reimport()
+    assert codegen.main(['codegen', 'aotpkg.models', '--check']) == 1
+
+
+def test_codegen__stale(aotpkg):
+    package, reimport = aotpkg
+    reimport()
+    assert codegen.main(['codegen', 'aotpkg.models']) == 0
+
+    (package / 'models.py').write_text(MODELS.replace(
+        '    y: int = 0\n', '    y: int = 0\n    z: int = 0\n'
+    ))
+    models = reimport()
+
+    with pytest.warns(StaleCodegenWarning):
+        shape = models.Shape.from_dict({'points': [{'x': 1, 'z': 2}]})
+    assert shape == models.Shape([models.Point(1, 0, 2)])
+
+
+PETS = '''\
+from dataclasses import dataclass
+from typing import Literal, Union
+
+from fastclasses_json import dataclass_json
+
+
+@dataclass
+class Cat:
+    kind: Literal['cat']
+    lives: int
+
+
+@dataclass
+class Dog:
+    kind: Literal['dog']
+    good: bool
+
+
+@dataclass_json
+@dataclass
+class Owner:
+    pet: Union[Cat, Dog]
+'''
+
+
+def test_codegen__stale_union_tags(aotpkg):
+    package, reimport = aotpkg
+    (package / 'pets.py').write_text(PETS)
+    reimport()
+    importlib.import_module('aotpkg.pets')
+    assert codegen.main(['codegen', 'aotpkg.pets']) == 0
+
+    # Only the tag of a member changes, not Owner itself
+    (package / 'pets.py').write_text(PETS.replace("'cat'", "'kitty'"))
+    reimport()
+    pets = importlib.import_module('aotpkg.pets')
+
+    with pytest.warns(StaleCodegenWarning):
+        owner = pets.Owner.from_dict({'pet': {'kind': 'kitty', 'lives': 9}})
+    assert owner == pets.Owner(pets.Cat('kitty', 9))
+
+
+def test_codegen__output(aotpkg, tmp_path):
+    package, reimport = aotpkg
+    reimport()
+
+    output = tmp_path / 'elsewhere.py'
+    assert codegen.main(['codegen', 'aotpkg.models', '-o', str(output)]) == 0
+
+    source = output.read_text()
+    assert source.startswith(textwrap.dedent("""\
+        # Generated by fastclasses_json. DO NOT EDIT.
+        # Regenerate with: python -m fastclasses_json codegen aotpkg.models
+        """))
+    assert "('aotpkg.models', 'Shape', '')" in source
+    assert "('aotpkg.models', 'Point', '')" in source
+    compile(source, str(output), 'exec')
@@ -56,6 +56,12 @@ def test_from_dict_source():
     assert core._from_dict_source(A) == textwrap.dedent(
         """\
         def from_dict(cls, o, *, infer_missing):
+            if len(o) == 1 and o.keys() == __keys:
+                __shape_counts[0] += 1
+                return cls(
+                    x=o['x'],
+                )
+            __shape_counts[1] += 1
             args = {}
             args['x'] = o.get('x')
             return cls(**args)
@@ -72,6 +78,12 @@ def test_from_dict_source__optional():
     assert core._from_dict_source(A) == textwrap.dedent(
         """\
         def from_dict(cls, o, *, infer_missing):
+            if len(o) == 1 and o.keys() == __keys:
+                __shape_counts[0] += 1
+                return cls(
+                    x=o['x'],
+                )
+            __shape_counts[1] += 1
             args = {}
             args['x'] = o.get('x')
             return cls(**args)
@@ -88,6 +100,12 @@ def test_from_dict_source__default():
     assert core._from_dict_source(A) == textwrap.dedent(
         """\
         def from_dict(cls, o, *, infer_missing):
+            if len(o) == 1 and o.keys() == __keys:
+                __shape_counts[0] += 1
+                return cls(
+                    x=o['x'],
+                )
+            __shape_counts[1] += 1
             args = {}
             if 'x' in o:
                 args['x'] = o.get('x')
@@ -109,13 +127,19 @@ def test_from_dict_source__list_nested():
     assert core._from_dict_source(B) == textwrap.dedent(
         """\
         def from_dict(cls, o, *, infer_missing):
+            if len(o) == 1 and o.keys() == __keys:
+                __shape_counts[0] += 1
+                return cls(
+                    a=([A._fastclasses_json_from_dict(__0) for __0 in __f]) if (__f:=o['a']) is not None else None,
+                )
+            __shape_counts[1] += 1
             args = {}
             value = o.get('a')
             if value is not None:
                 value = [A._fastclasses_json_from_dict(__0) for __0 in value]
             args['a'] = value
             return cls(**args)
-        """
+        """  # noqa: E501
     )
 
 
@@ -138,16 +162,47 @@ def test_from_dict_source__tuple():
     assert core._from_dict_source(C) == textwrap.dedent(
         """\
         def from_dict(cls, o, *, infer_missing):
+            if len(o) == 1 and o.keys() == __keys:
+                __shape_counts[0] += 1
+                return cls(
+                    c=((A._fastclasses_json_from_dict(__f[0]),B._fastclasses_json_from_dict(__f[1]),)) if (__f:=o['c']) is not None else None,
+                )
+            __shape_counts[1] += 1
             args = {}
             value = o.get('c')
             if value is not None:
-                value = (__0:=(value),(A._fastclasses_json_from_dict(__0[0]),B._fastclasses_json_from_dict(__0[1]),))[1]
+                value = (A._fastclasses_json_from_dict(value[0]),B._fastclasses_json_from_dict(value[1]),)
             args['c'] = value
             return cls(**args)
-        """
+        """  # noqa: E501
     )
 
 
+def test_shape_args__conditional_transform():
+    from typing import Union
+
+    @dataclass
+    class Cat:
+        lives: int
+
+    @dataclass
+    class Dog:
+        good: bool
+
+    @dataclass
+    class A:
+        name: str
+        pet: Union[Cat, Dog]
+
+    # The transform is itself a conditional expression
+    assert core._shape_args(A, {}) == [
+        "name=o['name']",
+        "pet=((Cat._fastclasses_json_from_dict(__0) "
+        "if (__0:=(__f)) is not None else None)) "
+        "if (__f:=o['pet']) is not None else None",
+    ]
+
+
 def test_from_dict_source__enum():
     from enum import Enum
 
@@ -163,6 +218,12 @@ def test_from_dict_source__enum():
     assert core._from_dict_source(B) == textwrap.dedent(
         """\
         def from_dict(cls, o, *, infer_missing):
+            if len(o) == 1 and o.keys() == __keys:
+                __shape_counts[0] += 1
+                return cls(
+                    a=(A(__f)) if (__f:=o['a']) is not None else None,
+                )
+            __shape_counts[1] += 1
             args = {}
             value = o.get('a')
             if value is not None:
@@ -223,7 +284,8 @@ def test_expr_builder__optional_enum():
 
     builder = core.expr_builder(t)
 
-    assert builder('XXX') == 'A(__0) if (__0:=(XXX)) is not None else None'
+    assert builder('XXX') == \
+        '(A(__0) if (__0:=(XXX)) is not None else None)'
 
 
 def test_expr_builder__dict_enum():
@@ -250,3 +312,64 @@ def test_references_types__enum():
         a: A
 
     assert core.referenced_types(XX) == {'A': A}
+
+
+def test_from_dict_source__nested_tuple():
+    from typing import Tuple
+
+    @dataclass
+    class A:
+        a: str
+
+    @dataclass
+    class C:
+        c: Tuple[A, Tuple[int, A]]
+
+    # Only the inner tuple, which isn't in a variable, is bound to one
+    assert core._from_dict_source(C) == textwrap.dedent(
+        """\
+        def from_dict(cls, o, *, infer_missing):
+            if len(o) == 1 and o.keys() == __keys:
+                __shape_counts[0] += 1
+                return cls(
+                    c=((A._fastclasses_json_from_dict(__f[0]),(__1:=(__f[1]),(__1[0],A._fastclasses_json_from_dict(__1[1]),))[1],)) if (__f:=o['c']) is not None else None,
+                )
+            __shape_counts[1] += 1
+            args = {}
+            value = o.get('c')
+            if value is not None:
+                value = (A._fastclasses_json_from_dict(value[0]),(__1:=(value[1]),(__1[0],A._fastclasses_json_from_dict(__1[1]),))[1],)
+            args['c'] = value
+            return cls(**args)
+        """  # noqa: E501
+    )
+
+
+def test_compile_function__shares_code():
+    import dataclasses
+    import gc
+
+    def make_class(name):
+        return dataclass_json(dataclasses.make_dataclass(
+            name, [('x', int), ('y', Optional[List[int]])]
+        ))
+
+    A, B = make_class('A'), make_class('B')
+
+    assert A.from_dict({'x': 1}) == A(1, None)
+    assert B.from_dict({'x': 1}) == B(1, None)
+    assert A(1, [2]).to_dict() == {'x': 1, 'y': [2]}
+    assert B(1, [2]).to_dict() == {'x': 1, 'y': [2]}
+
+    assert A.from_dict.__func__.__code__ is B.from_dict.__func__.__code__
+    assert A.to_dict.__code__ is B.to_dict.__code__
+    # but not the globals
+    assert A.from_dict.__func__.__globals__ is not \
+        B.from_dict.__func__.__globals__
+
+    src = core._from_dict_source(A)
+    assert src in core._code_cache
+
+    del A, B
+    gc.collect()
+    assert src not in core._code_cache
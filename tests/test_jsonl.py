@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import List, Optional
+import bz2
+import gzip
+import io
+import json
+import lzma
+import threading
+
+import pytest
+
+from fastclasses_json import (
+    dataclass_json, JSONLStats, read_jsonl, write_jsonl
+)
+
+
+@dataclass_json
+@dataclass
+class Event:
+    id: int
+    name: str
+    tags: List[str]
+    parent: Optional[int] = None
+
+
+EVENTS = [
+    Event(i, f'event {i}', ['a', 'ü'][:i % 3], i - 1 if i % 2 else None)
+    for i in range(1000)
+]
+
+
+@pytest.mark.parametrize('extension, open_', [
+    ('', open),
+    ('.gz', gzip.open),
+    ('.bz2', bz2.open),
+    ('.xz', lzma.open),
+])
+def test_write_jsonl__compression_from_extension(tmp_path, extension, open_):
+    path = tmp_path / f'events.jsonl{extension}'
+
+    stats = write_jsonl(path, EVENTS, buffer_size=4096)
+
+    with open_(path, 'rb') as f:
+        data = f.read()
+    assert data.decode().split('\n') == \
+        [e.to_json() for e in EVENTS] + ['']
+    assert stats.records == 1000
+    assert stats.uncompressed_bytes == len(data)
+    assert stats.compressed_bytes == path.stat().st_size
+    if extension:
+        assert stats.compressed_bytes < stats.uncompressed_bytes
+    assert stats.records_per_second > 0
+
+    assert list(read_jsonl(Event, path, buffer_size=4096)) == EVENTS
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'bz2', 'xz', None])
+@pytest.mark.parametrize('background', [False, True])
+def test_read_jsonl__compression_from_magic(compression, background):
+    buffer = io.BytesIO()
+    written = write_jsonl(buffer, EVENTS, compression=compression)
+    # Neither closes a file it was given
+    assert not buffer.closed
+
+    stats = JSONLStats()
+    buffer.seek(0)
+    events = read_jsonl(
+        Event, buffer, background=background, buffer_size=1000, stats=stats
+    )
+    assert next(events) == EVENTS[0]
+    assert 0 < stats.records < 1000
+    assert list(events) == EVENTS[1:]
+
+    assert not buffer.closed
+    assert stats.records == 1000
+    assert stats.compressed_bytes == written.compressed_bytes
+    assert stats.uncompressed_bytes == written.uncompressed_bytes
+    assert stats.seconds > 0
+
+
+def test_read_jsonl__lines():
+    lines = [
+        '\ufeff{"id": 1, "name": "one", "tags": []}',
+        '',
+        '  {"id": 2, "name": "two", "tags": [" "]}  \r',
+        '\t',
+        '{"id": 3, "name": "three", "tags": []}',
+    ]
+    data = '\n'.join(lines).encode()
+
+    for buffer_size in [1, 7, 1024]:
+        assert list(read_jsonl(
+            Event, io.BytesIO(data), buffer_size=buffer_size
+        )) == [
+            Event(1, 'one', []),
+            Event(2, 'two', [' ']),
+            Event(3, 'three', []),
+        ]
+
+
+def test_read_jsonl__invalid():
+    data = b'{"id": 1, "name": "one", "tags": []}\n\n{"id": 2,\n'
+
+    events = read_jsonl(Event, io.BytesIO(data))
+    assert next(events) == Event(1, 'one', [])
+    with pytest.raises(json.JSONDecodeError, match='on line 3'):
+        next(events)
+
+    data = b'{"id": 1, "name": "one", "tags": []} {"id": 2}\n'
+    with pytest.raises(json.JSONDecodeError, match='Extra data on line 1'):
+        list(read_jsonl(Event, io.BytesIO(data)))
+
+    truncated = gzip.compress(b'{"id": 1, "name": "one", "tags": []}\n')[:-4]
+    for background in [False, True]:
+        with pytest.raises(EOFError):
+            list(read_jsonl(
+                Event, io.BytesIO(truncated), background=background
+            ))
+
+    with pytest.raises(ValueError, match='compression must be one of'):
+        read_jsonl(Event, io.BytesIO(data), compression='zip')
+    with pytest.raises(ValueError, match='compression must be one of'):
+        write_jsonl(io.BytesIO(), [], compression='zip')
+
+
+def test_read_jsonl__background_closed_early(tmp_path):
+    path = tmp_path / 'events.jsonl.gz'
+    write_jsonl(path, EVENTS * 10)
+
+    events = read_jsonl(Event, path, background=True, buffer_size=1000)
+    assert next(events) == EVENTS[0]
+    events.close()
+
+    assert not any(
+        t.name == 'fastclasses_json.read_jsonl'
+        for t in threading.enumerate()
+    )
+
+
+def test_read_jsonl__decimal():
+
+    @dataclass_json
+    @dataclass
+    class Price:
+        amount: Decimal
+
+    data = b'{"amount": 0.1}\n{"amount": 1e400}\n'
+    assert list(read_jsonl(Price, io.BytesIO(data))) == [
+        Price(Decimal('0.1')), Price(Decimal('1e400'))
+    ]
+
+
+def test_write_jsonl__ensure_ascii():
+    buffer = io.BytesIO()
+    write_jsonl(buffer, [Event(1, 'ü', [])], ensure_ascii=False)
+
+    assert buffer.getvalue() == \
+        '{"id":1,"name":"ü","tags":[]}\n'.encode()
+
+    # Not valid UTF-8 unless escaped
+    with pytest.raises(UnicodeEncodeError):
+        write_jsonl(io.BytesIO(), [Event(1, '\ud800', [])], ensure_ascii=False)
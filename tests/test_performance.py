@@ -1,9 +1,13 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional, Tuple
+import os
 import sys
 import time
 
-from fastclasses_json import dataclass_json
+import pytest
+
+from fastclasses_json import dataclass_json, dumps
+from fastclasses_json import core
 
 
 @dataclass_json
@@ -54,3 +58,722 @@ def test_long_list():
         expected_slowdown = 6
 
     assert from_dict_time < expected_slowdown * manual_time
+
+
+# Timing on a shared machine is too noisy to fail a build on, so the
+# comparisons of how long things take are only made when this is set. The
+# results are checked either way.
+BENCHMARKS = os.environ.get('FASTCLASSES_JSON_BENCHMARKS') == '1'
+
+
+def _best_of(func, *args, number=20000):
+    import timeit
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=7))
+
+
+def test_expr_builder__tuple_indexing():
+    from fastclasses_json import core
+
+    build = core.expr_builder(Tuple[int, int, int])
+    funcs = []
+    # An expression is bound to a variable before it is indexed, a
+    # variable is indexed as it is
+    for expr in ['(x)', 'x']:
+        the_globals = {}
+        exec(f'def f(xs):\n    return [{build(expr)} for x in xs]', the_globals)
+        funcs.append(the_globals['f'])
+    bound, direct = funcs
+    data = [[x, x, x] for x in range(100)]
+    assert bound(data) == direct(data) == [(x, x, x) for x in range(100)]
+
+    if not BENCHMARKS:
+        return
+    assert _best_of(direct, data, number=500) < \
+        _best_of(bound, data, number=500)
+
+
+def _wide_class(num_fields):
+    import dataclasses
+
+    return dataclass_json(dataclasses.make_dataclass(f'Wide{num_fields}', [
+        (f'f{i}', [int, Optional[int], List[int]][i % 3])
+        for i in range(num_fields)
+    ] + [
+        ('extra', List[int], dataclasses.field(default_factory=list)),
+    ]))
+
+
+@pytest.mark.parametrize('num_fields', [10, 100, 1000])
+def test_wide_dataclasses(num_fields, monkeypatch):
+    from fastclasses_json import core
+
+    data = {f'f{i}': [i] if i % 3 == 2 else i for i in range(num_fields)}
+    missing_one = dict(data)
+    del missing_one['f0']
+    number = max(10, 10000 // num_fields)
+
+    default_threshold = core._WIDE_THRESHOLD
+    timings = {}
+    for threshold in [default_threshold, num_fields + 1]:
+        monkeypatch.setattr(core, '_WIDE_THRESHOLD', threshold)
+        Wide = _wide_class(num_fields)
+
+        t0 = time.perf_counter()
+        Wide.from_dict(data)
+        compile_time = time.perf_counter() - t0
+
+        assert Wide.from_dict(missing_one) == \
+            Wide(None, *[data[f'f{i}'] for i in range(1, num_fields)])
+        if BENCHMARKS:
+            exact_time = _best_of(Wide.from_dict, data, number=number)
+            fallback_time = _best_of(
+                Wide.from_dict, missing_one, number=number
+            )
+        else:
+            exact_time = fallback_time = None
+        timings[core._is_wide(Wide)] = (
+            compile_time, exact_time, fallback_time,
+        )
+
+    if num_fields <= default_threshold:
+        assert list(timings) == [False]
+        return
+    assert set(timings) == {False, True}
+    if not BENCHMARKS:
+        return
+
+    straight, wide = timings[False], timings[True]
+    # compiling
+    assert wide[0] < straight[0]
+    # steady state, with and without all the keys
+    assert wide[1] < straight[1]
+    assert wide[2] < straight[2]
+
+
+def _sparse_class(**options):
+
+    @dataclass_json(**options)
+    @dataclass
+    class Sparse:
+        id: int
+        name: str
+        points: List[Point]
+        parent: Optional[Point] = None
+        label: Optional[str] = None
+        note: Optional[str] = None
+        colour: Optional[str] = None
+        weight: Optional[float] = None
+        height: Optional[float] = None
+        width: Optional[float] = None
+        depth: Optional[float] = None
+
+    return Sparse
+
+
+def test_specialize_after__skewed_shapes():
+    General = _sparse_class()
+    Specialized = _sparse_class(specialize_after=10)
+
+    # The optional fields are nearly always missing
+    data = {'id': 1, 'name': 'x', 'points': [{'x': 1, 'y': 2}],
+            'parent': {'x': 0, 'y': 0}}
+    for _ in range(10):
+        Specialized.from_dict(data).to_dict()
+    general, specialized = General.from_dict(data), Specialized.from_dict(data)
+    assert vars(general) == vars(specialized)
+    assert general.to_dict() == specialized.to_dict()
+
+    if not BENCHMARKS:
+        return
+    assert _best_of(Specialized.from_dict, data) < \
+        _best_of(General.from_dict, data)
+    # Checking for None is cheap, so there's not much to gain here
+    assert _best_of(Specialized.to_dict, specialized) < \
+        1.1 * _best_of(General.to_dict, general)
+
+
+def test_json_encoder__against_default_hook():
+    import dataclasses
+    from datetime import date
+    import json
+
+    @dataclass_json
+    @dataclass
+    class Order:
+        id: int
+        name: str
+        placed: date
+        points: List[Point]
+
+    def default(o):
+        if dataclasses.is_dataclass(o) and hasattr(o, 'to_dict'):
+            return o.to_dict()
+        if isinstance(o, date):
+            return o.isoformat()
+        raise TypeError(f'Object of type {type(o).__name__} '
+                        'is not JSON serializable')
+
+    page = {
+        'items': [
+            Order(i, 'order', date(2021, 6, 17), [Point(i, i)])
+            for i in range(100)
+        ],
+        'cursor': 'abc',
+    }
+    assert dumps(page) == \
+        json.dumps(page, default=default, separators=(',', ':'))
+
+    if not BENCHMARKS:
+        return
+    # The hand-written hook is about as quick as it gets, so we're looking
+    # for not being slower rather than being quicker. The margin is for the
+    # noise in timing.
+    assert _best_of(dumps, page, number=200) < 1.25 * _best_of(
+        lambda: json.dumps(page, default=default, separators=(',', ':')),
+        number=200,
+    )
+
+
+@dataclass_json
+@dataclass
+class Link:
+    value: int
+    next: Optional['Link'] = None
+
+
+@dataclass_json(iterative=True)
+@dataclass
+class IterativeLink:
+    value: int
+    next: Optional['IterativeLink'] = None
+
+
+def _chain(depth):
+    data = {'value': 0}
+    for i in range(1, depth):
+        data = {'value': i, 'next': data}
+    return data
+
+
+def _chain_depth(link):
+    depth = 0
+    while link is not None:
+        depth, link = depth + 1, link.next
+    return depth
+
+
+@pytest.mark.parametrize('depth', [10, 1000, 100000])
+def test_iterative__depth(depth):
+    data = _chain(depth)
+
+    link = IterativeLink.from_dict(data)
+    assert _chain_depth(link) == depth
+    # Comparing the dicts would recurse
+    assert _chain_depth(IterativeLink.from_dict(link.to_dict())) == depth
+
+    if depth > 10:
+        with pytest.raises(RecursionError):
+            Link.from_dict(data)
+
+    if not BENCHMARKS:
+        return
+    number = max(1, 10000 // depth)
+    from_dict_time = _best_of(IterativeLink.from_dict, data, number=number)
+    to_dict_time = _best_of(link.to_dict, number=number)
+    if depth == 10:
+        # The stack costs more than the frames it saves
+        assert from_dict_time < \
+            2 * _best_of(Link.from_dict, data, number=number)
+        assert to_dict_time < \
+            8 * _best_of(Link.from_dict(data).to_dict, number=number)
+    else:
+        # No worse than linear in the depth
+        shallow = _chain(1000)
+        assert from_dict_time < (depth / 1000) * 2 * _best_of(
+            IterativeLink.from_dict, shallow, number=number * depth // 1000
+        )
+
+
+def _orders_class(**options):
+
+    @dataclass
+    class Customer:
+        name: str
+        addresses: List[str]
+
+    @dataclass
+    class Order:
+        id: int
+        customer: Customer
+
+    @dataclass_json(**options)
+    @dataclass
+    class Orders:
+        orders: List[Order]
+
+    return Orders, Order, Customer
+
+
+def test_graph__shared_references():
+    Orders, Order, Customer = _orders_class()
+    GraphOrders, GraphOrder, GraphCustomer = _orders_class(graph=True)
+
+    addresses = [f'{i} Some Street' for i in range(50)]
+    orders = Orders(
+        [Order(i, Customer('c', addresses)) for i in range(500)]
+    )
+    customer = GraphCustomer('c', addresses)
+    graph_orders = GraphOrders([GraphOrder(i, customer) for i in range(500)])
+
+    json_data, graph_json = orders.to_json(), graph_orders.to_json()
+    assert len(graph_json) < len(json_data) / 20
+
+    decoded = GraphOrders.from_json(graph_json)
+    assert len({id(order.customer) for order in decoded.orders}) == 1
+
+    if not BENCHMARKS:
+        return
+    assert _best_of(graph_orders.to_json, number=20) < \
+        _best_of(orders.to_json, number=20)
+    assert _best_of(GraphOrders.from_json, graph_json, number=20) < \
+        _best_of(Orders.from_json, json_data, number=20)
+
+
+def test_cache_encoded():
+    from datetime import date
+    from decimal import Decimal
+
+    def catalog_class(**options):
+
+        @dataclass(frozen=True)
+        class Price:
+            currency: str
+            amount: Decimal
+
+        @dataclass_json(**options)
+        @dataclass(frozen=True)
+        class Product:
+            sku: str
+            name: str
+            released: date
+            tags: Tuple[str, ...]
+            prices: Tuple[Price, ...]
+
+        return Product(
+            'sku-1', 'A product', date(2021, 6, 17), ('new', 'sale'),
+            tuple(Price(c, Decimal('9.99')) for c in ['EUR', 'GBP', 'USD']),
+        )
+
+    product = catalog_class()
+    cached = catalog_class(cache_encoded=True)
+    assert cached.to_dict() == product.to_dict()
+    assert cached.to_json() == product.to_json()
+
+    if not BENCHMARKS:
+        return
+    assert _best_of(cached.to_json) < _best_of(product.to_json) / 10
+    # It has to make a copy each time
+    assert _best_of(cached.to_dict) < _best_of(product.to_dict)
+
+
+def test_intern__batch():
+    import tracemalloc
+
+    def batch_class(**options):
+
+        @dataclass_json(**options)
+        @dataclass(frozen=True)
+        class Currency:
+            code: str
+            digits: int
+
+        @dataclass(frozen=True)
+        class Money:
+            amount: int
+            currency: Currency
+
+        @dataclass_json
+        @dataclass
+        class Batch:
+            items: List[Money]
+
+        return Batch
+
+    data = {'items': [
+        {'amount': i, 'currency': {'code': code, 'digits': 2}}
+        for i in range(2000) for code in ['EUR', 'GBP', 'USD']
+    ]}
+
+    def traced_size(cls):
+        tracemalloc.start()
+        try:
+            batch = cls.from_dict(data)
+            return tracemalloc.get_traced_memory()[0], batch
+        finally:
+            tracemalloc.stop()
+
+    Batch, InternedBatch = batch_class(), batch_class(intern=True)
+    size, _ = traced_size(Batch)
+    interned_size, batch = traced_size(InternedBatch)
+    assert len({id(money.currency) for money in batch.items}) == 3
+    # One of the two instances for each item
+    assert interned_size < 0.6 * size
+
+    if not BENCHMARKS:
+        return
+    # It's a dict lookup, with the hashing of each instance. About 15%, with
+    # room for the noise in timing.
+    assert _best_of(InternedBatch.from_dict, data, number=10) < \
+        1.6 * _best_of(Batch.from_dict, data, number=10)
+
+
+def test_cached_decoder():
+    import json
+    from fastclasses_json import CachedDecoder
+
+    @dataclass(frozen=True)
+    class Flag:
+        name: str
+        enabled: bool
+        rollout: Optional[float] = None
+
+    @dataclass_json
+    @dataclass(frozen=True)
+    class Flags:
+        flags: Tuple[Flag, ...]
+
+    json_data = json.dumps({'flags': [
+        {'name': f'flag-{i}', 'enabled': i % 2 == 0, 'rollout': 0.5}
+        for i in range(100)
+    ]}).encode()
+    decoder = CachedDecoder(Flags)
+    assert decoder.from_json(json_data) == Flags.from_json(json_data)
+
+    if not BENCHMARKS:
+        return
+    # Hashing the bytes, which aren't the same object each time
+    assert _best_of(lambda: decoder.from_json(bytes(json_data)), number=1000) \
+        < _best_of(lambda: Flags.from_json(bytes(json_data)), number=1000) / 10
+
+
+def test_datetime_parsing():
+    from datetime import datetime
+
+    @dataclass_json
+    @dataclass
+    class Events:
+        times: List[datetime]
+
+    times = [
+        '2021-06-17T10:00:00Z',
+        '2021-06-17T10:00:00.123456+02:00',
+        '2021-06-17T10:00:00',
+    ] * 100
+    data = {'times': times}
+
+    def stdlib(data):
+        # What was generated when dateutil wasn't installed
+        return [
+            datetime.fromisoformat(t[:-1] + "+00:00" if t[-1] == "Z" else t)
+            for t in data['times']
+        ]
+
+    assert Events.from_dict(data).times == stdlib(data)
+    if BENCHMARKS:
+        assert _best_of(Events.from_dict, data, number=200) < \
+            1.25 * _best_of(stdlib, data, number=200)
+
+    try:
+        import dateutil.parser
+    except ImportError:
+        return
+
+    def with_dateutil(data):
+        # What was generated when it was
+        return [dateutil.parser.isoparse(t) for t in data['times']]
+
+    assert Events.from_dict(data).times == with_dateutil(data)
+    if not BENCHMARKS:
+        return
+    assert _best_of(Events.from_dict, data, number=20) < \
+        _best_of(with_dateutil, data, number=20) / 5
+
+
+def test_from_json__decimals():
+    from decimal import Decimal
+    import json
+
+    @dataclass_json
+    @dataclass
+    class Line:
+        sku: str
+        quantity: int
+        price: Decimal
+        tax: Decimal
+
+    @dataclass_json
+    @dataclass
+    class Invoice:
+        lines: List[Line]
+
+    json_data = json.dumps({'lines': [
+        {'sku': f'sku-{i}', 'quantity': i, 'price': 12.99 + i,
+         'tax': 1.0825 * i}
+        for i in range(500)
+    ]})
+
+    def via_floats(json_data):
+        # What from_json did before: round to floats, then convert back
+        return Invoice.from_dict(json.loads(json_data))
+
+    assert Invoice.from_json(json_data) == via_floats(json_data)
+    if not BENCHMARKS:
+        return
+    assert _best_of(Invoice.from_json, json_data, number=20) < \
+        _best_of(via_floats, json_data, number=20)
+
+
+def test_from_json__memoryview():
+    import json
+    import tracemalloc
+
+    @dataclass_json
+    @dataclass
+    class Message:
+        id: int
+        tags: List[str]
+        body: str
+
+    messages = [
+        json.dumps({'id': i, 'tags': ['a', 'b'], 'body': 'x' * 100_000})
+        for i in range(10)
+    ]
+    buffer = bytearray('\n'.join(messages).encode())
+    start = len(messages[0]) + 1
+    view = memoryview(buffer)[start:start + len(messages[1])]
+
+    def traced_peak(from_json):
+        tracemalloc.start()
+        try:
+            message = from_json()
+            return tracemalloc.get_traced_memory()[1], message
+        finally:
+            tracemalloc.stop()
+
+    assert Message.from_json(view).id == 1
+    # What had to be done before memoryviews were accepted
+    copied_peak, _ = traced_peak(lambda: Message.from_json(bytes(view)))
+    peak, message = traced_peak(lambda: Message.from_json(view))
+    assert message.id == 1
+    # The text decoded from the view, but not a copy of it in bytes as well
+    assert peak < copied_peak - 0.9 * len(view)
+
+
+@pytest.mark.parametrize('num_items', [10, 10_000])
+def test_to_json_bytes(num_items):
+    import json
+    import tracemalloc
+
+    @dataclass_json
+    @dataclass
+    class Item:
+        id: int
+        title: str
+        note: str
+
+    @dataclass_json
+    @dataclass
+    class Catalogue:
+        items: List[Item]
+
+    # About 1KB and 1MB
+    catalogue = Catalogue([
+        Item(i, '\u6771\u4eac caf\u00e9', 'some plain ascii text')
+        for i in range(num_items)
+    ])
+
+    def encoded(obj):
+        # What was needed before there was to_json_bytes
+        return json.dumps(obj.to_dict(), separators=(',', ':')).encode()
+
+    def traced_peak(func, obj):
+        tracemalloc.start()
+        try:
+            func(obj)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    assert catalogue.to_json_bytes() == encoded(catalogue)
+    peak = traced_peak(Catalogue.to_json_bytes, catalogue)
+    encoded_peak = traced_peak(encoded, catalogue)
+    if num_items > core._CHUNKED_BYTES_ITEMS:
+        # Encoded a chunk at a time, with no dict or whole str made
+        assert peak < 0.75 * encoded_peak
+    else:
+        assert peak <= encoded_peak
+    # Shorter, as there are no \\u escapes, though not quicker to make
+    assert len(catalogue.to_json_bytes(ensure_ascii=False)) < \
+        0.9 * len(encoded(catalogue))
+
+    if not BENCHMARKS:
+        return
+    # The same work, with the encoder made once. Room for noise in timing.
+    number = max(5, 10_000 // num_items)
+    assert _best_of(Catalogue.to_json_bytes, catalogue, number=number) < \
+        1.5 * _best_of(encoded, catalogue, number=number)
+
+
+def test_to_json_stream():
+    import tracemalloc
+
+    @dataclass_json
+    @dataclass
+    class Item:
+        id: int
+        name: str
+
+    @dataclass_json
+    @dataclass
+    class Export:
+        items: List[Item]
+        ids: List[int]
+
+    class Discard:
+        def write(self, chunk):
+            pass
+
+    def export(num_items):
+        return Export(
+            [Item(i, f'item {i}') for i in range(num_items)],
+            list(range(num_items)),
+        )
+
+    def traced_peak(func, obj):
+        tracemalloc.start()
+        try:
+            func(obj)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def streamed(obj):
+        obj.to_json_stream(Discard(), chunk_size=16 * 1024)
+
+    small, large = export(5_000), export(50_000)
+    streamed(small)
+    # However many items there are
+    assert traced_peak(streamed, large) < 1.5 * traced_peak(streamed, small)
+    assert traced_peak(streamed, large) < \
+        0.1 * traced_peak(Export.to_json, large)
+
+    if not BENCHMARKS:
+        return
+    assert _best_of(streamed, large, number=1) < \
+        1.5 * _best_of(Export.to_json, large, number=1)
+
+
+def test_async__event_loop_lag():
+    import asyncio
+    import gc
+
+    @dataclass_json
+    @dataclass
+    class Item:
+        id: int
+        name: str
+        tags: List[str]
+
+    @dataclass_json
+    @dataclass
+    class Export:
+        items: List[Item]
+
+    obj = Export([Item(i, f'item {i}', ['a', 'b']) for i in range(100_000)])
+    text = obj.to_json()
+
+    async def worst_lag(coro):
+        loop = asyncio.get_running_loop()
+        lags = []
+        done = False
+
+        async def ticker():
+            while not done:
+                before = loop.time()
+                await asyncio.sleep(0)
+                lags.append(loop.time() - before)
+
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        result = await coro
+        done = True
+        await task
+        return result, max(lags)
+
+    async def blocking_encode():
+        return obj.to_json()
+
+    async def blocking_decode():
+        return Export.from_json(text)
+
+    def measure(make_coro):
+        return asyncio.run(worst_lag(make_coro()))
+
+    # A gen-2 collection pauses every thread, whichever one triggered it,
+    # and would show up as lag no matter where the work runs.
+    gc.disable()
+    try:
+        encoded, blocking = measure(blocking_encode)
+        for kwargs in [{}, {'yield_every': 1_000}]:
+            result, lag = measure(lambda: obj.to_json_async(**kwargs))
+            assert result == encoded
+            assert not BENCHMARKS or lag < 0.25 * blocking
+
+        decoded, blocking = measure(blocking_decode)
+        for kwargs in [{}, {'yield_every': 1_000}]:
+            result, lag = measure(
+                lambda: Export.from_json_async(text, **kwargs)
+            )
+            assert result == decoded
+            assert not BENCHMARKS or lag < 0.25 * blocking
+    finally:
+        gc.enable()
+
+
+def test_jsonl__gzip(tmp_path):
+    import gzip
+    import json
+    from fastclasses_json import read_jsonl, write_jsonl
+
+    @dataclass_json
+    @dataclass
+    class Event:
+        id: int
+        name: str
+        tags: List[str]
+
+    events = [Event(i, f'event {i}', ['a', 'b']) for i in range(20_000)]
+    path = str(tmp_path / 'events.jsonl.gz')
+
+    def write_lines():
+        with gzip.open(path, 'wt') as f:
+            for event in events:
+                f.write(event.to_json() + '\n')
+
+    def read_lines():
+        with gzip.open(path, 'rt') as f:
+            for line in f:
+                Event.from_dict(json.loads(line))
+
+    def read():
+        for _ in read_jsonl(Event, path):
+            pass
+
+    write_jsonl(path, events)
+    assert [e.id for e in read_jsonl(Event, path)] == list(range(20_000))
+
+    if not BENCHMARKS:
+        return
+    assert _best_of(write_jsonl, path, events, number=1) < \
+        _best_of(write_lines, number=1)
+    assert _best_of(read, number=1) < _best_of(read_lines, number=1)